@@ -0,0 +1,179 @@
+"""
+Admission control for /chat and /chat/stream.
+
+- Per-session ordering: turns of one session run one at a time, in arrival
+  order (a FIFO asyncio.Lock per session). More than SESSION_MAX_QUEUED
+  turns waiting behind a running one are rejected.
+- Global limit: at most MAX_CONCURRENT_TURNS turns run at once; up to
+  ADMISSION_QUEUE_SIZE more wait (FIFO) for at most
+  ADMISSION_QUEUE_TIMEOUT_S. A full queue rejects immediately.
+
+A rejection raises Overloaded, which the endpoints turn into a 429 with a
+Retry-After estimated from recent turn latency. Admission is per turn,
+not per LLM call, so a turn that was let in is never cut off half way;
+app/llm_backend.py's connection pool bounds the calls themselves.
+
+    ticket = await get_admission().admit(session_id)
+    try:
+        ...
+    finally:
+        ticket.release()
+"""
+from __future__ import annotations
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from .config import MAX_CONCURRENT_TURNS, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT_S, SESSION_MAX_QUEUED
+
+_EWMA_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """An admitted turn; release() when it is done (further calls are no-ops)."""
+
+    def __init__(self, controller: "AdmissionController", session_id: str, lock: asyncio.Lock, slot: bool):
+        self._controller = controller
+        self._session_id = session_id
+        self._lock = lock
+        self._slot = slot
+        self._started = time.perf_counter()
+        self._released = False
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        if self._slot:
+            self._controller._release_slot((time.perf_counter() - self._started) * 1000)
+        self._controller._release_session(self._session_id, self._lock)
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float, session_max_queued: int):
+        self.max_concurrent = max_concurrent  # 0 = no global limit
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.session_max_queued = max(0, session_max_queued)
+
+        self._inflight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._sessions: Dict[str, List] = {}  # session_id -> [Lock, running + waiting turns]
+        self._turn_ms: Optional[float] = None
+        self.stats = {
+            "admitted": 0, "queued": 0, "session_queued": 0,
+            "rejected_queue_full": 0, "rejected_queue_timeout": 0, "rejected_session_busy": 0,
+        }
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "inflight": self._inflight,
+            "waiting": len(self._waiters),
+            "active_sessions": len(self._sessions),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "turn_ms_ewma": round(self._turn_ms, 1) if self._turn_ms is not None else None,
+        }
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free: recent turn time x queue depth / slots."""
+        turn_s = (self._turn_ms or 1000.0) / 1000
+        return max(1, math.ceil(turn_s * (len(self._waiters) + 1) / max(1, self.max_concurrent)))
+
+    async def admit(self, session_id: str) -> Ticket:
+        lock = await self._acquire_session(session_id)
+        try:
+            slot = await self._acquire_slot()
+        except BaseException:
+            self._release_session(session_id, lock)
+            raise
+        self.stats["admitted"] += 1
+        return Ticket(self, session_id, lock, slot)
+
+    # ---- per-session FIFO ----
+
+    async def _acquire_session(self, session_id: str) -> asyncio.Lock:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            entry = self._sessions[session_id] = [asyncio.Lock(), 0]
+        elif entry[1] > self.session_max_queued:
+            self.stats["rejected_session_busy"] += 1
+            raise Overloaded("too many turns queued for this session", self.retry_after())
+        lock = entry[0]
+        entry[1] += 1
+        if lock.locked():
+            self.stats["session_queued"] += 1
+        try:
+            await lock.acquire()
+        except BaseException:
+            self._forget_session(session_id, lock)
+            raise
+        return lock
+
+    def _release_session(self, session_id: str, lock: asyncio.Lock) -> None:
+        lock.release()
+        self._forget_session(session_id, lock)
+
+    def _forget_session(self, session_id: str, lock: asyncio.Lock) -> None:
+        entry = self._sessions.get(session_id)
+        if entry is None or entry[0] is not lock:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._sessions[session_id]
+
+    # ---- global slots ----
+
+    async def _acquire_slot(self) -> bool:
+        if self.max_concurrent <= 0:
+            return False
+        if self._inflight < self.max_concurrent and not self._waiters:
+            self._inflight += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.stats["rejected_queue_full"] += 1
+            raise Overloaded("server busy", self.retry_after())
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self.stats["queued"] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), self.queue_timeout if self.queue_timeout > 0 else None)
+        except BaseException as e:
+            if fut.done() and not fut.cancelled():
+                self._release_slot(None)  # granted just as we gave up: pass it on
+            else:
+                fut.cancel()
+                self._waiters.remove(fut)
+            if isinstance(e, asyncio.TimeoutError):
+                self.stats["rejected_queue_timeout"] += 1
+                raise Overloaded("timed out waiting for a free slot", self.retry_after()) from None
+            raise
+        return True
+
+    def _release_slot(self, turn_ms: Optional[float]) -> None:
+        if turn_ms is not None:
+            self._turn_ms = turn_ms if self._turn_ms is None else self._turn_ms + _EWMA_ALPHA * (turn_ms - self._turn_ms)
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)  # the slot moves to this waiter; inflight unchanged
+                return
+        self._inflight -= 1
+
+
+_admission = AdmissionController(
+    MAX_CONCURRENT_TURNS, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT_S, SESSION_MAX_QUEUED
+)
+
+def get_admission() -> AdmissionController:
+    return _admission
@@ -1,9 +1,17 @@
 import re
 import json
-from typing import List, Tuple
+from typing import AsyncIterator, List, Optional, Tuple
 
-from .llm_backend import ChatMsg, get_backend
+from .llm_backend import ChatMsg, get_backend, get_async_backend
 from .prompts import STATE_PROMPT, COACH_PROMPT
+from .config import CHAT_HISTORY_AS_MESSAGES, CONTEXT_TOKEN_BUDGETS
+from .context_budget import fit_context
+from .json_utils import extract_json
+from .generation import get_profile
+from .batcher import classifier_chat
+from .schemas import StateResult
+from . import classifier_cache
+from .metrics import FALLBACKS
 
 
 # ---------------------------
@@ -35,72 +43,169 @@ def _split_summary(recent_turns: List[str]) -> Tuple[str, List[str]]:
         return first[len("summary:"):].strip(), recent_turns[1:]
     return "", recent_turns
 
-_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
 
 
 # ---------------------------
-# 2) STATE AGENT (silent)
-# Outputs: intent, arousal, plan_request, needs_help
+# Helpers: prompt layout
+# Every agent prompt is a STATIC prefix (the system message: master system +
+# agent instructions, identical on every turn) followed by a DYNAMIC suffix
+# (summary, recent turns, current message). Inference servers with prefix
+# caching (vLLM, llama.cpp/Ollama) can then reuse the static part across
+# turns and sessions. Keep anything that changes per turn out of the system
+# message.
 # ---------------------------
 
-def state_agent(user_text: str, recent_turns: List[str]) -> dict:
-    summary, turns = _split_summary(recent_turns)
+def _history_messages(turns: List[str]) -> List[ChatMsg]:
+    """'user: ...' / 'assistant: ...' lines -> real chat messages."""
+    msgs = []
+    for line in turns:
+        role, _, text = line.partition(": ")
+        msgs.append(ChatMsg(role="assistant" if role == "assistant" else "user", content=text))
+    return msgs
 
-    # Keep a small window of recent turns, but ALWAYS keep summary if present
-    last_turns = turns[-8:]  # small, stable window
 
-    prompt = f"""{STATE_PROMPT}
+# Turn windows for roles without a token budget (<ROLE>_CONTEXT_TOKENS=0)
+CLASSIFIER_TURN_WINDOW = 8
+COACH_TURN_WINDOW = 12
 
-SESSION SUMMARY (if any):
-{summary if summary else "(none)"}
+def _context_turns(role: str, turns: List[str], window: int) -> List[str]:
+    """
+    The turns a role's prompt is cut from: every loaded turn when the role
+    has a token budget (the budget decides), else the last `window`.
+    """
+    return turns if CONTEXT_TOKEN_BUDGETS.get(role, 0) > 0 else turns[-window:]
 
+
+def _layout_messages(
+    role: str, instructions: str, user_text: str, recent_turns: List[str], window: int, footer: str = ""
+) -> List[ChatMsg]:
+    summary, turns = _split_summary(recent_turns)
+    summary, last_turns = fit_context(role, summary, _context_turns(role, turns, window))
+
+    # CHAT_HISTORY_AS_MESSAGES: prior turns go between the static prefix and
+    # the dynamic suffix as user/assistant messages instead of a text block.
+    history = _history_messages(last_turns) if CHAT_HISTORY_AS_MESSAGES else []
+
+    suffix = f"""SESSION SUMMARY (if any):
+{summary if summary else "(none)"}
+"""
+    if not CHAT_HISTORY_AS_MESSAGES:
+        suffix += f"""
 RECENT TURNS:
 {chr(10).join(last_turns) if last_turns else "(none)"}
-
+"""
+    suffix += f"""
 CURRENT USER MESSAGE:
 {user_text}
-
-Return JSON only.
 """
+    if footer:
+        suffix += f"\n{footer}\n"
+
+    return [
+        ChatMsg(role="system", content=instructions),
+        *history,
+        ChatMsg(role="user", content=suffix),
+    ]
+
+
+# ---------------------------
+# 2) STATE AGENT (silent)
+# Outputs: intent, arousal, plan_request, needs_help
+# ---------------------------
+
+def _classifier_messages(role: str, instructions: str, user_text: str, recent_turns: List[str]) -> List[ChatMsg]:
+    # Keep a small window of recent turns, but ALWAYS keep summary if present
+    return _layout_messages(role, instructions, user_text, recent_turns, window=CLASSIFIER_TURN_WINDOW, footer="Return JSON only.")
+
+
+def _classifier_context(role: str, recent_turns: List[str]) -> List[str]:
+    # Cache key context = the summary and turns _classifier_messages starts
+    # from (the token budget only trims them, so equal inputs give equal prompts)
+    summary, turns = _split_summary(recent_turns)
+    return [summary, *_context_turns(role, turns, CLASSIFIER_TURN_WINDOW)]
 
-    backend = get_backend()
-    raw = backend.chat([
-        ChatMsg(role="system", content=prompt),
-        ChatMsg(role="user", content=user_text),
-    ])
 
-    # Parse JSON robustly (HF models sometimes add extra text)
+def _state_messages(user_text: str, recent_turns: List[str]) -> List[ChatMsg]:
+    return _classifier_messages("state", STATE_PROMPT, user_text, recent_turns)
+
+
+def normalize_state(data: dict, user_text: str) -> dict:
+    """Clamp classifier output to the state dict the coach router expects."""
+    intent = data.get("intent", "other")
+    arousal = data.get("arousal", "low")
+    plan_request = bool(data.get("plan_request", False))
+    needs_help = bool(data.get("needs_help", False))
+
+    # Light heuristic: if user explicitly asks for a plan/routine, treat as plan_request
+    text_l = (user_text or "").lower()
+    if any(k in text_l for k in ["21 day", "21-day", "plan", "routine", "schedule", "step by step", "program"]):
+        plan_request = True
+
+    return {
+        "intent": intent if intent in ("greeting", "share", "question", "plan", "other") else "other",
+        "arousal": arousal if arousal in ("low", "medium", "high") else "low",
+        "plan_request": plan_request,
+        "needs_help": needs_help,
+    }
+
+
+def _parse_state(raw: str, user_text: str) -> Optional[dict]:
+    # Parse JSON robustly (HF models sometimes add extra text, or two objects)
     try:
-        m = _JSON_RE.search(raw or "")
-        if not m:
+        found = extract_json(raw or "")
+        if not found:
             raise ValueError("No JSON found")
-        data = json.loads(m.group(0))
-
-        intent = data.get("intent", "other")
-        arousal = data.get("arousal", "low")
-        plan_request = bool(data.get("plan_request", False))
-        needs_help = bool(data.get("needs_help", False))
-
-        # Light heuristic: if user explicitly asks for a plan/routine, treat as plan_request
-        text_l = (user_text or "").lower()
-        if any(k in text_l for k in ["21 day", "21-day", "plan", "routine", "schedule", "step by step", "program"]):
-            plan_request = True
-
-        return {
-            "intent": intent if intent in ("greeting", "share", "question", "plan", "other") else "other",
-            "arousal": arousal if arousal in ("low", "medium", "high") else "low",
-            "plan_request": plan_request,
-            "needs_help": needs_help,
-        }
+        data = json.loads(found)
+        return normalize_state(data, user_text)
     except Exception:
-        # Fallback safe defaults
-        text_l = (user_text or "").lower()
-        return {
-            "intent": "other",
-            "arousal": "high" if any(k in text_l for k in ["panic", "overwhelmed", "anxious", "can't breathe"]) else "low",
-            "plan_request": any(k in text_l for k in ["21 day", "21-day", "plan", "routine", "schedule"]),
-            "needs_help": any(k in text_l for k in ["help", "what do i do", "i don't know", "stuck"]),
-        }
+        return None
+
+
+def state_fallback(user_text: str) -> dict:
+    # Fallback safe defaults
+    text_l = (user_text or "").lower()
+    return {
+        "intent": "other",
+        "arousal": "high" if any(k in text_l for k in ["panic", "overwhelmed", "anxious", "can't breathe"]) else "low",
+        "plan_request": any(k in text_l for k in ["21 day", "21-day", "plan", "routine", "schedule"]),
+        "needs_help": any(k in text_l for k in ["help", "what do i do", "i don't know", "stuck"]),
+    }
+
+
+def _state_cache_key(user_text: str, recent_turns: List[str], model: str) -> str:
+    return classifier_cache.state_key(user_text, model, _classifier_context("state", recent_turns))
+
+
+def state_agent(user_text: str, recent_turns: List[str]) -> dict:
+    backend = get_backend("state")
+    key = _state_cache_key(user_text, recent_turns, backend.model)
+    cached = classifier_cache.get_state(key)
+    if cached is not None:
+        return cached
+
+    raw = backend.chat(_state_messages(user_text, recent_turns), schema=StateResult, profile=get_profile("state"))
+    state = _parse_state(raw, user_text)
+    if state is None:
+        FALLBACKS.inc(role="state")
+        return state_fallback(user_text)
+    classifier_cache.put_state(key, state)
+    return state
+
+
+async def state_agent_async(user_text: str, recent_turns: List[str]) -> dict:
+    backend = get_async_backend("state")
+    key = _state_cache_key(user_text, recent_turns, backend.model)
+    cached = classifier_cache.get_state(key)
+    if cached is not None:
+        return cached
+
+    raw = await classifier_chat("state", _state_messages(user_text, recent_turns), schema=StateResult, profile=get_profile("state"))
+    state = _parse_state(raw, user_text)
+    if state is None:
+        FALLBACKS.inc(role="state")
+        return state_fallback(user_text)
+    classifier_cache.put_state(key, state)
+    return state
 
 
 # ---------------------------
@@ -135,31 +240,27 @@ def choose_coach_mode(state: dict) -> str:
     return "NONE"
 
 
-def coaching_agent(mode: str, user_text: str, recent_turns: List[str]) -> str:
-    summary, turns = _split_summary(recent_turns)
-
-    # Recent turns window for response quality
-    last_turns = turns[-12:]
-
-    prompt = f"""{COACH_PROMPT}
+def _coach_messages(mode: str, user_text: str, recent_turns: List[str]) -> List[ChatMsg]:
+    # MODE is part of the static prefix: one cached prefix per mode
+    instructions = f"""{COACH_PROMPT}
 MODE={mode}
+"""
+    # Recent turns window for response quality
+    return _layout_messages("coach", instructions, user_text, recent_turns, window=COACH_TURN_WINDOW)
 
-SESSION SUMMARY (if any):
-{summary if summary else "(none)"}
-
-RECENT TURNS:
-{chr(10).join(last_turns) if last_turns else "(none)"}
 
-CURRENT USER MESSAGE:
-{user_text}
-"""
+def _coach_line_cap(mode: str) -> int:
+    if mode == "GROUND":
+        # GROUND mode: keep response short (2-3 lines)
+        return 3
+    if mode == "PLAN":
+        # PLAN mode: can be longer for structured plans
+        return 10
+    # Fallback
+    return 3
 
-    backend = get_backend()
-    reply = backend.chat([
-        ChatMsg(role="system", content=prompt),
-        ChatMsg(role="user", content=user_text),
-    ]).strip()
 
+def _cap_coach_reply(mode: str, reply: str) -> str:
     # Hard caps to stop rambling, but preserve UI_ACTION line if present
     lines = [l.rstrip() for l in reply.splitlines() if l.strip()]
 
@@ -173,17 +274,130 @@ CURRENT USER MESSAGE:
     # Remove UI_ACTION line from truncation logic; we’ll re-attach at end
     core_lines = [l for l in lines if not l.strip().lower().startswith("ui_action:")]
 
-    if mode == "GROUND":
-        # GROUND mode: keep response short (2-3 lines)
-        core = "\n".join(core_lines[:3]).strip()
-    elif mode == "PLAN":
-        # PLAN mode: can be longer for structured plans
-        core = "\n".join(core_lines[:10]).strip()
-    else:
-        # Fallback
-        core = "\n".join(core_lines[:3]).strip()
+    core = "\n".join(core_lines[:_coach_line_cap(mode)]).strip()
 
     if ui_line:
         core = (core + "\n\n" + ui_line).strip()
 
     return core
+
+
+def coaching_agent(mode: str, user_text: str, recent_turns: List[str]) -> str:
+    backend = get_backend("coach")
+    reply = backend.chat(_coach_messages(mode, user_text, recent_turns), profile=get_profile("coach", mode)).strip()
+    return _cap_coach_reply(mode, reply)
+
+
+async def coaching_agent_async(mode: str, user_text: str, recent_turns: List[str]) -> str:
+    # Streamed under the hood so decoding stops as soon as the capped reply
+    # is complete (line cap reached and UI_ACTION seen).
+    stream_filter = CoachStreamFilter(mode)
+    async for _ in coaching_agent_stream(mode, user_text, recent_turns, stream_filter):
+        pass
+    return _cap_coach_reply(mode, stream_filter.raw.strip())
+
+
+class CoachStreamFilter:
+    """
+    Incremental version of _cap_coach_reply for streamed coach replies.
+
+    feed() takes raw model deltas and returns the text that is safe to show
+    the user right away: blank lines are dropped, core lines stop at the mode's
+    line cap, and UI_ACTION lines are held back (they are surfaced separately
+    once the reply is complete). A partial line is only released once it can
+    no longer turn into a UI_ACTION line, and trailing whitespace is held until
+    more text follows, so the streamed text matches the capped reply.
+    """
+
+    _UI_PREFIX = "ui_action:"
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.max_lines = _coach_line_cap(mode)
+        self.raw_parts: List[str] = []
+        self.ui_line = None
+        self._buf = ""          # current (incomplete) line
+        self._sent = 0          # chars of the current line already emitted
+        self._is_core = None    # None until we know what the current line is
+        self._core_lines = 0
+
+    @property
+    def raw(self) -> str:
+        return "".join(self.raw_parts)
+
+    @property
+    def exhausted(self) -> bool:
+        """True once nothing the model adds can change the capped reply."""
+        return self._core_lines >= self.max_lines and self._is_core is None and self.ui_line is not None
+
+    def feed(self, delta: str) -> str:
+        self.raw_parts.append(delta)
+        self._buf += delta
+        out = []
+        while "\n" in self._buf:
+            line, self._buf = self._buf.split("\n", 1)
+            out.append(self._emit(line, final=True))
+            self._sent = 0
+            self._is_core = None
+        out.append(self._emit(self._buf, final=False))
+        return "".join(out)
+
+    def finish(self) -> str:
+        """Flush the last, unterminated line and return any text it releases."""
+        tail = self._emit(self._buf, final=True)
+        self._buf = ""
+        return tail
+
+    def _emit(self, line: str, final: bool) -> str:
+        if self._is_core is None:
+            head = line.strip().lower()
+            if not head:
+                return ""
+            if head.startswith(self._UI_PREFIX):
+                if final:
+                    self.ui_line = line.strip()
+                return ""
+            if self._UI_PREFIX.startswith(head) and not final:
+                return ""  # could still become a UI_ACTION line
+            if self._core_lines >= self.max_lines:
+                self._is_core = False
+            else:
+                self._is_core = True
+                self._core_lines += 1
+                if self._core_lines == 1:
+                    # the capped reply is strip()'d, so skip leading indent once
+                    self._sent = len(line) - len(line.lstrip())
+
+        if not self._is_core:
+            return ""
+
+        visible = line.rstrip()
+        if len(visible) <= self._sent:
+            return ""
+        prefix = "\n" if self._core_lines > 1 and self._sent == 0 else ""
+        piece = visible[self._sent:]
+        self._sent = len(visible)
+        return prefix + piece
+
+
+async def coaching_agent_stream(mode: str, user_text: str, recent_turns: List[str], stream_filter: CoachStreamFilter) -> AsyncIterator[str]:
+    """
+    Stream the coach reply through `stream_filter`, yielding user-visible text.
+    When the generator ends, `_cap_coach_reply(mode, stream_filter.raw)` gives
+    the same reply coaching_agent would have returned.
+    """
+    backend = get_async_backend("coach")
+    stream = backend.chat_stream(_coach_messages(mode, user_text, recent_turns), profile=get_profile("coach", mode))
+    try:
+        async for delta in stream:
+            text = stream_filter.feed(delta)
+            if text:
+                yield text
+            if stream_filter.exhausted:
+                # Line cap reached and UI_ACTION seen: stop decoding early.
+                break
+        tail = stream_filter.finish()
+        if tail:
+            yield tail
+    finally:
+        await stream.aclose()
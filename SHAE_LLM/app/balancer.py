@@ -0,0 +1,182 @@
+"""
+Client-side load balancing across several inference servers (Ollama boxes).
+
+A base URL setting (OLLAMA_BASE_URL, <ROLE>_BASE_URL) may list several
+comma-separated endpoints. Each call picks one:
+
+- session affinity (LB_SESSION_AFFINITY): a session prefers the endpoint
+  that rendezvous-hashes highest for its id, so its turns land where its
+  prompt prefix is already cached; the preference is dropped when that
+  endpoint is unhealthy or has LB_AFFINITY_SLACK more requests in flight
+  than the least loaded one
+- otherwise LB_STRATEGY: "p2c" (power of two choices: sample two, take the
+  one with fewer in flight) or "least_outstanding" (scan all)
+
+Endpoints whose circuit breaker is open, or that failed the background
+health probe (GET /models every LB_HEALTH_INTERVAL_S), are skipped while
+any healthy one is left. Endpoint state is keyed by base URL, so the sync
+and async clients of one server share in-flight counts and health.
+"""
+from __future__ import annotations
+import contextvars
+import hashlib
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Sequence
+
+import httpx
+
+from .resilience import CircuitBreaker, get_breaker
+from .config import LB_STRATEGY, LB_SESSION_AFFINITY, LB_AFFINITY_SLACK, LB_HEALTH_INTERVAL_S
+
+_EWMA_ALPHA = 0.2
+
+_session: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("lb_session", default=None)
+
+@contextmanager
+def session_scope(session_id: str) -> Iterator[None]:
+    """Route LLM calls made inside the block with `session_id`'s affinity."""
+    token = _session.set(session_id)
+    try:
+        yield
+    finally:
+        _session.reset(token)
+
+
+class Endpoint:
+    def __init__(self, base_url: str, api_key: str):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.breaker: CircuitBreaker = get_breaker(base_url)
+        self.healthy = True  # last probe result
+        self._lock = threading.Lock()
+        self.inflight = 0
+        self.latency_ms: Optional[float] = None  # EWMA of successful calls
+        self.stats = {"requests": 0, "errors": 0, "affinity_hits": 0, "probe_failures": 0}
+
+    def available(self) -> bool:
+        return self.healthy and not self.breaker.is_open()
+
+    def acquire(self) -> float:
+        with self._lock:
+            self.inflight += 1
+            self.stats["requests"] += 1
+        return time.perf_counter()
+
+    def release(self, started: float, ok: bool = True) -> None:
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.inflight -= 1
+            if not ok:
+                self.stats["errors"] += 1
+            elif self.latency_ms is None:
+                self.latency_ms = elapsed
+            else:
+                self.latency_ms += _EWMA_ALPHA * (elapsed - self.latency_ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "inflight": self.inflight,
+                "latency_ms_ewma": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+                "healthy": self.healthy,
+                "breaker": self.breaker.state,
+            }
+
+
+def _affinity_score(session_id: str, base_url: str) -> int:
+    digest = hashlib.blake2b(f"{session_id}|{base_url}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class EndpointPool:
+    def __init__(self, endpoints: Sequence[Endpoint]):
+        self.endpoints: List[Endpoint] = list(endpoints)
+
+    def pick(self, exclude: Sequence[Endpoint] = ()) -> Endpoint:
+        """Endpoint for the next attempt; `exclude` holds the ones that already failed it."""
+        if len(self.endpoints) == 1:
+            return self.endpoints[0]
+        candidates = [e for e in self.endpoints if e not in exclude] or self.endpoints
+        candidates = [e for e in candidates if e.available()] or candidates
+
+        session_id = _session.get()
+        if LB_SESSION_AFFINITY and session_id:
+            preferred = max(candidates, key=lambda e: _affinity_score(session_id, e.base_url))
+            if preferred.inflight <= min(e.inflight for e in candidates) + LB_AFFINITY_SLACK:
+                preferred.stats["affinity_hits"] += 1
+                return preferred
+
+        if LB_STRATEGY == "least_outstanding" or len(candidates) == 2:
+            pool = candidates
+        else:  # p2c
+            pool = random.sample(candidates, 2) if len(candidates) > 2 else candidates
+        return min(pool, key=lambda e: (e.inflight, e.latency_ms or 0.0))
+
+    def snapshot(self) -> dict:
+        return {e.base_url: e.snapshot() for e in self.endpoints}
+
+
+# ---------------------------
+# Registry and health probe
+# ---------------------------
+
+_lock = threading.Lock()
+_endpoints = {}  # base_url -> Endpoint
+_pools = {}      # (base_urls, api_key) -> EndpointPool
+_probe_thread: Optional[threading.Thread] = None
+
+def split_urls(base_url: str) -> tuple:
+    return tuple(u.strip() for u in base_url.split(",") if u.strip())
+
+def get_pool(base_url: str, api_key: str) -> EndpointPool:
+    """Pool for a (possibly comma-separated) base URL setting."""
+    urls = split_urls(base_url)
+    with _lock:
+        pool = _pools.get((urls, api_key))
+        if pool is None:
+            for url in urls:
+                _endpoints.setdefault(url, Endpoint(url, api_key))
+            pool = EndpointPool([_endpoints[url] for url in urls])
+            _pools[(urls, api_key)] = pool
+            if len(urls) > 1:
+                _start_probe()
+        return pool
+
+def endpoint_stats() -> dict:
+    with _lock:
+        endpoints = list(_endpoints.values())
+    return {e.base_url: e.snapshot() for e in endpoints}
+
+def _probe(endpoint: Endpoint) -> None:
+    try:
+        r = httpx.get(
+            f"{endpoint.base_url.rstrip('/')}/models",
+            headers={"Authorization": f"Bearer {endpoint.api_key}"},
+            timeout=2.0,
+        )
+        healthy = r.status_code < 500
+    except httpx.HTTPError:
+        healthy = False
+    if not healthy:
+        endpoint.stats["probe_failures"] += 1
+    if healthy != endpoint.healthy:
+        print(f"[LB] {endpoint.base_url} is {'healthy' if healthy else 'unhealthy'}")
+    endpoint.healthy = healthy
+
+def _probe_loop() -> None:
+    while True:
+        time.sleep(LB_HEALTH_INTERVAL_S)
+        with _lock:
+            endpoints = [e for pool in _pools.values() if len(pool.endpoints) > 1 for e in pool.endpoints]
+        for endpoint in dict.fromkeys(endpoints):
+            _probe(endpoint)
+
+def _start_probe() -> None:
+    global _probe_thread
+    if _probe_thread is None and LB_HEALTH_INTERVAL_S > 0:
+        _probe_thread = threading.Thread(target=_probe_loop, name="lb-health-probe", daemon=True)
+        _probe_thread.start()
@@ -0,0 +1,139 @@
+"""
+Micro-batching dispatcher for the JSON classifier calls (safety, state, triage).
+
+With many concurrent sessions each request used to send its own completion
+the moment it arrived. When CLASSIFIER_BATCH_WINDOW_MS > 0, classifier calls
+are instead collected for up to that many milliseconds (or until
+CLASSIFIER_BATCH_MAX are waiting), then dispatched together:
+
+- identical requests in a batch (same role, messages, schema and profile)
+  are sent once and the reply is fanned out to every waiter
+- the rest go out concurrently on the role's shared async client, so the
+  inference server sees a burst it can batch instead of a trickle
+
+OpenAI-compatible chat endpoints take one conversation per request, so
+"one batched call" is not available here; a batch is a concurrent burst.
+"""
+from __future__ import annotations
+import asyncio
+import contextvars
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+from .config import CLASSIFIER_BATCH_WINDOW_MS, CLASSIFIER_BATCH_MAX
+from .generation import GenerationProfile
+from .llm_backend import ChatMsg, get_async_backend
+from .resilience import current_deadline, set_deadline
+
+
+class MicroBatcher:
+    def __init__(self, window_ms: float, max_batch: int):
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._pending: List[Tuple[str, str, list, Optional[type], Optional[GenerationProfile], contextvars.Context, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._inflight: set = set()  # keep dispatched tasks referenced until done
+        self.stats = {"batches": 0, "requests": 0, "llm_calls": 0, "deduplicated": 0, "max_batch_seen": 0}
+
+    def snapshot(self) -> dict:
+        batches = self.stats["batches"]
+        return {
+            **self.stats,
+            "enabled": self.window > 0,
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "avg_batch": round(self.stats["requests"] / batches, 2) if batches else 0.0,
+        }
+
+    async def submit(
+        self,
+        role: str,
+        messages: List[ChatMsg],
+        schema: Optional[Type[BaseModel]] = None,
+        profile: Optional[GenerationProfile] = None,
+    ) -> str:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or a new event loop (tests): nothing pending can be reused
+            self._loop, self._pending, self._timer = loop, [], None
+
+        fut = loop.create_future()
+        key = _request_key(role, messages, schema, profile)
+        # the caller's context: its deadline and session (server affinity)
+        self._pending.append((key, role, messages, schema, profile, contextvars.copy_context(), fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        groups: Dict[str, list] = {}
+        for item in batch:
+            groups.setdefault(item[0], []).append(item)
+
+        self.stats["batches"] += 1
+        self.stats["requests"] += len(batch)
+        self.stats["llm_calls"] += len(groups)
+        self.stats["deduplicated"] += len(batch) - len(groups)
+        self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(batch))
+
+        for items in groups.values():
+            _, role, messages, schema, profile, _, _ = items[0]
+            # The shared call runs in its first waiter's context, with the
+            # most generous deadline of all its waiters
+            deadlines = [i[-2].run(current_deadline) for i in items]
+            ctx = items[0][-2].copy()
+            ctx.run(set_deadline, None if None in deadlines else max(deadlines))
+            task = ctx.run(self._loop.create_task, get_async_backend(role).chat(messages, schema=schema, profile=profile))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+            task.add_done_callback(lambda t, items=items: _fan_out(t, [i[-1] for i in items]))
+
+
+def _request_key(role: str, messages: List[ChatMsg], schema, profile) -> str:
+    payload = json.dumps(
+        [role, [(m.role, m.content) for m in messages], schema.__name__ if schema else None, repr(profile)]
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _fan_out(task: asyncio.Task, futures: List[asyncio.Future]) -> None:
+    exc = None if task.cancelled() else task.exception()  # always retrieve it
+    for fut in futures:
+        if fut.done():  # waiter was cancelled
+            continue
+        if task.cancelled():
+            fut.cancel()
+        elif exc is not None:
+            fut.set_exception(exc)
+        else:
+            fut.set_result(task.result())
+
+
+_batcher = MicroBatcher(CLASSIFIER_BATCH_WINDOW_MS, CLASSIFIER_BATCH_MAX)
+
+def get_batcher() -> MicroBatcher:
+    return _batcher
+
+async def classifier_chat(
+    role: str,
+    messages: List[ChatMsg],
+    schema: Optional[Type[BaseModel]] = None,
+    profile: Optional[GenerationProfile] = None,
+) -> str:
+    """backend.chat for classifier roles, through the micro-batcher when enabled."""
+    if _batcher.window <= 0:
+        return await get_async_backend(role).chat(messages, schema=schema, profile=profile)
+    return await _batcher.submit(role, messages, schema, profile)
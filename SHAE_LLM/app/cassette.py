@@ -0,0 +1,123 @@
+"""
+Record / replay of LLM completions (LLM_CASSETTE_MODE).
+
+- record: every completion made through app/llm_backend.py is appended to
+  LLM_CASSETTE_PATH (one JSON object per line) with its wall time, and for
+  streamed coach replies the offset of each chunk.
+- replay: completions come from the file instead of a model server. With
+  LLM_CASSETTE_REPLAY_TIMING the recorded latency and chunk pacing are
+  slept; without it answers are immediate, which leaves only the Python
+  side of a turn to profile.
+
+A request is keyed by a hash of what would be sent: the final messages
+(after _build_messages), model, sampling settings and response_format.
+Identical requests replay in recorded order; once a key runs out its last
+answer is reused. A request that was never recorded raises CassetteMiss,
+so a replay that diverges from the recording fails loudly.
+
+bench/replay_session.py records a conversation and replays it under
+cProfile.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from .config import LLM_CASSETTE_MODE, LLM_CASSETTE_PATH, LLM_CASSETTE_REPLAY_TIMING
+
+_IGNORED_KWARGS = ("stream", "stream_options")  # transport, not content
+
+
+class CassetteMiss(RuntimeError):
+    pass
+
+
+def request_key(kwargs: dict) -> str:
+    material = {k: v for k, v in kwargs.items() if k not in _IGNORED_KWARGS}
+    blob = json.dumps(material, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:32]
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str, replay_timing: bool = False):
+        if mode not in ("record", "replay"):
+            raise RuntimeError(f"Unknown LLM_CASSETTE_MODE: {mode}. Use 'off', 'record' or 'replay'")
+        self.path = path
+        self.mode = mode
+        self.replay_timing = replay_timing
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[dict]] = defaultdict(list)
+        self._cursor: Dict[str, int] = {}
+        self.stats = {"recorded": 0, "replayed": 0, "misses": 0}
+        if mode == "replay":
+            self._load()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            raise RuntimeError(f"LLM cassette not found: {self.path}")
+        n = 0
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry["key"]].append(entry)
+                    n += 1
+        print(f"[CASSETTE] replaying {n} calls from {self.path}")
+
+    def record(self, role: str, kwargs: dict, text: str, seconds: float, chunks: Optional[list] = None) -> None:
+        entry = {
+            "key": request_key(kwargs),
+            "role": role,
+            "model": kwargs.get("model"),
+            "ms": round(seconds * 1000, 1),
+            "text": text,
+        }
+        if chunks is not None:
+            entry["chunks"] = chunks  # [[ms since the call started, delta], ...]
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self.stats["recorded"] += 1
+
+    def lookup(self, role: str, kwargs: dict) -> dict:
+        key = request_key(kwargs)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.stats["misses"] += 1
+                raise CassetteMiss(f"no recorded {role} call for request {key} in {self.path}")
+            i = self._cursor.get(key, 0)
+            self._cursor[key] = i + 1
+            self.stats["replayed"] += 1
+            return entries[min(i, len(entries) - 1)]
+
+    def delay(self, entry: dict) -> float:
+        """Seconds to wait before answering `entry` (0 unless replay timing is on)."""
+        return entry["ms"] / 1000 if self.replay_timing else 0.0
+
+
+_cassette: Optional[Cassette] = None
+_cassette_lock = threading.Lock()
+
+def get_cassette() -> Optional[Cassette]:
+    """The process-wide cassette, or None when LLM_CASSETTE_MODE is off."""
+    global _cassette
+    if LLM_CASSETTE_MODE == "off":
+        return None
+    if _cassette is None:
+        with _cassette_lock:
+            if _cassette is None:
+                _cassette = Cassette(LLM_CASSETTE_PATH, LLM_CASSETTE_MODE, LLM_CASSETTE_REPLAY_TIMING)
+    return _cassette
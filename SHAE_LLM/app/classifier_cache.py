@@ -0,0 +1,195 @@
+"""
+Content-addressed cache for the safety, state and fused triage classifier
+results.
+
+Key = sha256 of (kind, normalized message, prompt version, model, context
+hash). The prompt version is a hash of SAFETY_SYSTEM / STATE_PROMPT /
+TRIAGE_PROMPT, so editing a prompt or switching models never serves old
+answers.
+
+Two tiers:
+- in-memory LRU with TTL (CLASSIFIER_CACHE_SIZE, CLASSIFIER_CACHE_TTL_SECONDS)
+- optional SQLite tier that survives restarts (CLASSIFIER_CACHE_DB),
+  opened when the cache is first used, not at import
+
+Only hashed keys and parsed results are stored, never the message text.
+Crisis results are never stored, and a crisis result read back from the
+persistent tier is treated as a miss, so crisis always gets a fresh check.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import List, Optional
+
+from .config import CLASSIFIER_CACHE_SIZE, CLASSIFIER_CACHE_TTL_SECONDS, CLASSIFIER_CACHE_DB
+from .prompts import SAFETY_SYSTEM, STATE_PROMPT, TRIAGE_PROMPT
+from .schemas import SafetyResult
+
+_WS_RE = re.compile(r"\s+")
+_EDGE_PUNCT = " \t\n.!?,;:~"
+
+def normalize_message(text: str) -> str:
+    """'  I'm   FINE!! ' -> "i'm fine" (NFKC, casefold, collapse whitespace)."""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    text = text.replace("’", "'")
+    return _WS_RE.sub(" ", text).strip(_EDGE_PUNCT)
+
+def _sha(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+SAFETY_PROMPT_VERSION = _sha(SAFETY_SYSTEM)[:16]
+STATE_PROMPT_VERSION = _sha(STATE_PROMPT)[:16]
+TRIAGE_PROMPT_VERSION = _sha(TRIAGE_PROMPT)[:16]
+
+def context_hash(lines: List[str]) -> str:
+    return _sha("\n".join(lines))[:16] if lines else ""
+
+
+class ClassifierCache:
+    def __init__(self, max_entries: int, ttl_seconds: float, db_path: str = ""):
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl_seconds
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path and self.max_entries:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+            CREATE TABLE IF NOT EXISTS classifier_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """)
+            self._db.commit()
+        self.stats = {"hits": 0, "persistent_hits": 0, "misses": 0, "stores": 0, "crisis_rechecks": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "size": len(self._mem),
+                "max_size": self.max_entries,
+                "persistent": self._db is not None,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
+
+    def get(self, key: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            item = self._mem.get(key)
+            if item is not None:
+                if item[0] > now:
+                    self._mem.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return item[1]
+                del self._mem[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM classifier_cache WHERE key=?", (key,)
+                ).fetchone()
+                if row and row[1] > now:
+                    value = json.loads(row[0])
+                    if value.get("severity") == "crisis":
+                        self.stats["crisis_rechecks"] += 1
+                    else:
+                        self._put_mem(key, row[1], value)
+                        self.stats["hits"] += 1
+                        self.stats["persistent_hits"] += 1
+                        return value
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, value: dict) -> None:
+        if not self.enabled or value.get("severity") == "crisis":
+            return
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._put_mem(key, expires_at, value)
+            self.stats["stores"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO classifier_cache(key, value, expires_at) VALUES(?,?,?)",
+                    (key, json.dumps(value), expires_at),
+                )
+                self._db.commit()
+
+    def _put_mem(self, key: str, expires_at: float, value: dict) -> None:
+        # caller holds self._lock
+        self._mem[key] = (expires_at, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+
+_cache: Optional[ClassifierCache] = None
+_cache_lock = threading.Lock()
+
+def get_classifier_cache() -> ClassifierCache:
+    """The classifier cache, created (and CLASSIFIER_CACHE_DB opened) on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ClassifierCache(CLASSIFIER_CACHE_SIZE, CLASSIFIER_CACHE_TTL_SECONDS, CLASSIFIER_CACHE_DB)
+    return _cache
+
+# -------- safety --------
+
+def safety_key(user_message: str, model: str) -> str:
+    # The safety prompt only sees the message, so there is no context part.
+    return _sha(f"safety|{SAFETY_PROMPT_VERSION}|{model}||{normalize_message(user_message)}")
+
+def get_safety(key: str) -> Optional[SafetyResult]:
+    value = get_classifier_cache().get(key)
+    if value is None:
+        return None
+    result = SafetyResult.model_validate(value)
+    if result.severity == "crisis":  # never serve crisis without re-checking
+        return None
+    return result
+
+def put_safety(key: str, result: SafetyResult) -> None:
+    get_classifier_cache().put(key, result.model_dump())
+
+# -------- state --------
+
+def state_key(user_message: str, model: str, context_lines: List[str]) -> str:
+    return _sha(f"state|{STATE_PROMPT_VERSION}|{model}|{context_hash(context_lines)}|{normalize_message(user_message)}")
+
+def get_state(key: str) -> Optional[dict]:
+    value = get_classifier_cache().get(key)
+    return dict(value) if value is not None else None
+
+def put_state(key: str, state: dict) -> None:
+    get_classifier_cache().put(key, state)
+
+# -------- triage (fused safety + state) --------
+
+def triage_key(user_message: str, model: str, context_lines: List[str]) -> str:
+    return _sha(f"triage|{TRIAGE_PROMPT_VERSION}|{model}|{context_hash(context_lines)}|{normalize_message(user_message)}")
+
+def get_triage(key: str) -> Optional[dict]:
+    value = get_classifier_cache().get(key)
+    if value is None or value.get("severity") == "crisis":
+        return None
+    return dict(value)
+
+def put_triage(key: str, value: dict) -> None:
+    get_classifier_cache().put(key, value)
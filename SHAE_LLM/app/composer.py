@@ -4,8 +4,6 @@ from .llm_backend import ChatMsg, get_backend
 from .schemas import NegativeOut, NeutralOut, PositiveOut
 from .prompts import COMPOSER_SYSTEM
 
-_backend = get_backend()
-
 def compose_reply(
     user_message: str,
     negative: Optional[NegativeOut],
@@ -23,4 +21,4 @@ def compose_reply(
         ChatMsg("system", COMPOSER_SYSTEM),
         ChatMsg("user", str(bundle)),
     ]
-    return _backend.chat(msgs).strip()
+    return get_backend().chat(msgs).strip()
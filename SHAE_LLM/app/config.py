@@ -1,8 +1,10 @@
 import os
 from dotenv import load_dotenv
 
-# Load .env from project root
-load_dotenv(dotenv_path=".env")
+# Load .env from project root (SHAE_LLM/, next to app/), wherever the
+# process was started from. Variables already set in the environment win.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+load_dotenv(dotenv_path=os.path.join(PROJECT_ROOT, ".env"))
 
 BACKEND = os.getenv("BACKEND", "hf_router").strip()
 
@@ -19,9 +21,148 @@ HF_CHAT_MODEL = os.getenv(
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/v1").strip()
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b").strip()
 
+# Several inference servers: list them comma-separated in OLLAMA_BASE_URL
+# (or <ROLE>_BASE_URL). Calls are balanced with LB_STRATEGY ("p2c" or
+# "least_outstanding"); with LB_SESSION_AFFINITY a session sticks to one
+# server (its prompt cache) unless that server has LB_AFFINITY_SLACK more
+# requests in flight than the least loaded one. Servers are probed every
+# LB_HEALTH_INTERVAL_S (0 disables probing).
+LB_STRATEGY = os.getenv("LB_STRATEGY", "p2c").strip().lower()
+LB_SESSION_AFFINITY = os.getenv("LB_SESSION_AFFINITY", "true").strip().lower() in ("1", "true", "yes")
+LB_AFFINITY_SLACK = int(os.getenv("LB_AFFINITY_SLACK", "4"))
+LB_HEALTH_INTERVAL_S = float(os.getenv("LB_HEALTH_INTERVAL_S", "10"))
+
+# Per-role model routing: <ROLE>_MODEL / <ROLE>_BASE_URL / <ROLE>_API_KEY
+# for safety, state, triage, coach, summary (e.g. a 1-3B model for the JSON
+# classifiers). Unset fields use the BACKEND defaults above; triage falls
+# back to the safety settings first.
+LLM_ROLES = ("safety", "state", "triage", "coach", "summary")
+ROLE_MODELS = {role: os.getenv(f"{role.upper()}_MODEL", "").strip() for role in LLM_ROLES}
+ROLE_BASE_URLS = {role: os.getenv(f"{role.upper()}_BASE_URL", "").strip() for role in LLM_ROLES}
+ROLE_API_KEYS = {role: os.getenv(f"{role.upper()}_API_KEY", "").strip() for role in LLM_ROLES}
+
+# LLM transport: keep-alive connection pool per inference server, timeouts,
+# our own bounded jittered retries (429/5xx/connection errors) and a circuit
+# breaker that fails fast once a server keeps failing. CHAT_DEADLINE_SECONDS
+# bounds all LLM calls of one /chat turn (0 disables); past it, or while the
+# breaker is open, /chat answers with the degraded reply.
+LLM_CONNECT_TIMEOUT_S = float(os.getenv("LLM_CONNECT_TIMEOUT_S", "5"))
+LLM_READ_TIMEOUT_S = float(os.getenv("LLM_READ_TIMEOUT_S", "60"))
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "64"))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "32"))
+LLM_KEEPALIVE_EXPIRY_S = float(os.getenv("LLM_KEEPALIVE_EXPIRY_S", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_MS = float(os.getenv("LLM_RETRY_BASE_MS", "200"))
+LLM_RETRY_MAX_MS = float(os.getenv("LLM_RETRY_MAX_MS", "2000"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "15"))
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "30"))
+
+# Admission control for /chat: turns of one session run in order (at most
+# SESSION_MAX_QUEUED waiting), at most MAX_CONCURRENT_TURNS run at once
+# (0 disables) and up to ADMISSION_QUEUE_SIZE wait for a slot for at most
+# ADMISSION_QUEUE_TIMEOUT_S. Anything beyond gets a 429 with Retry-After.
+MAX_CONCURRENT_TURNS = int(os.getenv("MAX_CONCURRENT_TURNS", "32"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "64"))
+ADMISSION_QUEUE_TIMEOUT_S = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "10"))
+SESSION_MAX_QUEUED = int(os.getenv("SESSION_MAX_QUEUED", "4"))
+
+# Metrics (GET /metrics). LLM_STREAM_USAGE asks streamed completions for a
+# final usage chunk (stream_options.include_usage); DEBUG_LLM_CALLS adds
+# every LLM call of a turn to ChatResponse.debug["llm_calls"].
+LLM_STREAM_USAGE = os.getenv("LLM_STREAM_USAGE", "true").strip().lower() in ("1", "true", "yes")
+DEBUG_LLM_CALLS = os.getenv("DEBUG_LLM_CALLS", "false").strip().lower() in ("1", "true", "yes")
+
+# Record / replay of LLM calls (app/cassette.py): "off", "record" (append
+# every completion to LLM_CASSETTE_PATH) or "replay" (serve completions from
+# it, no model server). LLM_CASSETTE_REPLAY_TIMING sleeps the recorded latency.
+LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "off").strip().lower()
+LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", "llm_cassette.jsonl").strip()
+LLM_CASSETTE_REPLAY_TIMING = os.getenv("LLM_CASSETTE_REPLAY_TIMING", "false").strip().lower() in ("1", "true", "yes")
+
+# Startup warm-up: load every configured model in the background at startup
+# so the first user doesn't pay for it; GET /ready turns 200 once it is done.
+# Ollama gets a prompt-less /api/generate with LLM_WARMUP_KEEP_ALIVE (how
+# long the model stays loaded; later requests use the server's
+# OLLAMA_KEEP_ALIVE), other servers a 1-token completion.
+LLM_WARMUP = os.getenv("LLM_WARMUP", "false").strip().lower() in ("1", "true", "yes")
+LLM_WARMUP_KEEP_ALIVE = os.getenv("LLM_WARMUP_KEEP_ALIVE", "30m").strip()
+LLM_WARMUP_TIMEOUT_S = float(os.getenv("LLM_WARMUP_TIMEOUT_S", "120"))
+
 # LLM Parameters
 MAX_NEW_TOKENS = int(os.getenv("MAX_NEW_TOKENS", "512"))
 TEMPERATURE = float(os.getenv("TEMPERATURE", "0.3"))
 TOP_P = float(os.getenv("TOP_P", "0.9"))
 
 APP_ENV = os.getenv("APP_ENV", "dev").strip()
+
+# Speculative classification: run safety and state (optionally the coach too)
+# in parallel instead of back to back. A crisis verdict discards the results.
+SPECULATIVE_CLASSIFIERS = os.getenv("SPECULATIVE_CLASSIFIERS", "false").strip().lower() in ("1", "true", "yes")
+SPECULATIVE_COACH = os.getenv("SPECULATIVE_COACH", "false").strip().lower() in ("1", "true", "yes")
+
+# Micro-batching of classifier calls across concurrent sessions: collect
+# for up to CLASSIFIER_BATCH_WINDOW_MS (0 disables) or CLASSIFIER_BATCH_MAX
+# requests, then send them together with identical requests deduplicated.
+CLASSIFIER_BATCH_WINDOW_MS = float(os.getenv("CLASSIFIER_BATCH_WINDOW_MS", "0"))
+CLASSIFIER_BATCH_MAX = int(os.getenv("CLASSIFIER_BATCH_MAX", "32"))
+
+# Constrained decoding for the JSON classifiers (safety, state, triage):
+# "off", "json_object" (any valid JSON) or "json_schema" (schema generated
+# from the pydantic models; Ollama >= 0.5 maps it to its `format` option).
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "off").strip().lower()
+
+# Send prior turns as real user/assistant messages instead of a RECENT TURNS
+# text block inside the prompt.
+CHAT_HISTORY_AS_MESSAGES = os.getenv("CHAT_HISTORY_AS_MESSAGES", "false").strip().lower() in ("1", "true", "yes")
+
+# Token budget for the summary + recent turns in each agent prompt
+# (<ROLE>_CONTEXT_TOKENS; app/context_budget.py). Each request loads the
+# newest CONTEXT_MAX_TURNS turns; a role with a budget takes as many as
+# fit, a role with 0 its fixed window (8 classifiers, 12 coach).
+# TOKENIZER: "approx" (~4 chars/token), "hf:<repo or tokenizer.json>"
+# (needs `tokenizers`) or "tiktoken:<encoding>" (needs `tiktoken`).
+# Token counts of stored turns are memoized (TOKEN_COUNT_CACHE_SIZE, 0 disables).
+TOKENIZER = os.getenv("TOKENIZER", "approx").strip()
+TOKEN_COUNT_CACHE_SIZE = int(os.getenv("TOKEN_COUNT_CACHE_SIZE", "8192"))
+_DEFAULT_CONTEXT_TOKENS = {"state": 768, "triage": 768, "coach": 1536}
+CONTEXT_TOKEN_BUDGETS = {
+    role: int(os.getenv(f"{role.upper()}_CONTEXT_TOKENS", str(default)))
+    for role, default in _DEFAULT_CONTEXT_TOKENS.items()
+}
+CONTEXT_MAX_TURNS = int(os.getenv("CONTEXT_MAX_TURNS", "40"))
+
+# "separate": SAFETY_SYSTEM and STATE_PROMPT calls (default).
+# "fused": one TRIAGE_PROMPT call returns both (speculation is not used).
+CLASSIFIER_MODE = os.getenv("CLASSIFIER_MODE", "separate").strip().lower()
+
+# Background session summarization
+SUMMARY_DEBOUNCE_SECONDS = float(os.getenv("SUMMARY_DEBOUNCE_SECONDS", "2.0"))
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "1"))
+
+# Session memory engine (app/session_store.py): "sqlite" (one file,
+# SHAE_DB_PATH), "sharded" (SESSION_STORE_SHARDS files next to it, sessions
+# hashed across them) or "memory" (process-local, not persisted).
+SESSION_STORE = os.getenv("SESSION_STORE", "sqlite").strip().lower()
+SESSION_STORE_SHARDS = int(os.getenv("SESSION_STORE_SHARDS", "8"))
+
+# In-process cache of hot session windows (0 disables). Off by default: a
+# worker only sees its own writes, so with several workers a cached
+# window goes stale as soon as another worker serves the session.
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "0"))
+SESSION_CACHE_TTL_SECONDS = float(os.getenv("SESSION_CACHE_TTL_SECONDS", "900"))
+
+# Safety/state classifier result cache (0 disables). CLASSIFIER_CACHE_DB
+# enables a persistent SQLite tier that survives restarts.
+CLASSIFIER_CACHE_SIZE = int(os.getenv("CLASSIFIER_CACHE_SIZE", "4096"))
+CLASSIFIER_CACHE_TTL_SECONDS = float(os.getenv("CLASSIFIER_CACHE_TTL_SECONDS", "3600"))
+CLASSIFIER_CACHE_DB = os.getenv("CLASSIFIER_CACHE_DB", "").strip()
+
+# Local pre-classifier for trivial messages ("ok", "thanks", 🙂): skips the
+# safety and state LLM calls when its confidence is at least the minimum.
+PRECLASSIFIER_ENABLED = os.getenv("PRECLASSIFIER_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+PRECLASSIFIER_MIN_CONFIDENCE = float(os.getenv("PRECLASSIFIER_MIN_CONFIDENCE", "0.85"))
+
+# Extra crisis phrase lists for the keyword pre-check (comma-separated file
+# paths, one phrase per line). Merged with the built-in list at startup.
+CRISIS_PHRASES_PATH = os.getenv("CRISIS_PHRASES_PATH", "").strip()
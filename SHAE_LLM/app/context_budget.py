@@ -0,0 +1,190 @@
+"""
+Token-budgeted prompt context.
+
+Each agent prompt gets the session summary plus as many of the newest
+turns as fit in its role's budget (<ROLE>_CONTEXT_TOKENS). Requests load
+the newest CONTEXT_MAX_TURNS turns, so short turns fill the budget with
+more history and a pasted wall of text costs at most the budget in
+prefill, instead of riding along for the next dozen turns. A role with
+budget 0 gets its fixed turn window instead (agents.py: 8 for the
+classifiers, 12 for the coach).
+
+Filling, newest turn first:
+- the summary is always kept, clipped to half the budget if it is longer
+- older turns are added while they fit; the first one that doesn't ends
+  the window (no gaps in the conversation)
+- if not even the newest turn fits, it is clipped to what is left
+
+Tokenizer (TOKENIZER):
+- "approx" (default): ~4 characters per token, never fewer tokens than
+  words. Errs high for English; no dependencies.
+- "hf:<repo or tokenizer.json path>": the model's own tokenizer through
+  the `tokenizers` package
+- "tiktoken:<encoding>": e.g. tiktoken:cl100k_base
+If the package or the tokenizer can't be loaded, the approximation is used.
+Code can plug in any counter with set_tokenizer().
+
+Counts are memoized per turn text (TOKEN_COUNT_CACHE_SIZE, LRU): a stored
+turn is counted once, not on every request that has it in its window.
+"""
+from __future__ import annotations
+import math
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+from .config import TOKENIZER, TOKEN_COUNT_CACHE_SIZE, CONTEXT_TOKEN_BUDGETS
+from .metrics import CONTEXT_TOKENS, CONTEXT_TURNS_DROPPED
+
+_CLIP_MARK = " …"
+
+
+# ---------------------------
+# Tokenizers
+# ---------------------------
+
+def approx_tokens(text: str) -> int:
+    if not text:
+        return 0
+    return max(len(text.split()), math.ceil(len(text) / 4))
+
+
+def _load_tokenizer(spec: str) -> Tuple[str, Callable[[str], int]]:
+    """(name, count_fn) for a TOKENIZER value; falls back to approx_tokens."""
+    kind, _, arg = spec.partition(":")
+    try:
+        if kind == "hf" and arg:
+            import os
+            from tokenizers import Tokenizer
+
+            tok = Tokenizer.from_file(arg) if os.path.isfile(arg) else Tokenizer.from_pretrained(arg)
+            return spec, lambda text: len(tok.encode(text, add_special_tokens=False).ids)
+        if kind == "tiktoken" and arg:
+            import tiktoken
+
+            enc = tiktoken.get_encoding(arg)
+            return spec, lambda text: len(enc.encode(text, disallowed_special=()))
+    except Exception as e:
+        print(f"[CONTEXT] tokenizer {spec} unavailable ({type(e).__name__}: {e}); using approx")
+        return "approx", approx_tokens
+    if kind != "approx":
+        print(f"[CONTEXT] unknown TOKENIZER {spec}; using approx")
+    return "approx", approx_tokens
+
+
+class TokenCounter:
+    def __init__(self, count_fn: Callable[[str], int], name: str, max_entries: int):
+        self.count_fn = count_fn
+        self.name = name
+        self.max_entries = max(0, max_entries)
+        self._memo: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if not self.max_entries:
+            return self.count_fn(text)
+        with self._lock:
+            n = self._memo.get(text)
+            if n is not None:
+                self._memo.move_to_end(text)
+                self.stats["hits"] += 1
+                return n
+            self.stats["misses"] += 1
+        n = self.count_fn(text)
+        with self._lock:
+            self._memo[text] = n
+            while len(self._memo) > self.max_entries:
+                self._memo.popitem(last=False)
+        return n
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "size": len(self._memo), "max_size": self.max_entries, "tokenizer": self.name}
+
+
+_counter: Optional[TokenCounter] = None
+_counter_lock = threading.Lock()
+
+def get_token_counter() -> TokenCounter:
+    """The TOKENIZER counter, loaded on first use."""
+    global _counter
+    if _counter is None:
+        with _counter_lock:
+            if _counter is None:
+                name, fn = _load_tokenizer(TOKENIZER)
+                _counter = TokenCounter(fn, name, TOKEN_COUNT_CACHE_SIZE)
+    return _counter
+
+def set_tokenizer(count_fn: Callable[[str], int], name: str = "custom") -> None:
+    """Use count_fn(text) -> tokens from now on (drops memoized counts)."""
+    global _counter
+    with _counter_lock:
+        _counter = TokenCounter(count_fn, name, TOKEN_COUNT_CACHE_SIZE)
+
+def count_tokens(text: str) -> int:
+    return get_token_counter().count(text)
+
+
+# ---------------------------
+# Budgeted context
+# ---------------------------
+
+def _clip(text: str, max_tokens: int) -> Tuple[str, int]:
+    """(head of `text` that fits in max_tokens, its token count)."""
+    n = count_tokens(text)
+    if n <= max_tokens:
+        return text, n
+    if max_tokens <= 0:
+        return "", 0
+    # Cut proportionally, then shrink until it fits. Clipped variants are
+    # counted uncached so they don't push stored turns out of the memo.
+    count_fn = get_token_counter().count_fn
+    keep = len(text) * max_tokens // n
+    for _ in range(8):
+        clipped = text[:keep].rstrip() + _CLIP_MARK
+        m = count_fn(clipped)
+        if m <= max_tokens:
+            return clipped, m
+        keep = keep * 9 // 10
+    return "", 0
+
+
+def clip_to_tokens(text: str, max_tokens: int) -> str:
+    """Head of `text` that fits in max_tokens (marked with an ellipsis)."""
+    return _clip(text, max_tokens)[0]
+
+
+def fit_context(role: str, summary: str, turns: List[str]) -> Tuple[str, List[str]]:
+    """
+    (summary, newest turns) within the role's token budget; `turns` are
+    'role: text' lines, oldest first.
+    """
+    budget = CONTEXT_TOKEN_BUDGETS.get(role, 0)
+    if budget <= 0:
+        return summary, turns
+
+    summary, used = _clip(summary, budget // 2)
+    left = budget - used
+
+    kept: List[str] = []
+    for line in reversed(turns):
+        n = count_tokens(line)
+        if n <= left:
+            kept.append(line)
+            left -= n
+            continue
+        if not kept:
+            clipped, n = _clip(line, left)
+            if clipped:
+                kept.append(clipped)
+                left -= n
+        break
+    kept.reverse()
+
+    CONTEXT_TOKENS.observe(budget - left, role=role)
+    if len(kept) < len(turns):
+        CONTEXT_TURNS_DROPPED.inc(len(turns) - len(kept), role=role)
+    return summary, kept
@@ -0,0 +1,196 @@
+"""
+Keyword crisis matcher used before the LLM safety check.
+
+Built once at import from the built-in phrase list plus any files listed in
+CRISIS_PHRASES_PATH (comma-separated; one phrase per line, '#' comments).
+Matching is a single Aho-Corasick pass over the normalized message, so cost
+depends on message length, not on how many phrases are loaded.
+
+Normalization (applied to phrases and messages alike):
+- NFKC, casefold, accents stripped, curly quotes folded
+- common digit/symbol substitutions (su1c1de, k!ll) mapped back to letters
+- apostrophes dropped, other punctuation treated as whitespace
+- runs of a repeated letter collapsed (suicideee, kiiill)
+- whitespace ignored inside a phrase ("kill my self" == "kill myself")
+- a match must start on a word boundary ("therapist" does not match
+  "rapist") but may end inside a word, so inflections still match, as
+  they did with the old substring scan ("suicides", "suicide's",
+  "suicidally")
+"""
+from __future__ import annotations
+import os
+import unicodedata
+from typing import Iterable, List, Optional, Tuple
+
+from .config import CRISIS_PHRASES_PATH
+
+DEFAULT_PHRASES = [
+    # English
+    "kill myself", "end my life", "suicide", "suicidal",
+    "want to die", "better off dead", "plan to die",
+    "harm myself", "hurt myself", "cut myself",
+    "take my own life", "taking my own life", "end it all",
+    "don't want to live", "dont want to be alive", "no reason to live",
+    "wish i was dead", "wish i were dead", "going to kill myself",
+    "hang myself", "slit my wrists",
+    # Hinglish / Hindi (romanized)
+    "khudkushi", "khud kushi", "aatmahatya", "atmahatya",
+    "marna chahta hoon", "marna chahti hoon", "marna chahta hu", "marna chahti hu",
+    "mar jana chahta", "mar jana chahti", "mar jaana chahta", "mar jaana chahti",
+    "jeena nahi chahta", "jeena nahi chahti", "jeene ka mann nahi",
+    "zindagi khatam", "apni jaan le", "khud ko nuksan", "khud ko hurt",
+    # Devanagari
+    "आत्महत्या", "मरना चाहता", "मरना चाहती", "जीना नहीं चाहता", "जीना नहीं चाहती",
+]
+
+_LEET = {"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "@": "a", "$": "s", "!": "i"}
+_QUOTES = str.maketrans({"’": "'", "‘": "'", "`": "'"})
+
+
+def _tokens(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKC", text or "").casefold().translate(_QUOTES)
+    # strip accents but keep Devanagari matras (category Mc/Mn on non-Latin)
+    text = "".join(
+        ch for ch in unicodedata.normalize("NFKD", text)
+        if not (unicodedata.combining(ch) and ord(ch) < 0x0900)
+    )
+    text = unicodedata.normalize("NFC", text)
+
+    tokens = []
+    for raw in text.split():
+        raw = _unleet(raw).replace("'", "")
+        word = []
+        for ch in raw:
+            if ch.isalnum() or unicodedata.category(ch).startswith("M"):
+                word.append(ch)
+            elif word:
+                tokens.append("".join(word))
+                word = []
+        if word:
+            tokens.append("".join(word))
+    return [_squeeze(t) for t in tokens]
+
+
+def _unleet(word: str) -> str:
+    """
+    Map look-alike digits/symbols back to letters, but only next to letters:
+    "k!ll" and "su1c1de" are words, "24/7" and a trailing "!" are not.
+    """
+    out = list(word)
+    for i, ch in enumerate(word):
+        letter = _LEET.get(ch)
+        if letter is None:
+            continue
+        prev_alpha = i > 0 and word[i - 1].isalpha()
+        next_alpha = i + 1 < len(word) and word[i + 1].isalpha()
+        if next_alpha or (prev_alpha and ch.isdigit()):
+            out[i] = letter
+    return "".join(out)
+
+
+def _squeeze(token: str) -> str:
+    out = []
+    for ch in token:
+        if not out or out[-1] != ch or not ch.isalpha():
+            out.append(ch)
+    return "".join(out)
+
+
+def normalize(text: str) -> str:
+    return " ".join(_tokens(text))
+
+
+class CrisisMatcher:
+    """Aho-Corasick automaton over whitespace-free normalized phrases."""
+
+    def __init__(self, phrases: Iterable[str]):
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, str]]] = [[]]  # (compact length, phrase)
+        self.size = 0
+        for p in phrases:
+            self._add(p)
+        self._build()
+
+    def _add(self, phrase: str) -> None:
+        compact = "".join(_tokens(phrase))
+        if not compact:
+            return
+        node = 0
+        for ch in compact:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        if not self._out[node]:
+            self.size += 1
+            self._out[node].append((len(compact), phrase))
+
+    def _build(self) -> None:
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                cand = self._goto[f].get(ch, 0)
+                self._fail[nxt] = cand if cand != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def match(self, text: str) -> Optional[str]:
+        """Return the first crisis phrase found in `text`, or None."""
+        tokens = _tokens(text)
+        if not tokens:
+            return None
+
+        # Word starts as offsets into the whitespace-free string
+        starts, pos = set(), 0
+        for t in tokens:
+            starts.add(pos)
+            pos += len(t)
+        compact = "".join(tokens)
+
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(compact):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                for length, phrase in out[node]:
+                    if (i + 1 - length) in starts:
+                        return phrase
+        return None
+
+
+def load_phrases(paths: str) -> List[str]:
+    phrases = list(DEFAULT_PHRASES)
+    for path in (p.strip() for p in (paths or "").split(",")):
+        if not path:
+            continue
+        if not os.path.exists(path):
+            print(f"[CRISIS] Phrase list not found: {path}")
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    phrases.append(line)
+    return phrases
+
+
+_matcher = CrisisMatcher(load_phrases(CRISIS_PHRASES_PATH))
+
+def get_crisis_matcher() -> CrisisMatcher:
+    return _matcher
+
+def match_crisis(text: str) -> Optional[str]:
+    return _matcher.match(text)
@@ -0,0 +1,63 @@
+"""
+Per-role generation profiles.
+
+MAX_NEW_TOKENS / TEMPERATURE / TOP_P used to apply to every call, so a
+classifier that needs ~60 tokens of JSON was allowed 512, and GROUND coach
+replies that get cut to 3 lines were decoded in full. Each LLM call now
+passes the profile for its role; fields left as None fall back to the
+global settings.
+
+- max_tokens / temperature / top_p / stop: passed to the completion call
+- model: optional per-role model override
+- role: the label the call is reported under in app/metrics.py
+- stop_at_json: stream the reply and close it as soon as the first complete
+  JSON object has arrived (a closing-brace stop that understands nesting,
+  which a plain "}" stop sequence does not)
+"""
+from dataclasses import dataclass
+from typing import List, Optional
+
+from .config import MAX_NEW_TOKENS, TEMPERATURE, TOP_P
+
+
+@dataclass(frozen=True)
+class GenerationProfile:
+    max_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+    top_p: Optional[float] = None
+    stop: Optional[List[str]] = None
+    model: Optional[str] = None
+    stop_at_json: bool = False
+    role: str = "default"
+
+    def sampling_kwargs(self) -> dict:
+        kwargs = {
+            "max_tokens": self.max_tokens if self.max_tokens is not None else MAX_NEW_TOKENS,
+            "temperature": self.temperature if self.temperature is not None else TEMPERATURE,
+            "top_p": self.top_p if self.top_p is not None else TOP_P,
+        }
+        if self.stop:
+            kwargs["stop"] = list(self.stop)
+        return kwargs
+
+
+DEFAULT_PROFILE = GenerationProfile()
+
+PROFILES = {
+    # JSON classifiers: deterministic, short, stop after the object
+    "safety": GenerationProfile(max_tokens=160, temperature=0.0, stop_at_json=True, role="safety"),
+    "state": GenerationProfile(max_tokens=96, temperature=0.0, stop_at_json=True, role="state"),
+    "triage": GenerationProfile(max_tokens=224, temperature=0.0, stop_at_json=True, role="triage"),
+    # Coach: GROUND and the default mode are capped to 3 lines + UI_ACTION,
+    # PLAN to 10 lines (see agents._coach_line_cap)
+    "coach": GenerationProfile(max_tokens=200, role="coach"),
+    "coach_plan": GenerationProfile(max_tokens=640, role="coach"),
+    # Summary stays under 1200 characters (SESSION_SUMMARY_PROMPT)
+    "summary": GenerationProfile(max_tokens=400, temperature=0.2, role="summary"),
+}
+
+
+def get_profile(role: str, mode: str = "") -> GenerationProfile:
+    if role == "coach" and mode == "PLAN":
+        role = "coach_plan"
+    return PROFILES.get(role, DEFAULT_PROFILE)
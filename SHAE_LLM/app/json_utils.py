@@ -1,23 +1,81 @@
 import json
-import re
-from typing import Type, TypeVar, Optional
-from pydantic import BaseModel, ValidationError
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Type, TypeVar
+from pydantic import BaseModel
 
 T = TypeVar("T", bound=BaseModel)
 
-_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+class JsonObjectScanner:
+    """
+    Brace-balanced scanner for JSON objects embedded in model output.
+
+    feed() can be called with the whole text or with streamed chunks; it
+    returns every top-level {...} object completed by that chunk. Braces
+    inside strings (and escaped quotes) are handled, prose and code fences
+    around the objects are skipped, and an unfinished object simply stays
+    buffered until more text arrives.
+    """
+
+    def __init__(self):
+        self._buf: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> List[str]:
+        done = []
+        for ch in chunk:
+            if self._depth == 0:
+                if ch == "{":
+                    self._buf = [ch]
+                    self._depth = 1
+                continue
+
+            self._buf.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    done.append("".join(self._buf))
+                    self._buf = []
+        return done
+
 
 def extract_json(text: str) -> Optional[str]:
-    text = text.strip()
-    # If the model wrapped JSON in prose, grab the first {...} block.
-    m = _JSON_RE.search(text)
-    return m.group(0) if m else None
+    # If the model wrapped JSON in prose (or emitted several objects), take
+    # the first balanced {...} block that is valid JSON.
+    for candidate in JsonObjectScanner().feed(text or ""):
+        try:
+            json.loads(candidate)
+        except ValueError:
+            continue
+        return candidate
+    return None
 
 def parse_model(text: str, model: Type[T]) -> T:
     raw = extract_json(text) or text
     data = json.loads(raw)
     return model.model_validate(data)
 
+@lru_cache(maxsize=None)
+def response_format(model: Type[BaseModel]) -> Dict[str, Any]:
+    """OpenAI-style response_format for constrained decoding into `model`."""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": model.__name__, "schema": model.model_json_schema()},
+    }
+
 def build_fix_prompt(bad_text: str, error: str) -> str:
     return (
         "Your previous output was not valid JSON for the required schema.\n"
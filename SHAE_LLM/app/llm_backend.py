@@ -1,18 +1,41 @@
 from __future__ import annotations
+import asyncio
+import json
+import threading
+import time
 from dataclasses import dataclass
-from typing import List
+from typing import AsyncIterator, List, Optional, Type
+from pydantic import BaseModel
 from .prompts import SHAE_MASTER_SYSTEM
+from .json_utils import JsonObjectScanner, response_format
+from .generation import GenerationProfile, DEFAULT_PROFILE
 
-from openai import OpenAI
+import httpx
+import openai
+from openai import AsyncOpenAI, OpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient, NOT_GIVEN, Timeout
+from .resilience import LLMUnavailableError, TRANSIENT_ERRORS, backoff_delay, remaining
+from .balancer import EndpointPool, get_pool
+from .metrics import record_llm_call
+from .cassette import Cassette, get_cassette
 from .config import (
     BACKEND,
     HF_TOKEN,
     HF_CHAT_MODEL,
     OLLAMA_BASE_URL,
     OLLAMA_MODEL,
-    MAX_NEW_TOKENS,
-    TEMPERATURE,
-    TOP_P,
+    STRUCTURED_OUTPUT,
+    ROLE_MODELS,
+    ROLE_BASE_URLS,
+    ROLE_API_KEYS,
+    LLM_CONNECT_TIMEOUT_S,
+    LLM_READ_TIMEOUT_S,
+    LLM_POOL_MAX_CONNECTIONS,
+    LLM_POOL_MAX_KEEPALIVE,
+    LLM_KEEPALIVE_EXPIRY_S,
+    LLM_MAX_RETRIES,
+    LLM_STREAM_USAGE,
+    LLM_WARMUP_KEEP_ALIVE,
+    LLM_WARMUP_TIMEOUT_S,
 )
 
 ROUTER_BASE_URL = "https://router.huggingface.co/v1"
@@ -22,60 +45,572 @@ class ChatMsg:
     role: str  # "system" | "user" | "assistant"
     content: str
 
+# triage is the fused safety + state call: route it like safety unless set
+_ROLE_FALLBACK = {"triage": "safety"}
+
+def _resolve_backend():
+    """
+    Return (base_url, api_key, model) for the configured BACKEND.
+    Shared by the sync and async backends so both talk to the same server.
+    """
+    backend_type = BACKEND.lower()
+
+    if backend_type == "ollama":
+        # Ollama backend - runs locally
+        # Ollama doesn't need a real API key
+        return OLLAMA_BASE_URL, "ollama", OLLAMA_MODEL
+    if backend_type == "hf_router":
+        # HuggingFace Router backend
+        if not HF_TOKEN:
+            raise RuntimeError("HF_TOKEN missing. Create a HF token with Inference Providers permission.")
+        return ROUTER_BASE_URL, HF_TOKEN, HF_CHAT_MODEL
+    raise RuntimeError(f"Unknown BACKEND type: {BACKEND}. Use 'ollama' or 'hf_router'")
+
+def _resolve_role(role: str):
+    """(base_url, api_key, model) for `role`: per-role overrides over the BACKEND defaults."""
+    base_url, api_key, model = _resolve_backend()
+    for r in (_ROLE_FALLBACK.get(role), role):
+        if r is None:
+            continue
+        base_url = ROLE_BASE_URLS.get(r) or base_url
+        api_key = ROLE_API_KEYS.get(r) or api_key
+        model = ROLE_MODELS.get(r) or model
+    return base_url, api_key, model
+
+def _build_messages(messages: List[ChatMsg]) -> List[dict]:
+    """
+    One system message (master system + agent instructions: the static,
+    cacheable prefix), then the user/assistant messages in their original
+    order (history and the dynamic suffix).
+    """
+    system_msgs = [m for m in messages if m.role == "system"]
+    chat_msgs = [m for m in messages if m.role in ("user", "assistant")]
+
+    # Merge all system instructions into ONE string
+    merged_system = SHAE_MASTER_SYSTEM
+    if system_msgs:
+        merged_system += "\n\nADDITIONAL TASK INSTRUCTIONS:\n"
+        merged_system += "\n".join(m.content for m in system_msgs)
+
+    return [
+        {"role": "system", "content": merged_system},
+        *({"role": m.role, "content": m.content} for m in chat_msgs),
+    ]
+
+def _structured_kwargs(schema: Optional[Type[BaseModel]]) -> dict:
+    """Extra create() kwargs that constrain the reply to `schema` (STRUCTURED_OUTPUT)."""
+    if schema is None or STRUCTURED_OUTPUT == "off":
+        return {}
+    if STRUCTURED_OUTPUT == "json_object":
+        return {"response_format": {"type": "json_object"}}
+    return {"response_format": response_format(schema)}
+
+def _is_json(text: str) -> bool:
+    try:
+        json.loads(text)
+    except ValueError:
+        return False
+    return True
+
+def _call_timeout():
+    """Per-call timeout: the client default, capped by what is left of the request deadline."""
+    left = remaining()
+    if left is None:
+        return NOT_GIVEN
+    if left <= 0:
+        raise LLMUnavailableError("request deadline exceeded")
+    return Timeout(min(LLM_READ_TIMEOUT_S, left), connect=min(LLM_CONNECT_TIMEOUT_S, left))
+
+def _deadline_spent() -> bool:
+    """True once the request deadline is used up: a timeout then was our cap, not the server being slow."""
+    left = remaining()
+    return left is not None and left <= 0.01
+
+def _deadline_hit(endpoint) -> LLMUnavailableError:
+    # Our budget ran out, not the server's fault: no verdict
+    endpoint.breaker.release_probe()
+    return LLMUnavailableError("request deadline exceeded")
+
+def _give_up(attempt: int, delay: float) -> bool:
+    left = remaining()
+    return attempt == LLM_MAX_RETRIES or (left is not None and left <= delay)
+
+def _record_failure(role: str, model: str, endpoint, started: float, outcome: str = "error") -> None:
+    record_llm_call(role, model, time.perf_counter() - started, outcome=outcome, endpoint=endpoint.base_url)
+
+def _call_failed(role: str, model: str, endpoint, started: float, e: BaseException) -> None:
+    """Release the endpoint after create() raised something not worth a retry, with the breaker verdict."""
+    endpoint.release(started, ok=False)
+    if not isinstance(e, Exception):
+        # cancelled (client gone): no verdict, but free the half-open probe slot
+        endpoint.breaker.release_probe()
+        return
+    _record_failure(role, model, endpoint, started)
+    if isinstance(e, openai.APIStatusError) and e.status_code < 500:
+        # 4xx (context too long, unsupported response_format, ...): the
+        # server is up and answered, the request was at fault
+        endpoint.breaker.record_success()
+    else:
+        endpoint.breaker.record_failure()
+
+def _finish(role: str, model: str, endpoint, started: float, usage=None, chunks: int = 0) -> None:
+    """Release the endpoint and record the call: usage when the server sent it, else streamed chunks."""
+    endpoint.release(started)
+    record_llm_call(
+        role, model, time.perf_counter() - started,
+        prompt_tokens=getattr(usage, "prompt_tokens", None),
+        completion_tokens=getattr(usage, "completion_tokens", None) if usage is not None else (chunks or None),
+        endpoint=endpoint.base_url,
+    )
+
+# ---------------------------
+# Streams
+# _send only covers a stream up to its headers. Reading the body can still
+# stall or break off, and the read timeout is per chunk, so the readers
+# below bound the whole body by the deadline and turn a broken stream into
+# LLMUnavailableError. The breaker verdict waits for the body too
+# (_finish_stream); a success on the headers alone would reset the
+# failure count of a server that keeps stalling mid-reply.
+# ---------------------------
+
+# Errors while reading a stream body (the SDK wraps most; raw transport errors can leak)
+_STREAM_ERRORS = (*TRANSIENT_ERRORS, httpx.TransportError)
+
+def _stream_failed(endpoint, model: str, e: BaseException) -> LLMUnavailableError:
+    if _deadline_spent():
+        return _deadline_hit(endpoint)
+    endpoint.breaker.record_failure()
+    return LLMUnavailableError(f"{model}: {e!r}")
+
+def _read_stream(stream, endpoint, model: str):
+    """Chunks of a sync stream; the deadline is checked between chunks."""
+    it = iter(stream)
+    while True:
+        if _deadline_spent():
+            raise _deadline_hit(endpoint)
+        try:
+            chunk = next(it)
+        except StopIteration:
+            return
+        except _STREAM_ERRORS as e:
+            raise _stream_failed(endpoint, model, e) from e
+        yield chunk
+
+async def _aread_stream(stream, endpoint, model: str):
+    """Chunks of an async stream, all of them within the deadline."""
+    it = stream.__aiter__()
+    while True:
+        left = remaining()
+        try:
+            if left is None:
+                chunk = await it.__anext__()
+            else:
+                chunk = await asyncio.wait_for(it.__anext__(), max(left, 0))
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            raise _deadline_hit(endpoint) from None
+        except _STREAM_ERRORS as e:
+            raise _stream_failed(endpoint, model, e) from e
+        yield chunk
+
+def _finish_stream(role: str, model: str, endpoint, started: float, failed: bool, answered: bool,
+                   usage=None, chunks: int = 0) -> None:
+    """
+    _finish for a stream, with the breaker verdict _send left open: failed
+    (already recorded by the reader), answered, or hung up before the
+    server said anything (no verdict).
+    """
+    if failed:
+        endpoint.release(started, ok=False)
+        _record_failure(role, model, endpoint, started)
+        return
+    if answered:
+        endpoint.breaker.record_success()
+    else:
+        endpoint.breaker.release_probe()
+    _finish(role, model, endpoint, started, usage=usage, chunks=chunks)
+
+def _replay(cassette: Cassette, role: str, kwargs: dict) -> str:
+    entry = cassette.lookup(role, kwargs)
+    time.sleep(cassette.delay(entry))
+    record_llm_call(role, kwargs["model"], cassette.delay(entry), endpoint="cassette")
+    return entry["text"]
+
+async def _replay_async(cassette: Cassette, role: str, kwargs: dict) -> str:
+    entry = cassette.lookup(role, kwargs)
+    await asyncio.sleep(cassette.delay(entry))
+    record_llm_call(role, kwargs["model"], cassette.delay(entry), endpoint="cassette")
+    return entry["text"]
+
+async def _replay_stream(cassette: Cassette, role: str, kwargs: dict) -> AsyncIterator[str]:
+    # Replies recorded without streaming come back as one chunk
+    entry = cassette.lookup(role, kwargs)
+    started = time.perf_counter()
+    try:
+        for offset_ms, delta in entry.get("chunks") or [[entry["ms"], entry["text"]]]:
+            if cassette.replay_timing:
+                wait = offset_ms / 1000 - (time.perf_counter() - started)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            yield delta
+    finally:
+        record_llm_call(role, kwargs["model"], time.perf_counter() - started, endpoint="cassette")
+
 class LLMBackend:
-    def __init__(self):
+    def __init__(self, pool: EndpointPool, clients: dict, model: str):
         self.backend_type = BACKEND.lower()
+        self.pool = pool
+        self.clients = clients  # base_url -> OpenAI
+        self.model = model
 
-        if self.backend_type == "ollama":
-            # Ollama backend - runs locally
-            print(f"[LLM] Using Ollama backend at {OLLAMA_BASE_URL} with model {OLLAMA_MODEL}")
-            self.client = OpenAI(
-                base_url=OLLAMA_BASE_URL,
-                api_key="ollama",  # Ollama doesn't need a real API key
-            )
-            self.model = OLLAMA_MODEL
-        elif self.backend_type == "hf_router":
-            # HuggingFace Router backend
-            if not HF_TOKEN:
-                raise RuntimeError("HF_TOKEN missing. Create a HF token with Inference Providers permission.")
-            print(f"[LLM] Using HuggingFace Router with model {HF_CHAT_MODEL}")
-            self.client = OpenAI(
-                base_url=ROUTER_BASE_URL,
-                api_key=HF_TOKEN,
-            )
-            self.model = HF_CHAT_MODEL
-        else:
-            raise RuntimeError(f"Unknown BACKEND type: {BACKEND}. Use 'ollama' or 'hf_router'")
-
-    def chat(self, messages: List[ChatMsg]) -> str:
-        # Extract ONLY the user message and the agent-specific instruction
-        user_msgs = [m for m in messages if m.role == "user"]
-        system_msgs = [m for m in messages if m.role == "system"]
-
-        # Merge all system instructions into ONE string
-        merged_system = SHAE_MASTER_SYSTEM
-        if system_msgs:
-            merged_system += "\n\nADDITIONAL TASK INSTRUCTIONS:\n"
-            merged_system += "\n".join(m.content for m in system_msgs)
-
-        final_messages = [
-            {"role": "system", "content": merged_system},
-            *({"role": "user", "content": m.content} for m in user_msgs),
-        ]
-
-        resp = self.client.chat.completions.create(
-            model=self.model,
-            messages=final_messages,
-            temperature=TEMPERATURE,
-            top_p=TOP_P,
-            max_tokens=MAX_NEW_TOKENS,
+    def _send(self, role: str, kwargs: dict):
+        """
+        chat.completions.create on an endpoint picked by the pool, with the
+        deadline, bounded jittered retries (on another endpoint if there is
+        one) and the endpoint's breaker. Returns (resp, endpoint, started);
+        the caller hands the endpoint back through _finish (_finish_stream
+        for stream=True) once it is done with the response.
+        """
+        tried = []
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            endpoint = self.pool.pick(exclude=tried)
+            # An expired deadline raises here, before it can take the half-open probe slot
+            timeout = _call_timeout()
+            started = time.perf_counter()
+            try:
+                endpoint.breaker.allow()
+            except LLMUnavailableError:
+                _record_failure(role, kwargs["model"], endpoint, started, outcome="rejected")
+                raise
+            started = endpoint.acquire()
+            try:
+                resp = self.clients[endpoint.base_url].chat.completions.create(**kwargs, timeout=timeout)
+            except TRANSIENT_ERRORS as e:
+                endpoint.release(started, ok=False)
+                _record_failure(role, kwargs["model"], endpoint, started)
+                if isinstance(e, openai.APITimeoutError) and _deadline_spent():
+                    # the timeout was the deadline's cap
+                    raise _deadline_hit(endpoint) from e
+                endpoint.breaker.record_failure()
+                tried.append(endpoint)
+                delay = backoff_delay(attempt)
+                if _give_up(attempt, delay):
+                    raise LLMUnavailableError(f"{self.model}: {e!r}") from e
+                time.sleep(delay)
+                continue
+            except BaseException as e:
+                _call_failed(role, kwargs["model"], endpoint, started, e)
+                raise
+            if not kwargs.get("stream"):
+                endpoint.breaker.record_success()  # streams: _finish_stream
+            return resp, endpoint, started
+
+    def chat(
+        self,
+        messages: List[ChatMsg],
+        schema: Optional[Type[BaseModel]] = None,
+        profile: Optional[GenerationProfile] = None,
+    ) -> str:
+        profile = profile or DEFAULT_PROFILE
+        kwargs = dict(
+            model=profile.model or self.model,
+            messages=_build_messages(messages),
+            **profile.sampling_kwargs(),
+            **_structured_kwargs(schema),
+        )
+        cassette = get_cassette()
+        if cassette is not None and cassette.replaying:
+            return _replay(cassette, profile.role, kwargs)
+        started = time.perf_counter()
+        text = self._complete(profile, kwargs)
+        if cassette is not None:
+            cassette.record(profile.role, kwargs, text, time.perf_counter() - started)
+        return text
+
+    def _complete(self, profile: GenerationProfile, kwargs: dict) -> str:
+        if profile.stop_at_json:
+            return self._chat_until_json(profile.role, kwargs)
+        resp, endpoint, started = self._send(profile.role, kwargs)
+        _finish(profile.role, kwargs["model"], endpoint, started, usage=resp.usage)
+        return (resp.choices[0].message.content or "").strip()
+
+    def _chat_until_json(self, role: str, kwargs: dict) -> str:
+        # Stream, and hang up once the first valid JSON object is complete
+        stream, endpoint, started = self._send(role, dict(kwargs, stream=True))
+        scanner, parts = JsonObjectScanner(), []
+        failed = answered = False
+        try:
+            for chunk in _read_stream(stream, endpoint, kwargs["model"]):
+                answered = True
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                parts.append(delta)
+                for candidate in scanner.feed(delta):
+                    if _is_json(candidate):
+                        return candidate
+            answered = True
+        except LLMUnavailableError:
+            failed = True
+            raise
+        finally:
+            stream.close()
+            _finish_stream(role, kwargs["model"], endpoint, started, failed, answered, chunks=len(parts))
+        return "".join(parts).strip()
+
+class AsyncLLMBackend:
+    """
+    Same contract as LLMBackend, but on the non-blocking AsyncOpenAI client.
+    A request waiting on the model holds a coroutine, not a threadpool worker.
+    """
+
+    def __init__(self, pool: EndpointPool, clients: dict, model: str):
+        self.backend_type = BACKEND.lower()
+        self.pool = pool
+        self.clients = clients  # base_url -> AsyncOpenAI
+        self.model = model
+
+    async def _send(self, role: str, kwargs: dict):
+        tried = []
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            endpoint = self.pool.pick(exclude=tried)
+            # An expired deadline raises here, before it can take the half-open probe slot
+            timeout = _call_timeout()
+            started = time.perf_counter()
+            try:
+                endpoint.breaker.allow()
+            except LLMUnavailableError:
+                _record_failure(role, kwargs["model"], endpoint, started, outcome="rejected")
+                raise
+            started = endpoint.acquire()
+            try:
+                resp = await self.clients[endpoint.base_url].chat.completions.create(**kwargs, timeout=timeout)
+            except TRANSIENT_ERRORS as e:
+                endpoint.release(started, ok=False)
+                _record_failure(role, kwargs["model"], endpoint, started)
+                if isinstance(e, openai.APITimeoutError) and _deadline_spent():
+                    # the timeout was the deadline's cap
+                    raise _deadline_hit(endpoint) from e
+                endpoint.breaker.record_failure()
+                tried.append(endpoint)
+                delay = backoff_delay(attempt)
+                if _give_up(attempt, delay):
+                    raise LLMUnavailableError(f"{self.model}: {e!r}") from e
+                await asyncio.sleep(delay)
+                continue
+            except BaseException as e:
+                _call_failed(role, kwargs["model"], endpoint, started, e)
+                raise
+            if not kwargs.get("stream"):
+                endpoint.breaker.record_success()  # streams: _finish_stream
+            return resp, endpoint, started
+
+    async def chat(
+        self,
+        messages: List[ChatMsg],
+        schema: Optional[Type[BaseModel]] = None,
+        profile: Optional[GenerationProfile] = None,
+    ) -> str:
+        profile = profile or DEFAULT_PROFILE
+        kwargs = dict(
+            model=profile.model or self.model,
+            messages=_build_messages(messages),
+            **profile.sampling_kwargs(),
+            **_structured_kwargs(schema),
         )
+        cassette = get_cassette()
+        if cassette is not None and cassette.replaying:
+            return await _replay_async(cassette, profile.role, kwargs)
+        started = time.perf_counter()
+        text = await self._complete(profile, kwargs)
+        if cassette is not None:
+            cassette.record(profile.role, kwargs, text, time.perf_counter() - started)
+        return text
+
+    async def _complete(self, profile: GenerationProfile, kwargs: dict) -> str:
+        if profile.stop_at_json:
+            return await self._chat_until_json(profile.role, kwargs)
+        resp, endpoint, started = await self._send(profile.role, kwargs)
+        _finish(profile.role, kwargs["model"], endpoint, started, usage=resp.usage)
         return (resp.choices[0].message.content or "").strip()
 
-_backend_singleton = None
+    async def _chat_until_json(self, role: str, kwargs: dict) -> str:
+        stream, endpoint, started = await self._send(role, dict(kwargs, stream=True))
+        scanner, parts = JsonObjectScanner(), []
+        failed = answered = False
+        try:
+            async for chunk in _aread_stream(stream, endpoint, kwargs["model"]):
+                answered = True
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                parts.append(delta)
+                for candidate in scanner.feed(delta):
+                    if _is_json(candidate):
+                        return candidate
+            answered = True
+        except LLMUnavailableError:
+            failed = True
+            raise
+        finally:
+            await stream.close()
+            _finish_stream(role, kwargs["model"], endpoint, started, failed, answered, chunks=len(parts))
+        return "".join(parts).strip()
+
+    async def chat_stream(
+        self, messages: List[ChatMsg], profile: Optional[GenerationProfile] = None
+    ) -> AsyncIterator[str]:
+        """
+        Yield content deltas as the server produces them (stream=True).
+        Closing the generator early closes the HTTP stream, which stops decoding.
+        """
+        profile = profile or DEFAULT_PROFILE
+        kwargs = dict(
+            model=profile.model or self.model,
+            messages=_build_messages(messages),
+            **profile.sampling_kwargs(),
+            stream=True,
+        )
+        if LLM_STREAM_USAGE:
+            kwargs["stream_options"] = {"include_usage": True}
+        cassette = get_cassette()
+        if cassette is not None and cassette.replaying:
+            async for delta in _replay_stream(cassette, profile.role, kwargs):
+                yield delta
+            return
+        stream, endpoint, started = await self._send(profile.role, kwargs)
+        usage, chunks = None, 0
+        failed = answered = False
+        recorded = [] if cassette is not None else None  # [[ms since start, delta], ...]
+        try:
+            async for chunk in _aread_stream(stream, endpoint, kwargs["model"]):
+                answered = True
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    chunks += 1
+                    if recorded is not None:
+                        recorded.append([round((time.perf_counter() - started) * 1000, 1), delta])
+                    yield delta
+            answered = True
+        except LLMUnavailableError:
+            failed = True
+            raise
+        finally:
+            await stream.close()
+            _finish_stream(profile.role, kwargs["model"], endpoint, started, failed, answered, usage=usage, chunks=chunks)
+            if recorded is not None and not failed:
+                text = "".join(delta for _, delta in recorded)
+                cassette.record(profile.role, kwargs, text, time.perf_counter() - started, chunks=recorded)
+
+# ---------------------------
+# Backend registry
+# One backend per role, created on first use. A base URL may list several
+# servers (app/balancer.py picks one per call). Roles that resolve to the
+# same server share one client (and its connection pool) and one circuit
+# breaker; roles on the same servers and model share one backend.
+# ---------------------------
+
+_registry_lock = threading.Lock()
+_clients = {}           # (kind, endpoint url, api_key) -> OpenAI / AsyncOpenAI
+_backends = {}          # (kind, base_url setting, api_key, model) -> backend
+_role_backends = {}     # (kind, role) -> backend
+
+def _new_client(kind: str, base_url: str, api_key: str):
+    # Bounded keep-alive pool; retries are ours (_send), not the SDK's
+    limits = httpx.Limits(
+        max_connections=LLM_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY_S,
+    )
+    timeout = Timeout(LLM_READ_TIMEOUT_S, connect=LLM_CONNECT_TIMEOUT_S)
+    if kind == "async":
+        http_client = DefaultAsyncHttpxClient(limits=limits, timeout=timeout)
+        return AsyncOpenAI(base_url=base_url, api_key=api_key, http_client=http_client, timeout=timeout, max_retries=0)
+    http_client = DefaultHttpxClient(limits=limits, timeout=timeout)
+    return OpenAI(base_url=base_url, api_key=api_key, http_client=http_client, timeout=timeout, max_retries=0)
+
+def _get(kind: str, role: str):
+    backend = _role_backends.get((kind, role))
+    if backend is not None:
+        return backend
+    with _registry_lock:
+        backend = _role_backends.get((kind, role))
+        if backend is not None:
+            return backend
+        base_url, api_key, model = _resolve_role(role)
+        backend = _backends.get((kind, base_url, api_key, model))
+        if backend is None:
+            pool = get_pool(base_url, api_key)
+            clients = {}
+            for endpoint in pool.endpoints:
+                client = _clients.get((kind, endpoint.base_url, api_key))
+                if client is None:
+                    client = _new_client(kind, endpoint.base_url, api_key)
+                    _clients[(kind, endpoint.base_url, api_key)] = client
+                clients[endpoint.base_url] = client
+            backend = (AsyncLLMBackend if kind == "async" else LLMBackend)(pool, clients, model)
+            _backends[(kind, base_url, api_key, model)] = backend
+            print(f"[LLM] {kind} backend: {model} at {base_url}")
+        _role_backends[(kind, role)] = backend
+        return backend
+
+def get_backend(role: str = "default") -> LLMBackend:
+    return _get("sync", role)
+
+def get_async_backend(role: str = "default") -> AsyncLLMBackend:
+    return _get("async", role)
+
+async def _warm_one(base_url: str, model: str, client) -> None:
+    if BACKEND.lower() == "ollama":
+        # Ollama's native API loads a model on a request without a prompt
+        root = base_url.rstrip("/")
+        root = root[:-3] if root.endswith("/v1") else root
+        async with httpx.AsyncClient(timeout=LLM_WARMUP_TIMEOUT_S) as http:
+            r = await http.post(f"{root}/api/generate", json={"model": model, "keep_alive": LLM_WARMUP_KEEP_ALIVE})
+            r.raise_for_status()
+        return
+    await client.chat.completions.create(
+        model=model, messages=[{"role": "user", "content": "hi"}], max_tokens=1, timeout=LLM_WARMUP_TIMEOUT_S,
+    )
+
+async def warm_up(roles) -> dict:
+    """
+    Load the model behind each role on each of its servers, concurrently.
+    Returns "<model> @ <url>" -> "ok (<s> s)" or the error; never raises.
+    """
+    targets = {}
+    for role in roles:
+        backend = get_async_backend(role)
+        for base_url, client in backend.clients.items():
+            targets[(base_url, backend.model)] = client
+
+    async def one(base_url: str, model: str, client) -> str:
+        t0 = time.perf_counter()
+        try:
+            await _warm_one(base_url, model, client)
+        except Exception as e:
+            print(f"[LLM] warm-up failed: {model} at {base_url}: {e!r}")
+            return f"error: {e!r}"
+        print(f"[LLM] warm-up: {model} at {base_url} in {time.perf_counter() - t0:.1f} s")
+        return f"ok ({time.perf_counter() - t0:.1f} s)"
+
+    results = await asyncio.gather(*(one(url, model, client) for (url, model), client in targets.items()))
+    return {f"{model} @ {url}": result for (url, model), result in zip(targets, results)}
+
+def role_available(role: str) -> bool:
+    """False while every endpoint for `role` is down (breaker open or failing its health probe)."""
+    base_url, api_key, _ = _resolve_role(role)
+    return any(e.available() for e in get_pool(base_url, api_key).endpoints)
 
-def get_backend() -> LLMBackend:
-    global _backend_singleton
-    if _backend_singleton is None:
-        _backend_singleton = LLMBackend()
-    return _backend_singleton
+def describe_backends() -> dict:
+    """role -> {model, base_url} for every role in config (no API keys)."""
+    out = {}
+    for role in ("default", *ROLE_MODELS):
+        base_url, _, model = _resolve_role(role)
+        out[role] = {"model": model, "base_url": base_url}
+    return out
@@ -1,15 +1,84 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+import asyncio
+import json
+import time
 import traceback
-from .memory_sqlite import init_db
+from contextlib import asynccontextmanager
+from .memory_sqlite import close_thread_connections
+from .session_store import get_store
 from .explain import explain_route
-from .schemas import ChatRequest, ChatResponse, SafetyResult
-from .safety import run_safety
-from .orchestrator import run_orchestrator
+from .schemas import ChatRequest, ChatResponse, SafetyResult, RiskFlags
+from .safety import run_safety_async
+from .triage import run_triage_async
+from .orchestrator import (
+    run_orchestrator_async, run_orchestrator_stream, start_speculation, timed, get_summary_worker, load_recent_turns_async,
+)
+from .session_cache import get_session_cache
+from .classifier_cache import get_classifier_cache
+from .context_budget import get_token_counter
+from .llm_backend import describe_backends, role_available, get_async_backend, get_backend, warm_up
+from .resilience import LLMUnavailableError, breaker_stats, deadline_scope
+from .balancer import endpoint_stats, session_scope
+from .admission import Overloaded, get_admission
+from .batcher import get_batcher
+from .cassette import get_cassette
+from .metrics import CHAT_TURNS, SHORT_CIRCUITS, current_trace, register_collector, render, stats_samples, trace_scope
+from .config import (
+    SPECULATIVE_CLASSIFIERS, SPECULATIVE_COACH, PRECLASSIFIER_ENABLED, PRECLASSIFIER_MIN_CONFIDENCE, CLASSIFIER_MODE,
+    CHAT_DEADLINE_SECONDS, DEBUG_LLM_CALLS, LLM_ROLES, LLM_WARMUP,
+)
+from .preclassifier import preclassify
+from .crisis_matcher import match_crisis
+
+# ---------------------------
+# Startup
+# Nothing is opened at import: the lifespan creates the DB schema and the
+# LLM backends, then (LLM_WARMUP) loads the models in the background.
+# /health answers as soon as the process is up; /ready only once it can
+# actually serve a turn.
+# ---------------------------
+
+_startup = {"db": False, "backends": None, "warmup": "off", "warmup_results": {}, "ready_s": None}
+_started_at = time.perf_counter()
+
+def _init_backends() -> None:
+    """Build every role's client up front so config errors (e.g. no HF_TOKEN) show at boot."""
+    try:
+        for role in LLM_ROLES:
+            get_async_backend(role)
+        get_backend("summary")  # the summary worker calls the sync client
+        _startup["backends"] = "ok"
+    except RuntimeError as e:
+        print(f"[STARTUP] LLM backends unavailable: {e}")
+        _startup["backends"] = f"error: {e}"
+
+async def _warm_up() -> None:
+    _startup["warmup"] = "running"
+    results = await warm_up(LLM_ROLES)
+    _startup["warmup_results"] = results
+    _startup["warmup"] = "done" if all(r.startswith("ok") for r in results.values()) else "failed"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_store().init()
+    _startup["db"] = True
+    _init_backends()
+    warmup = None
+    if LLM_WARMUP and _startup["backends"] == "ok":
+        warmup = asyncio.create_task(_warm_up())
+    print(f"[STARTUP] up in {time.perf_counter() - _started_at:.2f} s (warm-up: {'on' if warmup else 'off'})")
+    try:
+        yield
+    finally:
+        if warmup is not None:
+            warmup.cancel()
+        get_summary_worker().stop()
+        close_thread_connections()
 
-app = FastAPI(title="SHAE HF Agentic MVP", version="0.1.0")
-init_db()
+app = FastAPI(title="SHAE HF Agentic MVP", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -33,6 +102,14 @@ def crisis_response() -> str:
         "Are you safe right now?"
     )
 
+def degraded_response() -> str:
+    return (
+        "I'm having some trouble responding right now, so I can't give you a proper reply. "
+        "Please try again in a minute or two.\n\n"
+        "If things feel too heavy in the meantime, you can talk to someone at "
+        "Tele MANAS: 14416 or 1800-891-4416 (24/7, free)."
+    )
+
 def _dump(x):
     """Return a plain dict if x is a Pydantic model; otherwise return x unchanged."""
     return x.model_dump() if hasattr(x, "model_dump") else x
@@ -41,45 +118,234 @@ def _dump(x):
 def health():
     return {"ok": True}
 
+@app.get("/ready")
+def ready():
+    """
+    200 once the DB and LLM backends are set up, the warm-up (if enabled) has
+    finished and the classifier and coach servers are reachable; 503 before.
+    A failed warm-up is reported but does not hold readiness back.
+    """
+    checks = {
+        "db": _startup["db"],
+        "backends": _startup["backends"],
+        "warmup": _startup["warmup"],
+        "warmup_results": _startup["warmup_results"],
+    }
+    ok = _startup["db"] and _startup["backends"] == "ok" and _startup["warmup"] in ("off", "done", "failed")
+    if ok:
+        checks["llm_available"] = not _llm_down()
+        ok = checks["llm_available"]
+    if ok and _startup["ready_s"] is None:
+        _startup["ready_s"] = round(time.perf_counter() - _started_at, 2)
+        print(f"[STARTUP] ready after {_startup['ready_s']} s")
+    return JSONResponse(status_code=200 if ok else 503, content={"ready": ok, **checks, "ready_s": _startup["ready_s"]})
+
+@app.get("/admin/stats")
+def admin_stats():
+    """In-process counters for the memory layer and caches."""
+    cassette = get_cassette()
+    return {
+        "classifier_cache": get_classifier_cache().snapshot(),
+        "session_store": get_store().name,
+        "session_cache": get_session_cache().snapshot(),
+        "token_counts": get_token_counter().snapshot(),
+        "summary_worker": {**get_summary_worker().stats, "pending": get_summary_worker().pending()},
+        "llm_backends": describe_backends(),
+        "classifier_batcher": get_batcher().snapshot(),
+        "llm_breakers": breaker_stats(),
+        "admission": get_admission().snapshot(),
+        "llm_cassette": cassette.stats if cassette is not None else None,
+    }
+
+@app.get("/admin/endpoints")
+def admin_endpoints():
+    """Per inference server: in-flight calls, latency EWMA, errors, health and breaker state."""
+    return endpoint_stats()
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text exposition of app/metrics.py and the /admin/stats counters."""
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+# /admin/stats components, read at scrape time
+register_collector("shae_classifier_cache", "Classifier result cache counters.",
+                   lambda: stats_samples(get_classifier_cache().snapshot()))
+register_collector("shae_session_cache", "Session context cache counters.",
+                   lambda: stats_samples(get_session_cache().snapshot()))
+register_collector("shae_token_count_cache", "Memoized token counts of stored turns.",
+                   lambda: stats_samples(get_token_counter().snapshot()))
+register_collector("shae_summary_worker", "Background summary worker counters.",
+                   lambda: stats_samples({**get_summary_worker().stats, "pending": get_summary_worker().pending()}))
+register_collector("shae_classifier_batcher", "Classifier micro-batching counters.",
+                   lambda: stats_samples(get_batcher().snapshot()))
+register_collector("shae_admission", "Admission control counters and queue depth.",
+                   lambda: stats_samples(get_admission().snapshot()))
+register_collector("shae_llm_endpoint", "Per inference server: in-flight calls, latency EWMA, requests, errors, health.",
+                   lambda: [s for url, snap in endpoint_stats().items() for s in stats_samples(snap, endpoint=url)])
+register_collector("shae_llm_breaker_open", "1 while the circuit breaker for an endpoint is not closed.",
+                   lambda: [({"endpoint": name}, float(b["state"] != "closed")) for name, b in breaker_stats().items()])
+
+def _keyword_crisis(user_message: str):
+    """Keyword-based crisis detection (fallback before LLM safety check)."""
+    if match_crisis(user_message):
+        return SafetyResult(
+            severity="crisis",
+            distress_score=10,
+            risk=RiskFlags(self_harm=True, suicide=True, harm_others=False, abuse=False),
+            reason="Keyword-based crisis detection"
+        )
+    return None
+
+def _preclassify(user_message: str):
+    """Local verdict for trivial messages, or None to use the LLM classifiers."""
+    if not PRECLASSIFIER_ENABLED:
+        return None
+    pre = preclassify(user_message)
+    if pre is None or pre.confidence < PRECLASSIFIER_MIN_CONFIDENCE:
+        return None
+    return pre
+
+def _llm_down() -> bool:
+    """True while the breaker for the classifier or coach endpoint is open."""
+    classifier_role = "triage" if CLASSIFIER_MODE == "fused" else "safety"
+    return not (role_available(classifier_role) and role_available("coach"))
+
+def _degraded_chat_response(session_id: str, debug: dict) -> ChatResponse:
+    # The LLM is unavailable: the keyword crisis check already ran, answer
+    # with a canned safe reply instead of queueing behind timeouts.
+    safety = SafetyResult(
+        severity="distressed",
+        distress_score=5,
+        risk=RiskFlags(self_harm=False, suicide=False, harm_others=False, abuse=False),
+        reason="LLM unavailable; keyword crisis check only",
+    )
+    return ChatResponse(
+        session_id=session_id,
+        safety=_dump(safety),
+        orchestration=None,
+        reply=degraded_response(),
+        debug={**debug, "degraded": True},
+    )
+
+def _turn_status(resp: dict) -> str:
+    if (resp.get("debug") or {}).get("degraded"):
+        return "degraded"
+    if (resp.get("safety") or {}).get("severity") == "crisis":
+        return "crisis"
+    return "ok"
+
+def _with_llm_calls(debug: dict) -> dict:
+    """With DEBUG_LLM_CALLS, list every LLM call this turn made in debug.llm_calls."""
+    trace = current_trace()
+    if DEBUG_LLM_CALLS and trace is not None:
+        debug["llm_calls"] = trace.llm_calls
+    return debug
+
+def _crisis_chat_response(session_id: str, safety: SafetyResult, debug: dict) -> ChatResponse:
+    return ChatResponse(
+        session_id=session_id,
+        safety=_dump(safety),
+        orchestration=None,
+        reply=crisis_response(),
+        debug=debug,
+    )
+
+def _orchestrated_chat_response(session_id: str, safety: SafetyResult, result: dict) -> ChatResponse:
+    reply = result["reply"]
+    orch = result.get("orchestration")
+    ui_actions = result.get("ui_actions")
+    debug = result.get("debug", {})
+
+    return ChatResponse(
+        session_id=session_id,
+        safety=_dump(safety),
+        orchestration=_dump(orch) if orch is not None else None,
+        reply=reply,
+        ui_actions=[_dump(action) for action in ui_actions] if ui_actions else None,
+        debug=debug,
+    )
+
+async def _admit(session_id: str):
+    """Wait for this session's previous turn and a global slot, or 429."""
+    try:
+        return await get_admission().admit(session_id)
+    except Overloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
 @app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
+async def chat(req: ChatRequest):
+    try:
+        ticket = await _admit(req.session_id)
+    except HTTPException:
+        CHAT_TURNS.inc(endpoint="chat", status="rejected")
+        raise
+    status = "error"
+    try:
+        # One deadline for every LLM call this turn makes, retries included;
+        # the session id steers those calls to the session's preferred server
+        with deadline_scope(CHAT_DEADLINE_SECONDS), session_scope(req.session_id), trace_scope():
+            resp = await _chat(req)
+        status = _turn_status(resp)
+        return resp
+    finally:
+        CHAT_TURNS.inc(endpoint="chat", status=status)
+        ticket.release()
+
+async def _chat(req: ChatRequest):
     try:
         session_id = req.session_id
         user_message = (req.message or "").strip()
 
         # 0) Keyword-based crisis detection (fallback before LLM safety check)
-        crisis_keywords = [
-            "kill myself", "end my life", "suicide", "suicidal",
-            "want to die", "better off dead", "plan to die",
-            "harm myself", "hurt myself", "cut myself"
-        ]
-        msg_lower = user_message.lower()
-        if any(keyword in msg_lower for keyword in crisis_keywords):
-            from .schemas import SafetyResult, RiskFlags
-            crisis_safety = SafetyResult(
-                severity="crisis",
-                distress_score=10,
-                risk=RiskFlags(self_harm=True, suicide=True, harm_others=False, abuse=False),
-                reason="Keyword-based crisis detection"
-            )
-            resp = ChatResponse(
-                session_id=session_id,
-                safety=_dump(crisis_safety),
-                orchestration=None,
-                reply=crisis_response(),
-                debug={"route": [], "note": "keyword crisis detection"},
+        crisis_safety = _keyword_crisis(user_message)
+        if crisis_safety is not None:
+            SHORT_CIRCUITS.inc(reason="keyword_crisis")
+            resp = _crisis_chat_response(
+                session_id, crisis_safety, {"route": [], "note": "keyword crisis detection"}
             )
             return resp.model_dump()
 
+        if _llm_down():
+            SHORT_CIRCUITS.inc(reason="llm_down")
+            return _degraded_chat_response(session_id, {"route": [], "note": "llm circuit open"}).model_dump()
+
         # 1) Safety layer
-        safety: SafetyResult = run_safety(user_message)
+        # In speculative mode the state classifier (and optionally the coach)
+        # starts now, in parallel with safety, and is discarded on crisis.
+        t0 = time.perf_counter()
+        timings = current_trace().timings  # stage spans, plus time spent in SQLite
+        speculation = None
+
+        # Trivial messages ("ok", "thanks", 🙂) are classified locally and
+        # skip both the safety and the state LLM calls. In fused mode one
+        # triage call returns safety and state together.
+        pre = _preclassify(user_message)
+        state = pre.state if pre is not None else None
+        if pre is not None:
+            SHORT_CIRCUITS.inc(reason="preclassified")
+            safety: SafetyResult = pre.safety
+        elif CLASSIFIER_MODE == "fused":
+            safety, state = await timed(
+                timings, "triage", run_triage_async(user_message, await load_recent_turns_async(session_id))
+            )
+        else:
+            if SPECULATIVE_CLASSIFIERS:
+                speculation = start_speculation(user_message, session_id, timings, with_coach=SPECULATIVE_COACH)
+
+            try:
+                safety = await timed(timings, "safety", run_safety_async(user_message))
+            except BaseException:
+                if speculation is not None:
+                    speculation.cancel()
+                raise
+
         if safety.severity == "crisis":
-            resp = ChatResponse(
-                session_id=session_id,
-                safety=_dump(safety),
-                orchestration=None,
-                reply=crisis_response(),
-                debug={"route": [], "note": "crisis short-circuit"},
+            if speculation is not None:
+                speculation.cancel()
+            timings["total"] = round((time.perf_counter() - t0) * 1000, 1)
+            SHORT_CIRCUITS.inc(reason="crisis")
+            resp = _crisis_chat_response(
+                session_id, safety, _with_llm_calls({"route": [], "note": "crisis short-circuit", "timings_ms": timings})
             )
             return resp.model_dump()
 
@@ -88,27 +354,29 @@ def chat(req: ChatRequest):
         # - reply: str
         # - orchestration: dict (or pydantic model) with routing info
         # - debug: dict
-        result = run_orchestrator(
+        result = await run_orchestrator_async(
             user_message=user_message,
             safety=safety,
             session_id=session_id,
+            speculation=speculation,
+            timings=timings,
+            state=state,
         )
+        timings["total"] = round((time.perf_counter() - t0) * 1000, 1)
 
-        reply = result["reply"]
-        orch = result.get("orchestration")
-        ui_actions = result.get("ui_actions")
-        debug = result.get("debug", {})
+        result.setdefault("debug", {})
+        result["debug"]["speculative"] = speculation is not None
+        result["debug"]["classifier_mode"] = CLASSIFIER_MODE
+        result["debug"]["preclassified"] = pre.label if pre is not None else None
+        result["debug"]["timings_ms"] = timings
+        _with_llm_calls(result["debug"])
 
-        resp = ChatResponse(
-            session_id=session_id,
-            safety=_dump(safety),
-            orchestration=_dump(orch) if orch is not None else None,
-            reply=reply,
-            ui_actions=[_dump(action) for action in ui_actions] if ui_actions else None,
-            debug=debug,
-        )
+        resp = _orchestrated_chat_response(session_id, safety, result)
         return resp.model_dump()
 
+    except LLMUnavailableError as e:
+        print(f"[LLM] degraded reply: {e}")
+        return _degraded_chat_response(session_id, {"route": [], "note": str(e)}).model_dump()
     except Exception as e:
         print("\n=== /chat ERROR ===")
         print(repr(e))
@@ -116,6 +384,151 @@ def chat(req: ChatRequest):
         print("=== END ERROR ===\n")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _sse_done(resp: ChatResponse) -> str:
+    data = resp.model_dump()
+    CHAT_TURNS.inc(endpoint="chat_stream", status=_turn_status(data))
+    return _sse("done", data)
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Server-Sent Events version of /chat.
+
+    Events, in order:
+    - safety:    the SafetyResult
+    - token:     {"text": ...} visible reply text as it arrives (may repeat)
+    - ui_action: the UIAction, if the coach suggested one
+    - done:      the full ChatResponse (its reply is authoritative)
+    - error:     {"detail": ...} if the pipeline failed mid-stream
+    """
+    session_id = req.session_id
+    user_message = (req.message or "").strip()
+
+    async def events():
+        t0 = time.perf_counter()
+        timings = current_trace().timings
+        speculation = None
+        try:
+            crisis_safety = _keyword_crisis(user_message)
+            if crisis_safety is not None:
+                SHORT_CIRCUITS.inc(reason="keyword_crisis")
+                resp = _crisis_chat_response(
+                    session_id, crisis_safety, {"route": [], "note": "keyword crisis detection"}
+                )
+                yield _sse("safety", resp.safety.model_dump())
+                yield _sse("token", {"text": resp.reply})
+                yield _sse_done(resp)
+                return
+
+            if _llm_down():
+                SHORT_CIRCUITS.inc(reason="llm_down")
+                resp = _degraded_chat_response(session_id, {"route": [], "note": "llm circuit open"})
+                yield _sse("safety", resp.safety.model_dump())
+                yield _sse("token", {"text": resp.reply})
+                yield _sse_done(resp)
+                return
+
+            pre = _preclassify(user_message)
+            state = pre.state if pre is not None else None
+            if pre is not None:
+                SHORT_CIRCUITS.inc(reason="preclassified")
+                safety: SafetyResult = pre.safety
+            elif CLASSIFIER_MODE == "fused":
+                safety, state = await timed(
+                    timings, "triage", run_triage_async(user_message, await load_recent_turns_async(session_id))
+                )
+            else:
+                # The coach is streamed, so only the state classifier is speculated.
+                if SPECULATIVE_CLASSIFIERS:
+                    speculation = start_speculation(user_message, session_id, timings)
+
+                safety = await timed(timings, "safety", run_safety_async(user_message))
+            yield _sse("safety", safety.model_dump())
+
+            if safety.severity == "crisis":
+                if speculation is not None:
+                    speculation.cancel()
+                timings["total"] = round((time.perf_counter() - t0) * 1000, 1)
+                SHORT_CIRCUITS.inc(reason="crisis")
+                resp = _crisis_chat_response(
+                    session_id, safety, _with_llm_calls({"route": [], "note": "crisis short-circuit", "timings_ms": timings})
+                )
+                yield _sse("token", {"text": resp.reply})
+                yield _sse_done(resp)
+                return
+
+            result = None
+            async for kind, payload in run_orchestrator_stream(
+                user_message=user_message,
+                safety=safety,
+                session_id=session_id,
+                speculation=speculation,
+                timings=timings,
+                state=state,
+            ):
+                if kind == "token":
+                    yield _sse("token", {"text": payload})
+                else:
+                    result = payload
+            timings["total"] = round((time.perf_counter() - t0) * 1000, 1)
+
+            result.setdefault("debug", {})
+            result["debug"]["speculative"] = speculation is not None
+            result["debug"]["classifier_mode"] = CLASSIFIER_MODE
+            result["debug"]["preclassified"] = pre.label if pre is not None else None
+            result["debug"]["timings_ms"] = timings
+            _with_llm_calls(result["debug"])
+            resp = _orchestrated_chat_response(session_id, safety, result)
+
+            for action in resp.ui_actions or []:
+                yield _sse("ui_action", action.model_dump())
+            yield _sse_done(resp)
+
+        except LLMUnavailableError as e:
+            # Tokens may already be out; "done" carries the reply to show
+            print(f"[LLM] degraded reply: {e}")
+            resp = _degraded_chat_response(session_id, {"route": [], "note": str(e)})
+            yield _sse_done(resp)
+        except Exception as e:
+            print("\n=== /chat/stream ERROR ===")
+            print(repr(e))
+            traceback.print_exc()
+            print("=== END ERROR ===\n")
+            CHAT_TURNS.inc(endpoint="chat_stream", status="error")
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            # Client went away (or we failed) before the speculation was consumed
+            if speculation is not None and not speculation.done():
+                speculation.cancel()
+
+    # Admitted before the response starts, so a rejection is a real 429
+    try:
+        ticket = await _admit(session_id)
+    except HTTPException:
+        CHAT_TURNS.inc(endpoint="chat_stream", status="rejected")
+        raise
+
+    async def events_with_deadline():
+        try:
+            with deadline_scope(CHAT_DEADLINE_SECONDS), session_scope(session_id), trace_scope():
+                async for event in events():
+                    yield event
+        finally:
+            ticket.release()
+
+    # The generator's finally only runs once the body has started; the
+    # background task also covers a client that left before that
+    # (release() is idempotent).
+    return StreamingResponse(
+        events_with_deadline(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(ticket.release),
+    )
+
 @app.exception_handler(Exception)
 async def all_exception_handler(request: Request, exc: Exception):
     print("\n=== GLOBAL EXCEPTION ===")
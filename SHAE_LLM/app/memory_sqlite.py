@@ -1,19 +1,103 @@
 from __future__ import annotations
+import functools
 import os
 import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
 from typing import List, Tuple, Optional
 from datetime import datetime
 
-# Store DB in project root (next to app/)
-DB_PATH = os.getenv("SHAE_DB_PATH", os.path.join(os.getcwd(), "shae_memory.db"))
+from .config import PROJECT_ROOT
+from .metrics import record_sqlite
 
-def _conn() -> sqlite3.Connection:
-    c = sqlite3.connect(DB_PATH, check_same_thread=False)
+# Store DB in project root (next to app/), the same place .env is read
+# from, whatever directory the app is started in. Every function below
+# also takes db_path, so one process can use several files
+# (app/session_store.py).
+DB_PATH = os.getenv("SHAE_DB_PATH", os.path.join(PROJECT_ROOT, "shae_memory.db"))
+
+# WAL lets readers run alongside the single writer; NORMAL sync is durable
+# across app crashes in WAL mode (only an OS crash can lose the last commits).
+SQLITE_SYNCHRONOUS = os.getenv("SHAE_SQLITE_SYNCHRONOUS", "NORMAL").strip().upper()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SHAE_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_KB = int(os.getenv("SHAE_SQLITE_CACHE_KB", "16384"))
+
+# One connection per (thread, db path), reused for the thread's lifetime
+# instead of a fresh sqlite3.connect on every call. The schema is created
+# (and migrated) by the first connection to a path, so importing this module
+# touches no files; app startup calls init_db() (via the session store) up front.
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()  # db paths whose schema is up to date
+
+def _open(db_path: str) -> sqlite3.Connection:
+    c = sqlite3.connect(db_path, check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
     c.row_factory = sqlite3.Row
+    c.execute("PRAGMA journal_mode=WAL")
+    c.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    c.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    c.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+    c.execute("PRAGMA temp_store=MEMORY")
+    return c
+
+def _conn(db_path: Optional[str] = None) -> sqlite3.Connection:
+    path = db_path or DB_PATH
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    c = conns.get(path)
+    if c is None:
+        c = _open(path)
+        if path not in _schema_ready:
+            with _schema_lock:
+                if path not in _schema_ready:
+                    _create_schema(c, path)
+                    _schema_ready.add(path)
+        conns[path] = c
     return c
 
-def init_db() -> None:
-    with _conn() as c:
+def close_thread_connections() -> None:
+    """Close this thread's pooled connections (e.g. at shutdown)."""
+    for c in getattr(_local, "conns", {}).values():
+        c.close()
+    _local.conns = {}
+
+def _timed(fn):
+    """Report the call's wall time to app/metrics.py under its function name."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            record_sqlite(fn.__name__, time.perf_counter() - t0)
+    return wrapper
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Each step must be safe on DBs created by any earlier version of this file.
+def _migrate_watermark(c: sqlite3.Connection) -> None:
+    # session_state.summarized_upto: last turn id folded into the summary
+    cols = [r["name"] for r in c.execute("PRAGMA table_info(session_state)").fetchall()]
+    if "summarized_upto" not in cols:
+        c.execute("ALTER TABLE session_state ADD COLUMN summarized_upto INTEGER NOT NULL DEFAULT 0")
+
+def _migrate_session_index(c: sqlite3.Connection) -> None:
+    # All turn lookups are "WHERE session_id=? ORDER BY id"
+    c.execute("CREATE INDEX IF NOT EXISTS idx_turns_session_id ON turns(session_id, id)")
+
+_MIGRATIONS = [
+    _migrate_watermark,
+    _migrate_session_index,
+]
+
+def init_db(db_path: Optional[str] = None) -> None:
+    """Open the DB and bring its schema up to date (otherwise done on first use)."""
+    _conn(db_path)
+
+def _create_schema(c: sqlite3.Connection, path: str) -> None:
+    with c:
+        existing = c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='turns'").fetchone()
         c.execute("""
         CREATE TABLE IF NOT EXISTS turns (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -27,32 +111,94 @@ def init_db() -> None:
         CREATE TABLE IF NOT EXISTS session_state (
             session_id TEXT PRIMARY KEY,
             summary TEXT NOT NULL DEFAULT '',
-            updated_at TEXT NOT NULL
+            updated_at TEXT NOT NULL,
+            summarized_upto INTEGER NOT NULL DEFAULT 0
         )
         """)
         c.commit()
 
-def append_turn(session_id: str, role: str, text: str) -> None:
+        version = c.execute("PRAGMA user_version").fetchone()[0]
+        for i, migrate in enumerate(_MIGRATIONS[version:], start=version + 1):
+            if existing:
+                print(f"[DB] Migrating {path} to schema v{i} ({migrate.__name__})")
+            migrate(c)
+            c.execute(f"PRAGMA user_version={i}")
+            c.commit()
+
+@_timed
+def append_turn(session_id: str, role: str, text: str, db_path: Optional[str] = None) -> None:
     if not session_id:
         session_id = "default"
     ts = datetime.utcnow().isoformat()
-    with _conn() as c:
+    with _conn(db_path) as c:
         c.execute(
             "INSERT INTO turns(session_id, ts, role, text) VALUES(?,?,?,?)",
             (session_id, ts, role, text),
         )
         c.commit()
 
-def get_turn_count(session_id: str) -> int:
-    with _conn() as c:
+@_timed
+def append_turns(session_id: str, turns: List[Tuple[str, str]], db_path: Optional[str] = None) -> None:
+    """Append several (role, text) turns atomically, in one transaction."""
+    if not session_id:
+        session_id = "default"
+    ts = datetime.utcnow().isoformat()
+    with _conn(db_path) as c:
+        c.executemany(
+            "INSERT INTO turns(session_id, ts, role, text) VALUES(?,?,?,?)",
+            [(session_id, ts, role, text) for role, text in turns],
+        )
+        c.commit()
+
+@dataclass
+class SessionContext:
+    summary: str = ""
+    turns: List[Tuple[str, str]] = field(default_factory=list)  # last `keep_last`, chronological
+    total: int = 0          # all stored turns for the session
+    watermark: int = 0      # last turn id folded into the summary
+
+@_timed
+def load_session_context(session_id: str, keep_last: int, db_path: Optional[str] = None) -> SessionContext:
+    """
+    Summary, recent window, turn count and summary watermark for one request,
+    read in a single transaction so they are consistent with each other.
+    """
+    c = _conn(db_path)
+    with c:
+        c.execute("BEGIN")
+        state = c.execute(
+            "SELECT summary, summarized_upto FROM session_state WHERE session_id=?",
+            (session_id,),
+        ).fetchone()
+        rows = c.execute(
+            "SELECT role, text FROM turns WHERE session_id=? ORDER BY id DESC LIMIT ?",
+            (session_id, keep_last),
+        ).fetchall()
+        total = c.execute(
+            "SELECT COUNT(*) AS n FROM turns WHERE session_id=?",
+            (session_id,),
+        ).fetchone()["n"]
+
+    return SessionContext(
+        summary=(state["summary"] if state else "") or "",
+        # rows are newest-first; reverse to chronological
+        turns=[(r["role"], r["text"]) for r in reversed(rows)],
+        total=int(total),
+        watermark=int(state["summarized_upto"]) if state else 0,
+    )
+
+@_timed
+def get_turn_count(session_id: str, db_path: Optional[str] = None) -> int:
+    with _conn(db_path) as c:
         row = c.execute(
             "SELECT COUNT(*) AS n FROM turns WHERE session_id=?",
             (session_id,),
         ).fetchone()
         return int(row["n"]) if row else 0
 
-def get_last_turns(session_id: str, limit: int) -> List[Tuple[str, str]]:
-    with _conn() as c:
+@_timed
+def get_last_turns(session_id: str, limit: int, db_path: Optional[str] = None) -> List[Tuple[str, str]]:
+    with _conn(db_path) as c:
         rows = c.execute(
             "SELECT role, text FROM turns WHERE session_id=? ORDER BY id DESC LIMIT ?",
             (session_id, limit),
@@ -60,12 +206,13 @@ def get_last_turns(session_id: str, limit: int) -> List[Tuple[str, str]]:
         # rows are newest-first; reverse to chronological
         return [(r["role"], r["text"]) for r in reversed(rows)]
 
-def get_old_turns_excluding_last(session_id: str, keep_last: int) -> List[Tuple[str, str]]:
+@_timed
+def get_old_turns_excluding_last(session_id: str, keep_last: int, db_path: Optional[str] = None) -> List[Tuple[str, str]]:
     """
     Returns the older turns that would be summarized:
     all turns except the most recent `keep_last`.
     """
-    with _conn() as c:
+    with _conn(db_path) as c:
         # fetch ids of last keep_last turns
         rows = c.execute(
             "SELECT id FROM turns WHERE session_id=? ORDER BY id DESC LIMIT ?",
@@ -83,8 +230,41 @@ def get_old_turns_excluding_last(session_id: str, keep_last: int) -> List[Tuple[
         ).fetchall()
         return [(r["role"], r["text"]) for r in older]
 
-def delete_old_turns_excluding_last(session_id: str, keep_last: int) -> None:
-    with _conn() as c:
+@_timed
+def count_turns_after(session_id: str, after_id: int, db_path: Optional[str] = None) -> int:
+    with _conn(db_path) as c:
+        row = c.execute(
+            "SELECT COUNT(*) AS n FROM turns WHERE session_id=? AND id > ?",
+            (session_id, after_id),
+        ).fetchone()
+        return int(row["n"]) if row else 0
+
+@_timed
+def get_turns_after_excluding_last(session_id: str, after_id: int, keep_last: int, db_path: Optional[str] = None) -> List[Tuple[int, str, str]]:
+    """
+    Returns (id, role, text) for turns newer than `after_id` (the summary
+    watermark) but older than the most recent `keep_last`, oldest first.
+    """
+    with _conn(db_path) as c:
+        rows = c.execute(
+            "SELECT id FROM turns WHERE session_id=? ORDER BY id DESC LIMIT ?",
+            (session_id, keep_last),
+        ).fetchall()
+        last_ids = [r["id"] for r in rows]
+        if not last_ids:
+            return []
+
+        min_last_id = min(last_ids)
+
+        older = c.execute(
+            "SELECT id, role, text FROM turns WHERE session_id=? AND id > ? AND id < ? ORDER BY id ASC",
+            (session_id, after_id, min_last_id),
+        ).fetchall()
+        return [(r["id"], r["role"], r["text"]) for r in older]
+
+@_timed
+def delete_old_turns_excluding_last(session_id: str, keep_last: int, db_path: Optional[str] = None) -> None:
+    with _conn(db_path) as c:
         rows = c.execute(
             "SELECT id FROM turns WHERE session_id=? ORDER BY id DESC LIMIT ?",
             (session_id, keep_last),
@@ -99,18 +279,20 @@ def delete_old_turns_excluding_last(session_id: str, keep_last: int) -> None:
         )
         c.commit()
 
-def get_summary(session_id: str) -> str:
-    with _conn() as c:
+@_timed
+def get_summary(session_id: str, db_path: Optional[str] = None) -> str:
+    with _conn(db_path) as c:
         row = c.execute(
             "SELECT summary FROM session_state WHERE session_id=?",
             (session_id,),
         ).fetchone()
         return (row["summary"] if row else "") or ""
 
-def set_summary(session_id: str, summary: str) -> None:
+@_timed
+def set_summary(session_id: str, summary: str, db_path: Optional[str] = None) -> None:
     ts = datetime.utcnow().isoformat()
     summary = (summary or "").strip()
-    with _conn() as c:
+    with _conn(db_path) as c:
         c.execute(
             """
             INSERT INTO session_state(session_id, summary, updated_at)
@@ -123,8 +305,45 @@ def set_summary(session_id: str, summary: str) -> None:
         )
         c.commit()
 
-def clear_session(session_id: str) -> None:
-    with _conn() as c:
+@_timed
+def get_summary_watermark(session_id: str, db_path: Optional[str] = None) -> int:
+    """Id of the last turn already folded into the summary (0 if none)."""
+    with _conn(db_path) as c:
+        row = c.execute(
+            "SELECT summarized_upto FROM session_state WHERE session_id=?",
+            (session_id,),
+        ).fetchone()
+        return int(row["summarized_upto"]) if row else 0
+
+@_timed
+def advance_summary(session_id: str, summary: str, from_id: int, to_id: int, db_path: Optional[str] = None) -> bool:
+    """
+    Store `summary` and move the watermark from `from_id` to `to_id`.
+
+    Compare-and-set on the watermark: returns False (and writes nothing) if
+    another writer already advanced it, so each turn is folded in once.
+    """
+    ts = datetime.utcnow().isoformat()
+    summary = (summary or "").strip()
+    with _conn(db_path) as c:
+        if from_id == 0:
+            c.execute(
+                "INSERT OR IGNORE INTO session_state(session_id, summary, updated_at, summarized_upto) VALUES(?,?,?,0)",
+                (session_id, "", ts),
+            )
+        cur = c.execute(
+            """
+            UPDATE session_state SET summary=?, updated_at=?, summarized_upto=?
+            WHERE session_id=? AND summarized_upto=?
+            """,
+            (summary, ts, to_id, session_id, from_id),
+        )
+        c.commit()
+        return cur.rowcount == 1
+
+@_timed
+def clear_session(session_id: str, db_path: Optional[str] = None) -> None:
+    with _conn(db_path) as c:
         c.execute("DELETE FROM turns WHERE session_id=?", (session_id,))
         c.execute("DELETE FROM session_state WHERE session_id=?", (session_id,))
         c.commit()
@@ -0,0 +1,235 @@
+"""
+In-process metrics with a Prometheus text exposition (GET /metrics).
+
+- span(stage):        time a block into shae_stage_seconds{stage} and into
+                      the current request's timings (ChatResponse.debug)
+- record_llm_call():  one completion call: latency, outcome and token usage
+                      per role and model (shae_llm_*)
+- counters for short-circuits, JSON repairs and classifier fallbacks
+- register_collector(): components that already keep a stats dict (caches,
+  batcher, admission, endpoints) are read at scrape time instead of being
+  counted twice
+
+Per request, trace_scope() collects the stage timings and, with
+DEBUG_LLM_CALLS, every LLM call made while serving it. Tasks started by
+the request (speculation, batched calls) inherit the trace.
+"""
+from __future__ import annotations
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+_lock = threading.Lock()
+_metrics: List["_Metric"] = []
+_collectors: List[Tuple[str, str, Callable[[], Iterable[Tuple[dict, float]]]]] = []
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (64, 128, 256, 512, 768, 1024, 1536, 2048, 4096)
+
+
+def _label_str(labelnames: Sequence[str], values: Sequence[str]) -> str:
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{k}="{_escape(str(v))}"' for k, v in zip(labelnames, values))
+    return "{" + pairs + "}"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        with _lock:
+            _metrics.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(k, "")) for k in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with _lock:
+            items = sorted(self._values.items())
+        lines += [f"{self.name}{_label_str(self.labelnames, k)} {v:g}" for k, v in items]
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        self._values: Dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with _lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with _lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        names = self.labelnames + ("le",)
+        for key, row in items:
+            for bound, n in zip(self.buckets, row):
+                lines.append(f"{self.name}_bucket{_label_str(names, key + (f'{bound:g}',))} {n}")
+            lines.append(f"{self.name}_bucket{_label_str(names, key + ('+Inf',))} {row[-1]}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {row[-2]:.6f}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {row[-1]}")
+        return lines
+
+
+def register_collector(name: str, help: str, fn: Callable[[], Iterable[Tuple[dict, float]]]) -> None:
+    """Expose fn()'s (labels, value) samples as `name` on every scrape."""
+    with _lock:
+        _collectors.append((name, help, fn))
+
+def stats_samples(stats: dict, **labels) -> List[Tuple[dict, float]]:
+    """(labels + {"stat": key}, value) for every numeric entry of a stats dict."""
+    return [
+        ({**labels, "stat": k}, float(v))
+        for k, v in stats.items()
+        if isinstance(v, (int, float))
+    ]
+
+def render() -> str:
+    with _lock:
+        metrics, collectors = list(_metrics), list(_collectors)
+    lines = []
+    for m in metrics:
+        lines += m.render()
+    for name, help, fn in collectors:
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} untyped"]
+        for labels, value in fn():
+            lines.append(f"{name}{_label_str(tuple(labels), tuple(labels.values()))} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------
+# Metrics
+# ---------------------------
+
+STAGE_SECONDS = Histogram("shae_stage_seconds", "Wall time of a /chat pipeline stage.", ("stage",))
+SQLITE_SECONDS = Histogram("shae_sqlite_seconds", "Time spent in a memory_sqlite operation.", ("op",))
+LLM_SECONDS = Histogram("shae_llm_call_seconds", "LLM completion call time.", ("role", "model"))
+LLM_CALLS = Counter("shae_llm_calls_total", "LLM completion calls by outcome.", ("role", "model", "outcome"))
+LLM_TOKENS = Counter("shae_llm_tokens_total", "Tokens per role and model (usage, or streamed chunks).",
+                     ("role", "model", "kind"))
+JSON_REPAIRS = Counter("shae_json_repairs_total", "Fix-prompt retries after unparseable classifier JSON.", ("role",))
+FALLBACKS = Counter("shae_classifier_fallbacks_total", "Classifier results replaced by the rule-based fallback.",
+                    ("role",))
+SHORT_CIRCUITS = Counter("shae_short_circuits_total", "Turns answered without the full pipeline.", ("reason",))
+CHAT_TURNS = Counter("shae_chat_turns_total", "Turns served by /chat and /chat/stream.", ("endpoint", "status"))
+CONTEXT_TOKENS = Histogram("shae_context_tokens", "Summary + recent-turn tokens put in an agent prompt.", ("role",),
+                           buckets=TOKEN_BUCKETS)
+CONTEXT_TURNS_DROPPED = Counter("shae_context_turns_dropped_total", "Recent turns left out by the token budget.",
+                                ("role",))
+
+
+# ---------------------------
+# Per-request trace and spans
+# ---------------------------
+
+@dataclass
+class Trace:
+    timings: Dict[str, float] = field(default_factory=dict)  # stage -> ms
+    llm_calls: List[dict] = field(default_factory=list)
+
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("metrics_trace", default=None)
+
+@contextmanager
+def trace_scope() -> Iterator[Trace]:
+    trace = Trace()
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+@contextmanager
+def span(stage: str, timings: Optional[dict] = None) -> Iterator[None]:
+    """
+    Time the block into shae_stage_seconds{stage}. The milliseconds also go
+    to `timings`, or to the current request trace (added up if the stage
+    repeats).
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        if timings is None:
+            trace = _trace.get()
+            timings = trace.timings if trace is not None else None
+        if timings is not None:
+            timings[stage] = round(timings.get(stage, 0.0) + elapsed * 1000, 1)
+
+def record_sqlite(op: str, seconds: float) -> None:
+    SQLITE_SECONDS.observe(seconds, op=op)
+    trace = _trace.get()
+    if trace is not None:
+        trace.timings["sqlite"] = round(trace.timings.get("sqlite", 0.0) + seconds * 1000, 2)
+
+def record_llm_call(
+    role: str,
+    model: str,
+    seconds: float,
+    outcome: str = "ok",
+    prompt_tokens: Optional[int] = None,
+    completion_tokens: Optional[int] = None,
+    endpoint: str = "",
+) -> None:
+    LLM_CALLS.inc(role=role, model=model, outcome=outcome)
+    if outcome == "ok":
+        LLM_SECONDS.observe(seconds, role=role, model=model)
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, role=role, model=model, kind="prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, role=role, model=model, kind="completion")
+    trace = _trace.get()
+    if trace is not None:
+        trace.llm_calls.append({
+            "role": role,
+            "model": model,
+            "endpoint": endpoint,
+            "outcome": outcome,
+            "ms": round(seconds * 1000, 1),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+        })
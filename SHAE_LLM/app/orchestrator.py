@@ -1,60 +1,109 @@
-from .agents import social_agent, state_agent, choose_coach_mode, coaching_agent
+from .agents import (
+    social_agent,
+    state_agent,
+    state_agent_async,
+    choose_coach_mode,
+    coaching_agent,
+    coaching_agent_async,
+    coaching_agent_stream,
+    CoachStreamFilter,
+    _cap_coach_reply,
+)
 import re
+import time
+import asyncio
 from .schemas import UIAction
 from .prompts import ALLOWED_UI_ACTIONS
-from .memory_sqlite import (
-    get_turn_count,
-    get_last_turns,
-    get_old_turns_excluding_last,
-    delete_old_turns_excluding_last,
-    append_turn,
+from .session_store import get_store
+from .session_cache import (
+    load_session_context,
+    append_turns,
     get_summary,
-    set_summary,
+    advance_summary,
 )
 from .llm_backend import ChatMsg, get_backend
 from .prompts import SESSION_SUMMARY_PROMPT
+from .generation import get_profile
+from .summary_worker import SummaryWorker
+from .metrics import SHORT_CIRCUITS, STAGE_SECONDS, span
+from .config import SUMMARY_DEBOUNCE_SECONDS, SUMMARY_WORKERS, CONTEXT_MAX_TURNS
 
 _UI_ACTION_RE = re.compile(r"^\s*UI_ACTION:\s*(\w+)\s*$", re.MULTILINE)
 # =========================
 # Memory tuning constants
 # =========================
 
-KEEP_LAST_TURNS = 12          # how many recent turns go verbatim into the prompt
-SUMMARIZE_AFTER_TURNS = 24    # when total turns exceed this, summarize older ones
+KEEP_LAST_TURNS = 12          # newest turns kept out of the summary (the prompt has them verbatim)
+SUMMARIZE_BATCH_TURNS = 4     # fold turns into the summary once this many have left that window
 def _format_turns(turns):
     return "\n".join([f"{role}: {text}" for role, text in turns])
 
+def _summary_messages(existing: str, chunk_text: str):
+    # Static instructions in the system message, session data after it
+    prompt = f"""EXISTING SUMMARY:
+{existing}
+
+NEW CHUNK TO INCORPORATE:
+{chunk_text}
+
+Update the summary.
+"""
+
+    return [
+        ChatMsg(role="system", content=SESSION_SUMMARY_PROMPT),
+        ChatMsg(role="user", content=prompt),
+    ]
+
 def maybe_update_summary(session_id: str) -> None:
-    total = get_turn_count(session_id)
-    if total <= SUMMARIZE_AFTER_TURNS:
+    """
+    Fold turns newer than the summary watermark (except the last
+    KEEP_LAST_TURNS, which the prompt gets verbatim) into the summary.
+    Runs on the background summary worker, never on the request path.
+
+    Turns that have left the verbatim window are in the prompt only once
+    they are in the summary, so this folds as soon as a small batch of
+    them (SUMMARIZE_BATCH_TURNS) is waiting, not after a long backlog.
+    """
+    store = get_store()
+    watermark = store.get_summary_watermark(session_id)
+    if store.count_turns_after(session_id, watermark) - KEEP_LAST_TURNS < SUMMARIZE_BATCH_TURNS:
         return
 
-    old_turns = get_old_turns_excluding_last(session_id, KEEP_LAST_TURNS)
-    if not old_turns:
+    chunk = store.get_turns_after_excluding_last(session_id, watermark, KEEP_LAST_TURNS)
+    if not chunk:
         return
 
     existing = get_summary(session_id)
-    chunk_text = _format_turns(old_turns)
+    chunk_text = _format_turns([(role, text) for _, role, text in chunk])
 
-    backend = get_backend()
-    prompt = f"""{SESSION_SUMMARY_PROMPT}
+    backend = get_backend("summary")
+    with span("summary"):
+        new_summary = backend.chat(_summary_messages(existing, chunk_text), profile=get_profile("summary")).strip()
 
-EXISTING SUMMARY:
-{existing}
+    # Another worker may have folded these turns already; then this is a no-op.
+    advance_summary(session_id, new_summary, from_id=watermark, to_id=chunk[-1][0])
 
-NEW CHUNK TO INCORPORATE:
-{chunk_text}
-"""
+    # OPTIONAL (SQLite engine only): comment this out if you want DB to retain all turns forever
+    # memory_sqlite.delete_old_turns_excluding_last(session_id, KEEP_LAST_TURNS)
 
-    new_summary = backend.chat([
-        ChatMsg(role="system", content=prompt),
-        ChatMsg(role="user", content="Update the summary."),
-    ]).strip()
+_summary_worker = SummaryWorker(
+    maybe_update_summary,
+    debounce_seconds=SUMMARY_DEBOUNCE_SECONDS,
+    max_workers=SUMMARY_WORKERS,
+)
+
+def get_summary_worker() -> SummaryWorker:
+    return _summary_worker
 
-    set_summary(session_id, new_summary)
+def _persist_turns(session_id: str, user_message: str, reply: str) -> None:
+    # One transaction: a crash can't leave a user turn without its reply
+    append_turns(session_id, [("user", user_message), ("assistant", reply)])
+    # Summarize in the background; this request uses the summary as it is now.
+    _summary_worker.schedule(session_id)
 
-    # OPTIONAL: comment this out if you want DB to retain all turns forever
-    # delete_old_turns_excluding_last(session_id, KEEP_LAST_TURNS)
+async def _persist_turns_async(session_id: str, user_message: str, reply: str) -> None:
+    # SQLite can wait up to busy_timeout on another writer: keep that off the event loop
+    await asyncio.to_thread(_persist_turns, session_id, user_message, reply)
 
 def extract_ui_action(reply: str):
     if not reply:
@@ -98,53 +147,51 @@ def _orch_payload(route: list[str], mode: str, notes: str, distress_score: int =
         "notes": notes,
     }
 
-def run_orchestrator(user_message: str, safety, session_id: str):
-    # 0) Update rolling summary (if chat is long)
-    maybe_update_summary(session_id)
+def load_recent_turns(session_id: str) -> list[str]:
+    # More than KEEP_LAST_TURNS: older turns are in the summary too, but a
+    # role's token budget may have room for them verbatim (app/context_budget.py)
+    ctx = load_session_context(session_id, max(KEEP_LAST_TURNS, CONTEXT_MAX_TURNS))
+    recent_turns = [f"{role}: {text}" for role, text in ctx.turns]
+    if ctx.summary:
+        recent_turns = [f"summary: {ctx.summary}"] + recent_turns
+    return recent_turns
 
-    # 1) Load memory context for this session
-    summary = get_summary(session_id)
-    recent = get_last_turns(session_id, KEEP_LAST_TURNS)
-    recent_turns = [f"{role}: {text}" for role, text in recent]
-    if summary:
-        recent_turns = [f"summary: {summary}"] + recent_turns
+async def load_recent_turns_async(session_id: str) -> list[str]:
+    return await asyncio.to_thread(load_recent_turns, session_id)
 
-    # 2) Social short-circuit (no LLM)
-    sr = social_agent(user_message)
-    if sr:
-        reply = sr
-        ui_action = None
-
-        orch = _orch_payload(
-            route=["neutral"],
-            mode="listen",
-            notes="social short-circuit (hi->hi)",
-            distress_score=0,
-            allow_positive=True,
-        )
-
-        # ✅ 3E: persist turns
-        append_turn(session_id, "user", user_message)
-        append_turn(session_id, "assistant", reply)
-
-        return {
-            "reply": reply,
-            "orchestration": orch,
-            "ui_actions": None,
-            "debug": {
-                "route": orch["route"],
-                "mode": orch["mode"],
-                "coach_mode": "SOCIAL",
-                "ui_action": None,
-            },
-        }
+def _finish_turn(session_id: str, user_message: str, result: dict) -> dict:
+    # ✅ 3E: persist turns
+    _persist_turns(session_id, user_message, result["reply"])
+    return result
 
-    # 3) State agent (silent)
-    state = state_agent(user_message, recent_turns)
+async def _finish_turn_async(session_id: str, user_message: str, result: dict) -> dict:
+    await _persist_turns_async(session_id, user_message, result["reply"])
+    return result
 
-    # 4) Coaching agent (only speaker beyond social)
-    coach_mode = choose_coach_mode(state)  # LISTEN/GROUND/COACH/PLAN
-    raw_reply = coaching_agent(coach_mode, user_message, recent_turns)
+def _social_result(reply: str):
+    orch = _orch_payload(
+        route=["neutral"],
+        mode="listen",
+        notes="social short-circuit (hi->hi)",
+        distress_score=0,
+        allow_positive=True,
+    )
+
+    SHORT_CIRCUITS.inc(reason="social")
+
+    return {
+        "reply": reply,
+        "orchestration": orch,
+        "ui_actions": None,
+        "debug": {
+            "route": orch["route"],
+            "mode": orch["mode"],
+            "coach_mode": "SOCIAL",
+            "ui_action": None,
+        },
+    }
+
+def _coach_result(state: dict, coach_mode: str, raw_reply: str):
     reply, ui_action = extract_ui_action(raw_reply)
 
     # 5) Map coach_mode -> legacy mode
@@ -170,10 +217,6 @@ def run_orchestrator(user_message: str, safety, session_id: str):
         allow_positive=allow_positive,
     )
 
-    # ✅ 3E: persist turns
-    append_turn(session_id, "user", user_message)
-    append_turn(session_id, "assistant", reply)
-
     return {
         "reply": reply,
         "orchestration": orch,
@@ -186,3 +229,125 @@ def run_orchestrator(user_message: str, safety, session_id: str):
             "ui_action": ui_action.id if ui_action else None,
         },
     }
+
+def run_orchestrator(user_message: str, safety, session_id: str):
+    # 1) Load memory context for this session
+    recent_turns = load_recent_turns(session_id)
+
+    # 2) Social short-circuit (no LLM)
+    sr = social_agent(user_message)
+    if sr:
+        return _finish_turn(session_id, user_message, _social_result(sr))
+
+    # 3) State agent (silent)
+    state = state_agent(user_message, recent_turns)
+
+    # 4) Coaching agent (only speaker beyond social)
+    coach_mode = choose_coach_mode(state)  # LISTEN/GROUND/COACH/PLAN
+    raw_reply = coaching_agent(coach_mode, user_message, recent_turns)
+
+    return _finish_turn(session_id, user_message, _coach_result(state, coach_mode, raw_reply))
+
+async def timed(timings: dict, stage: str, coro):
+    """Await `coro` and record its wall time (ms) under timings[stage] and in /metrics."""
+    with span(stage, timings):
+        return await coro
+
+async def _speculate(user_message: str, session_id: str, timings: dict, with_coach: bool) -> dict:
+    recent_turns = await load_recent_turns_async(session_id)
+
+    state = await timed(timings, "state", state_agent_async(user_message, recent_turns))
+    coach_mode = choose_coach_mode(state)
+
+    raw_reply = None
+    if with_coach:
+        raw_reply = await timed(timings, "coach", coaching_agent_async(coach_mode, user_message, recent_turns))
+
+    return {
+        "recent_turns": recent_turns,
+        "state": state,
+        "coach_mode": coach_mode,
+        "raw_reply": raw_reply,
+    }
+
+def start_speculation(user_message: str, session_id: str, timings: dict, with_coach: bool = False):
+    """
+    Start the state classifier (and optionally the coach) before safety has
+    answered. Returns an asyncio.Task for run_orchestrator_async, or None when
+    the social short-circuit will answer without an LLM.
+
+    The caller must cancel the task if safety comes back as crisis; nothing is
+    persisted until run_orchestrator_async consumes the result.
+    """
+    if social_agent(user_message):
+        return None
+    return asyncio.create_task(_speculate(user_message, session_id, timings, with_coach))
+
+async def run_orchestrator_async(user_message: str, safety, session_id: str, speculation=None, timings=None, state=None):
+    # Same pipeline as run_orchestrator; LLM calls are awaited instead of blocking.
+    # `state` skips the state agent when the caller already has it (pre-classifier).
+    timings = {} if timings is None else timings
+
+    if speculation is not None:
+        spec = await speculation
+        recent_turns = spec["recent_turns"]
+        state = spec["state"]
+        coach_mode = spec["coach_mode"]
+        raw_reply = spec["raw_reply"]
+        if raw_reply is None:
+            raw_reply = await timed(timings, "coach", coaching_agent_async(coach_mode, user_message, recent_turns))
+        return await _finish_turn_async(session_id, user_message, _coach_result(state, coach_mode, raw_reply))
+
+    recent_turns = await load_recent_turns_async(session_id)
+
+    sr = social_agent(user_message)
+    if sr:
+        return await _finish_turn_async(session_id, user_message, _social_result(sr))
+
+    if state is None:
+        state = await timed(timings, "state", state_agent_async(user_message, recent_turns))
+
+    coach_mode = choose_coach_mode(state)
+    raw_reply = await timed(timings, "coach", coaching_agent_async(coach_mode, user_message, recent_turns))
+
+    return await _finish_turn_async(session_id, user_message, _coach_result(state, coach_mode, raw_reply))
+
+async def run_orchestrator_stream(user_message: str, safety, session_id: str, speculation=None, timings=None, state=None):
+    """
+    Streaming variant of run_orchestrator_async.
+
+    Yields ("token", text) events as coach text becomes visible, then one
+    ("done", result) event with the same result dict run_orchestrator_async
+    returns. Turns are persisted only after the stream completes.
+    """
+    timings = {} if timings is None else timings
+
+    if speculation is not None:
+        spec = await speculation
+        recent_turns = spec["recent_turns"]
+        state = spec["state"]
+        coach_mode = spec["coach_mode"]
+    else:
+        recent_turns = await load_recent_turns_async(session_id)
+
+        sr = social_agent(user_message)
+        if sr:
+            yield "token", sr
+            yield "done", await _finish_turn_async(session_id, user_message, _social_result(sr))
+            return
+
+        if state is None:
+            state = await timed(timings, "state", state_agent_async(user_message, recent_turns))
+        coach_mode = choose_coach_mode(state)
+
+    stream_filter = CoachStreamFilter(coach_mode)
+    t0 = time.perf_counter()
+    with span("coach", timings):
+        async for text in coaching_agent_stream(coach_mode, user_message, recent_turns, stream_filter):
+            if "coach_first_token" not in timings:
+                timings["coach_first_token"] = round((time.perf_counter() - t0) * 1000, 1)
+                STAGE_SECONDS.observe(time.perf_counter() - t0, stage="coach_first_token")
+            yield "token", text
+
+    raw_reply = _cap_coach_reply(coach_mode, stream_filter.raw.strip())
+    yield "done", await _finish_turn_async(session_id, user_message, _coach_result(state, coach_mode, raw_reply))
@@ -0,0 +1,93 @@
+"""
+Local pre-classifier for trivial, low-content messages (no network, no GPU).
+
+"ok", "thanks", "hmm", "theek hai", a lone 🙂 ... carry no risk signal and no
+new state, yet each used to cost a safety and a state LLM call. If the WHOLE
+normalized message is in the lexicon below, we return a SafetyResult and a
+state dict with a confidence score; anything else (including any word we
+don't know) returns None and goes to the LLM as before.
+
+The lexicon is deliberately an allow-list, not a risk list: a message can
+only be skipped if every token of it is known-trivial. Replies that can
+answer a question ("yes", "no", "not really") are excluded on purpose,
+since "no" after "Are you safe right now?" is not trivial.
+"""
+from __future__ import annotations
+import unicodedata
+from dataclasses import dataclass
+from typing import Optional
+
+from .classifier_cache import normalize_message
+from .schemas import RiskFlags, SafetyResult
+
+# phrase -> (label, confidence)
+_TRIVIAL = {}
+
+def _add(label: str, confidence: float, *phrases: str) -> None:
+    for p in phrases:
+        _TRIVIAL[p] = (label, confidence)
+
+_add("ack", 0.95,
+     "ok", "okay", "okk", "okkk", "k", "kk", "okie", "okey", "alright", "alrighty",
+     "got it", "gotcha", "i see", "understood", "noted", "sure", "cool", "nice",
+     "ok cool", "okay cool", "ok sure", "okay sure", "makes sense",
+     "acha", "achha", "accha", "acchha", "theek hai", "thik hai", "theek h", "thik h",
+     "hmm ok", "ok then", "right")
+_add("greeting", 0.95, "hi", "hii", "hiii", "hello", "helo", "hey", "heyy", "heyyy", "namaste")
+_add("thanks", 0.95,
+     "thanks", "thank you", "thank u", "thanku", "thankyou", "thx", "ty", "tysm",
+     "thanks a lot", "thank you so much", "thanks so much", "ok thanks", "okay thanks",
+     "ok thank you", "okay thank you", "shukriya", "dhanyavaad", "dhanyawad")
+_add("filler", 0.9,
+     "hmm", "hmmm", "hmmmm", "hm", "mm", "mmm", "uh", "um", "umm", "ah", "oh", "ohh",
+     "ohk", "oh ok", "oh okay", "lol", "haha", "hehe")
+# "I'm fine" can mask distress: below the default threshold on purpose
+_add("fine", 0.7, "fine", "great", "i'm fine", "im fine", "i am fine", "i'm ok", "im ok", "i am ok", "i'm okay", "all good")
+
+# Emoji that read as neutral/positive acknowledgement. Anything else
+# (😢 😭 💔 🔪 ...) falls through to the LLM.
+_SAFE_EMOJI = set("🙂😊😀😃😄😁👍👌🙏❤♥💙💚💛🧡💜✨🤗😌🆗✅")
+_IGNORABLE = {"\ufe0f", "\u200d", " ", *(chr(c) for c in range(0x1F3FB, 0x1F400))}  # VS16, ZWJ, skin tones
+
+
+@dataclass
+class PreClassification:
+    safety: SafetyResult
+    state: dict
+    confidence: float
+    label: str
+
+
+def _result(label: str, confidence: float) -> PreClassification:
+    return PreClassification(
+        safety=SafetyResult(
+            severity="safe",
+            distress_score=0,
+            risk=RiskFlags(),
+            reason=f"Local pre-classifier: trivial message ({label})",
+        ),
+        state={
+            "intent": "other",
+            "arousal": "low",
+            "plan_request": False,
+            "needs_help": False,
+        },
+        confidence=confidence,
+        label=label,
+    )
+
+
+def preclassify(user_text: str) -> Optional[PreClassification]:
+    text = normalize_message(user_text)
+    if not text or len(text) > 40:
+        return None
+
+    hit = _TRIVIAL.get(text)
+    if hit is not None:
+        return _result(*hit)
+
+    chars = [ch for ch in unicodedata.normalize("NFC", text) if ch not in _IGNORABLE]
+    if chars and all(ch in _SAFE_EMOJI for ch in chars):
+        return _result("emoji", 0.9)
+
+    return None
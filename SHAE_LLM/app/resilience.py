@@ -0,0 +1,177 @@
+"""
+Transport resilience for the LLM backends: per-request deadline, bounded
+jittered retries and a circuit breaker per inference endpoint.
+
+- deadline:  /chat sets one with deadline_scope(CHAT_DEADLINE_SECONDS);
+             every LLM call in that request (including the JSON repair
+             retries and tasks it spawns) gets at most the time left
+- retries:   connection errors, timeouts, 429 and 5xx are retried up to
+             LLM_MAX_RETRIES times with full-jitter exponential backoff
+- breaker:   after BREAKER_FAILURE_THRESHOLD consecutive failures an
+             endpoint is "open" and calls fail fast for
+             BREAKER_RESET_SECONDS; then one probe call is let through.
+             A 4xx is an answer (the request was at fault), and a
+             timeout cut short by the request deadline is no verdict
+
+Everything that means "the model is not usable right now" surfaces as
+LLMUnavailableError, which /chat turns into the degraded reply.
+"""
+from __future__ import annotations
+import contextvars
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import openai
+
+from .config import (
+    LLM_RETRY_BASE_MS,
+    LLM_RETRY_MAX_MS,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_SECONDS,
+)
+
+
+class LLMUnavailableError(RuntimeError):
+    """The LLM call cannot complete: breaker open, deadline spent or retries exhausted."""
+
+
+# Errors worth another attempt (and that count against the endpoint)
+TRANSIENT_ERRORS = (
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+# ---------------------------
+# Deadline
+# ---------------------------
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_deadline", default=None)
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[None]:
+    """Bound every LLM call made inside the block (and tasks it starts) to `seconds` in total."""
+    if seconds <= 0:
+        yield
+        return
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def current_deadline() -> Optional[float]:
+    return _deadline.get()
+
+def set_deadline(deadline: Optional[float]) -> None:
+    _deadline.set(deadline)
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None if there is none."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff, in seconds, before retry number `attempt` (0-based)."""
+    cap = min(LLM_RETRY_MAX_MS, LLM_RETRY_BASE_MS * (2 ** attempt))
+    return random.uniform(0, cap) / 1000
+
+# ---------------------------
+# Circuit breaker
+# ---------------------------
+
+class CircuitBreaker:
+    """
+    closed -> open after `threshold` consecutive failures; open -> half-open
+    after `reset_seconds`, letting a single probe through; the probe's
+    outcome closes or re-opens it. Thread-safe (the sync backend runs in
+    threadpool workers).
+    """
+
+    def __init__(self, name: str, threshold: int, reset_seconds: float):
+        self.name = name
+        self.threshold = max(1, threshold)
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self.stats = {"failures": 0, "successes": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected (open, or half-open with the probe out)."""
+        with self._lock:
+            state = self._state()
+            return state == "open" or (state == "half_open" and self._probing)
+
+    def allow(self) -> None:
+        """Raise LLMUnavailableError if a call may not go out now."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return
+            self.stats["rejected"] += 1
+        raise LLMUnavailableError(f"circuit open for {self.name}")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.stats["successes"] += 1
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release_probe(self) -> None:
+        """The call ended without an outcome (cancelled): let the next caller probe."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.stats["failures"] += 1
+            self._failures += 1
+            was_probe, self._probing = self._probing, False
+            if was_probe or (self._opened_at is None and self._failures >= self.threshold):
+                self.stats["opened"] += 1
+                self._opened_at = time.monotonic()
+                print(f"[LLM] circuit open for {self.name} after {self._failures} failures")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "state": self._state(), "consecutive_failures": self._failures}
+
+
+_breakers_lock = threading.Lock()
+_breakers = {}  # base_url -> CircuitBreaker (shared by the sync and async clients)
+
+def get_breaker(base_url: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(base_url)
+        if breaker is None:
+            breaker = CircuitBreaker(base_url, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+            _breakers[base_url] = breaker
+        return breaker
+
+def breaker_stats() -> dict:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.snapshot() for b in breakers}
@@ -1,30 +1,86 @@
+from typing import Optional
+
 from pydantic import ValidationError
 
-from .llm_backend import ChatMsg, get_backend
+from .llm_backend import ChatMsg, get_backend, get_async_backend
 from .schemas import SafetyResult
 from .prompts import SAFETY_SYSTEM
 from .json_utils import parse_model, build_fix_prompt
+from .generation import get_profile
+from .batcher import classifier_chat
+from . import classifier_cache
+from .metrics import FALLBACKS, JSON_REPAIRS
 
-_backend = get_backend()
+def _safety_fallback() -> SafetyResult:
+    # If still failing, default conservative
+    return SafetyResult(
+        severity="distressed",
+        distress_score=6,
+        risk={"self_harm": False, "suicide": False, "harm_others": False, "abuse": False},
+        reason="Parser failed; defaulting to distressed for safety."
+    )
 
-def run_safety(user_message: str, retries: int = 2) -> SafetyResult:
+def _classify(user_message: str, retries: int) -> Optional[SafetyResult]:
     msgs = [
         ChatMsg("system", SAFETY_SYSTEM),
         ChatMsg("user", user_message),
     ]
-    text = _backend.chat(msgs)
+    backend = get_backend("safety")
+    text = backend.chat(msgs, schema=SafetyResult, profile=get_profile("safety"))
 
-    for _ in range(retries + 1):
+    for attempt in range(retries + 1):
         try:
             return parse_model(text, SafetyResult)
         except (ValidationError, ValueError) as e:
+            if attempt == retries:
+                break
+            JSON_REPAIRS.inc(role="safety")
             fix = build_fix_prompt(text, str(e))
-            text = _backend.chat([ChatMsg("system", SAFETY_SYSTEM), ChatMsg("user", fix)])
+            text = backend.chat([ChatMsg("system", SAFETY_SYSTEM), ChatMsg("user", fix)], schema=SafetyResult, profile=get_profile("safety"))
 
-    # If still failing, default conservative
-    return SafetyResult(
-        severity="distressed",
-        distress_score=6,
-        risk={"self_harm": False, "suicide": False, "harm_others": False, "abuse": False},
-        reason="Parser failed; defaulting to distressed for safety."
-    )
+    return None
+
+async def _classify_async(user_message: str, retries: int) -> Optional[SafetyResult]:
+    msgs = [
+        ChatMsg("system", SAFETY_SYSTEM),
+        ChatMsg("user", user_message),
+    ]
+    text = await classifier_chat("safety", msgs, schema=SafetyResult, profile=get_profile("safety"))
+
+    for attempt in range(retries + 1):
+        try:
+            return parse_model(text, SafetyResult)
+        except (ValidationError, ValueError) as e:
+            if attempt == retries:
+                break
+            JSON_REPAIRS.inc(role="safety")
+            fix = build_fix_prompt(text, str(e))
+            text = await classifier_chat("safety", [ChatMsg("system", SAFETY_SYSTEM), ChatMsg("user", fix)], schema=SafetyResult, profile=get_profile("safety"))
+
+    return None
+
+def run_safety(user_message: str, retries: int = 2) -> SafetyResult:
+    key = classifier_cache.safety_key(user_message, get_backend("safety").model)
+    cached = classifier_cache.get_safety(key)
+    if cached is not None:
+        return cached
+
+    result = _classify(user_message, retries)
+    if result is None:
+        FALLBACKS.inc(role="safety")
+        return _safety_fallback()
+    classifier_cache.put_safety(key, result)
+    return result
+
+async def run_safety_async(user_message: str, retries: int = 2) -> SafetyResult:
+    key = classifier_cache.safety_key(user_message, get_async_backend("safety").model)
+    cached = classifier_cache.get_safety(key)
+    if cached is not None:
+        return cached
+
+    result = await _classify_async(user_message, retries)
+    if result is None:
+        FALLBACKS.inc(role="safety")
+        return _safety_fallback()
+    classifier_cache.put_safety(key, result)
+    return result
@@ -17,6 +17,23 @@ class SafetyResult(BaseModel):
     reason: str
 
 
+class StateResult(BaseModel):
+    """State classifier output (STATE_PROMPT); also the structured-output schema."""
+    intent: Literal[
+        "greeting", "smalltalk", "practical", "venting", "help_request", "plan_request", "other"
+    ] = "other"
+    arousal: Literal["low", "medium", "high"] = "low"
+    plan_request: bool = False
+    needs_help: bool = False
+
+
+class TriageResult(StateResult, SafetyResult):
+    """Fused safety + state classifier output (CLASSIFIER_MODE=fused)."""
+
+    def safety(self) -> SafetyResult:
+        return SafetyResult.model_validate(self.model_dump(include=set(SafetyResult.model_fields)))
+
+
 class OrchestrationResult(BaseModel):
     distress_score: int = Field(ge=0, le=10)
     mode: Literal["listen", "reflect", "act"]
@@ -0,0 +1,201 @@
+"""
+In-process LRU cache of hot session windows, write-through to the session
+store (app/session_store.py, SESSION_STORE).
+
+Holds, per session: the last `keep_last` turns, the summary, the turn count
+and the summary watermark. Reads for a cached session never touch the
+store; every write goes to the store first and then updates the cached
+entry.
+
+Entries are evicted when the cache is over SESSION_CACHE_SIZE (least
+recently used first) or when a session has been idle for
+SESSION_CACHE_TTL_SECONDS. SESSION_CACHE_SIZE=0 (the default) disables
+the cache.
+
+The cache only sees writes made by this process, so it is for a single
+worker: with several workers serving the same session, a cached window
+misses the turns the others wrote. Leave it off there.
+"""
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import List, Tuple
+
+from .memory_sqlite import SessionContext
+from .session_store import SessionStore, get_store
+from .config import SESSION_CACHE_SIZE, SESSION_CACHE_TTL_SECONDS
+
+
+class _Entry:
+    __slots__ = ("summary", "turns", "total", "watermark", "touched")
+
+    def __init__(self, ctx: SessionContext, keep_last: int):
+        self.summary = ctx.summary
+        self.turns = deque(ctx.turns, maxlen=keep_last)
+        self.total = ctx.total
+        self.watermark = ctx.watermark
+        self.touched = time.monotonic()
+
+
+class SessionCache:
+    def __init__(self, max_sessions: int, ttl_seconds: float, store: SessionStore):
+        self.max_sessions = max(0, max_sessions)
+        self.ttl = ttl_seconds
+        self._store = store
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Sessions with a store load in flight, and those written to meanwhile
+        # (their loaded snapshot may be stale and must not be cached).
+        self._loading = {}
+        self._raced = set()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_sessions > 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "size": len(self._entries),
+                "max_size": self.max_sessions,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
+
+    # -------- reads --------
+
+    def load_session_context(self, session_id: str, keep_last: int) -> SessionContext:
+        if not self.enabled:
+            return self._store.load_session_context(session_id, keep_last)
+
+        now = time.monotonic()
+        with self._lock:
+            e = self._entries.get(session_id)
+            if e is not None and now - e.touched > self.ttl:
+                del self._entries[session_id]
+                self.stats["expirations"] += 1
+                e = None
+            if e is not None and e.turns.maxlen >= keep_last:
+                e.touched = now
+                self._entries.move_to_end(session_id)
+                self.stats["hits"] += 1
+                return SessionContext(
+                    summary=e.summary,
+                    turns=list(e.turns)[-keep_last:] if keep_last else [],
+                    total=e.total,
+                    watermark=e.watermark,
+                )
+            self.stats["misses"] += 1
+            self._loading[session_id] = self._loading.get(session_id, 0) + 1
+
+        ctx = None
+        try:
+            ctx = self._store.load_session_context(session_id, keep_last)
+            return ctx
+        finally:
+            with self._lock:
+                n = self._loading[session_id] - 1
+                if n:
+                    self._loading[session_id] = n
+                else:
+                    del self._loading[session_id]
+                stale = session_id in self._raced
+                if not n:
+                    self._raced.discard(session_id)
+                if ctx is not None and not stale:
+                    self._entries[session_id] = _Entry(ctx, keep_last)
+                    self._entries.move_to_end(session_id)
+                    self._evict(now)
+
+    def get_summary(self, session_id: str) -> str:
+        if self.enabled:
+            with self._lock:
+                e = self._entries.get(session_id)
+                if e is not None and time.monotonic() - e.touched <= self.ttl:
+                    self.stats["hits"] += 1
+                    return e.summary
+                self.stats["misses"] += 1
+        return self._store.get_summary(session_id)
+
+    def get_last_turns(self, session_id: str, limit: int) -> List[Tuple[str, str]]:
+        return self.load_session_context(session_id, limit).turns
+
+    # -------- writes (store first, then the cached entry) --------
+
+    def append_turns(self, session_id: str, turns: List[Tuple[str, str]]) -> None:
+        self._store.append_turns(session_id, turns)
+        if not session_id:
+            session_id = "default"
+        with self._lock:
+            self._note_write(session_id)
+            e = self._entries.get(session_id)
+            if e is not None:
+                e.turns.extend(turns)
+                e.total += len(turns)
+
+    def advance_summary(self, session_id: str, summary: str, from_id: int, to_id: int) -> bool:
+        ok = self._store.advance_summary(session_id, summary, from_id, to_id)
+        with self._lock:
+            self._note_write(session_id)
+            e = self._entries.get(session_id)
+            if e is not None:
+                if ok:
+                    e.summary = (summary or "").strip()
+                    e.watermark = to_id
+                else:
+                    # someone else moved the watermark; reload on next read
+                    del self._entries[session_id]
+        return ok
+
+    def clear_session(self, session_id: str) -> None:
+        self._store.clear_session(session_id)
+        self.invalidate(session_id)
+
+    def invalidate(self, session_id: str) -> None:
+        with self._lock:
+            self._note_write(session_id)
+            self._entries.pop(session_id, None)
+
+    def _note_write(self, session_id: str) -> None:
+        # caller holds self._lock
+        if session_id in self._loading:
+            self._raced.add(session_id)
+
+    def _evict(self, now: float) -> None:
+        # caller holds self._lock; entries are in least-recently-used order
+        while self._entries:
+            sid, e = next(iter(self._entries.items()))
+            if now - e.touched > self.ttl:
+                self.stats["expirations"] += 1
+            elif len(self._entries) > self.max_sessions:
+                self.stats["evictions"] += 1
+            else:
+                break
+            del self._entries[sid]
+
+
+_cache = SessionCache(SESSION_CACHE_SIZE, SESSION_CACHE_TTL_SECONDS, get_store())
+
+def get_session_cache() -> SessionCache:
+    return _cache
+
+def load_session_context(session_id: str, keep_last: int) -> SessionContext:
+    return _cache.load_session_context(session_id, keep_last)
+
+def get_summary(session_id: str) -> str:
+    return _cache.get_summary(session_id)
+
+def get_last_turns(session_id: str, limit: int) -> List[Tuple[str, str]]:
+    return _cache.get_last_turns(session_id, limit)
+
+def append_turns(session_id: str, turns: List[Tuple[str, str]]) -> None:
+    _cache.append_turns(session_id, turns)
+
+def advance_summary(session_id: str, summary: str, from_id: int, to_id: int) -> bool:
+    return _cache.advance_summary(session_id, summary, from_id, to_id)
+
+def clear_session(session_id: str) -> None:
+    _cache.clear_session(session_id)
@@ -0,0 +1,220 @@
+"""
+Session memory engines, selected with SESSION_STORE.
+
+SessionStore is everything the app needs from session memory: the
+per-request context load, appending turns, the rolling summary and its
+watermark (for the background summary job) and clearing a session.
+
+- sqlite:  one SQLite file (SHAE_DB_PATH) through app/memory_sqlite.py
+- sharded: SESSION_STORE_SHARDS SQLite files next to SHAE_DB_PATH
+           (shae_memory.0.db, shae_memory.1.db, ...). A session always
+           lives in shard hash(session_id) % N, so concurrent writers
+           (several uvicorn workers) spread over N write locks instead of
+           queueing on one. Changing N moves sessions: migrate or start
+           empty.
+- memory:  dicts in this process, nothing persisted and nothing shared
+           between workers; for tests and benchmarks.
+
+app/session_cache.py sits in front of whichever engine is selected.
+Turn ids (the summary watermark) only need to grow within a session.
+"""
+from __future__ import annotations
+import hashlib
+import os
+import threading
+from typing import Dict, List, Optional, Protocol, Tuple
+
+from . import memory_sqlite
+from .memory_sqlite import SessionContext
+from .config import SESSION_STORE, SESSION_STORE_SHARDS
+
+
+class SessionStore(Protocol):
+    name: str
+
+    def init(self) -> None: ...
+    def load_session_context(self, session_id: str, keep_last: int) -> SessionContext: ...
+    def append_turns(self, session_id: str, turns: List[Tuple[str, str]]) -> None: ...
+    def get_summary(self, session_id: str) -> str: ...
+    def set_summary(self, session_id: str, summary: str) -> None: ...
+    def get_summary_watermark(self, session_id: str) -> int: ...
+    def advance_summary(self, session_id: str, summary: str, from_id: int, to_id: int) -> bool: ...
+    def count_turns_after(self, session_id: str, after_id: int) -> int: ...
+    def get_turns_after_excluding_last(self, session_id: str, after_id: int, keep_last: int) -> List[Tuple[int, str, str]]: ...
+    def clear_session(self, session_id: str) -> None: ...
+
+
+class SQLiteSessionStore:
+    """One SQLite file; db_path=None follows memory_sqlite.DB_PATH."""
+
+    name = "sqlite"
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path
+
+    def init(self) -> None:
+        memory_sqlite.init_db(self.db_path)
+
+    def load_session_context(self, session_id: str, keep_last: int) -> SessionContext:
+        return memory_sqlite.load_session_context(session_id, keep_last, db_path=self.db_path)
+
+    def append_turns(self, session_id: str, turns: List[Tuple[str, str]]) -> None:
+        memory_sqlite.append_turns(session_id, turns, db_path=self.db_path)
+
+    def get_summary(self, session_id: str) -> str:
+        return memory_sqlite.get_summary(session_id, db_path=self.db_path)
+
+    def set_summary(self, session_id: str, summary: str) -> None:
+        memory_sqlite.set_summary(session_id, summary, db_path=self.db_path)
+
+    def get_summary_watermark(self, session_id: str) -> int:
+        return memory_sqlite.get_summary_watermark(session_id, db_path=self.db_path)
+
+    def advance_summary(self, session_id: str, summary: str, from_id: int, to_id: int) -> bool:
+        return memory_sqlite.advance_summary(session_id, summary, from_id, to_id, db_path=self.db_path)
+
+    def count_turns_after(self, session_id: str, after_id: int) -> int:
+        return memory_sqlite.count_turns_after(session_id, after_id, db_path=self.db_path)
+
+    def get_turns_after_excluding_last(self, session_id: str, after_id: int, keep_last: int) -> List[Tuple[int, str, str]]:
+        return memory_sqlite.get_turns_after_excluding_last(session_id, after_id, keep_last, db_path=self.db_path)
+
+    def clear_session(self, session_id: str) -> None:
+        memory_sqlite.clear_session(session_id, db_path=self.db_path)
+
+
+class ShardedSQLiteSessionStore:
+    name = "sharded"
+
+    def __init__(self, db_path: str, shards: int):
+        root, ext = os.path.splitext(db_path)
+        self.shards = [SQLiteSessionStore(f"{root}.{i}{ext or '.db'}") for i in range(max(1, shards))]
+
+    def shard_for(self, session_id: str) -> SQLiteSessionStore:
+        # memory_sqlite stores an empty session id as "default"
+        key = (session_id or "default").encode("utf-8")
+        digest = hashlib.blake2b(key, digest_size=8).digest()
+        return self.shards[int.from_bytes(digest, "big") % len(self.shards)]
+
+    def init(self) -> None:
+        for shard in self.shards:
+            shard.init()
+
+    def load_session_context(self, session_id: str, keep_last: int) -> SessionContext:
+        return self.shard_for(session_id).load_session_context(session_id, keep_last)
+
+    def append_turns(self, session_id: str, turns: List[Tuple[str, str]]) -> None:
+        self.shard_for(session_id).append_turns(session_id, turns)
+
+    def get_summary(self, session_id: str) -> str:
+        return self.shard_for(session_id).get_summary(session_id)
+
+    def set_summary(self, session_id: str, summary: str) -> None:
+        self.shard_for(session_id).set_summary(session_id, summary)
+
+    def get_summary_watermark(self, session_id: str) -> int:
+        return self.shard_for(session_id).get_summary_watermark(session_id)
+
+    def advance_summary(self, session_id: str, summary: str, from_id: int, to_id: int) -> bool:
+        return self.shard_for(session_id).advance_summary(session_id, summary, from_id, to_id)
+
+    def count_turns_after(self, session_id: str, after_id: int) -> int:
+        return self.shard_for(session_id).count_turns_after(session_id, after_id)
+
+    def get_turns_after_excluding_last(self, session_id: str, after_id: int, keep_last: int) -> List[Tuple[int, str, str]]:
+        return self.shard_for(session_id).get_turns_after_excluding_last(session_id, after_id, keep_last)
+
+    def clear_session(self, session_id: str) -> None:
+        self.shard_for(session_id).clear_session(session_id)
+
+
+class InMemorySessionStore:
+    """Same semantics as the SQLite engine (ids, watermark compare-and-set), held in dicts."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._turns: Dict[str, List[Tuple[int, str, str]]] = {}  # session_id -> [(id, role, text)]
+        self._state: Dict[str, List] = {}                        # session_id -> [summary, watermark]
+        self._next_id = 1
+
+    def init(self) -> None:
+        pass
+
+    def load_session_context(self, session_id: str, keep_last: int) -> SessionContext:
+        with self._lock:
+            turns = self._turns.get(session_id, [])
+            summary, watermark = self._state.get(session_id, ("", 0))
+            return SessionContext(
+                summary=summary,
+                turns=[(role, text) for _, role, text in turns[-keep_last:]] if keep_last else [],
+                total=len(turns),
+                watermark=watermark,
+            )
+
+    def append_turns(self, session_id: str, turns: List[Tuple[str, str]]) -> None:
+        session_id = session_id or "default"
+        with self._lock:
+            stored = self._turns.setdefault(session_id, [])
+            for role, text in turns:
+                stored.append((self._next_id, role, text))
+                self._next_id += 1
+
+    def get_summary(self, session_id: str) -> str:
+        with self._lock:
+            return self._state.get(session_id, ("", 0))[0]
+
+    def set_summary(self, session_id: str, summary: str) -> None:
+        with self._lock:
+            self._state.setdefault(session_id, ["", 0])[0] = (summary or "").strip()
+
+    def get_summary_watermark(self, session_id: str) -> int:
+        with self._lock:
+            return self._state.get(session_id, ("", 0))[1]
+
+    def advance_summary(self, session_id: str, summary: str, from_id: int, to_id: int) -> bool:
+        with self._lock:
+            state = self._state.get(session_id)
+            if (state[1] if state else 0) != from_id:
+                return False
+            self._state[session_id] = [(summary or "").strip(), to_id]
+            return True
+
+    def count_turns_after(self, session_id: str, after_id: int) -> int:
+        with self._lock:
+            return sum(1 for tid, _, _ in self._turns.get(session_id, []) if tid > after_id)
+
+    def get_turns_after_excluding_last(self, session_id: str, after_id: int, keep_last: int) -> List[Tuple[int, str, str]]:
+        with self._lock:
+            turns = self._turns.get(session_id, [])
+            older = turns[:-keep_last] if keep_last else list(turns)
+            return [t for t in older if t[0] > after_id]
+
+    def clear_session(self, session_id: str) -> None:
+        with self._lock:
+            self._turns.pop(session_id, None)
+            self._state.pop(session_id, None)
+
+
+def create_store(kind: str) -> SessionStore:
+    if kind == "sqlite":
+        return SQLiteSessionStore()
+    if kind == "sharded":
+        return ShardedSQLiteSessionStore(memory_sqlite.DB_PATH, SESSION_STORE_SHARDS)
+    if kind == "memory":
+        return InMemorySessionStore()
+    raise RuntimeError(f"Unknown SESSION_STORE: {kind}. Use 'sqlite', 'sharded' or 'memory'")
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+def get_store() -> SessionStore:
+    """The SESSION_STORE engine, created on first use (opening no files)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_store(SESSION_STORE)
+    return _store
@@ -0,0 +1,95 @@
+"""
+Background runner for rolling session summaries.
+
+Requests call schedule(session_id) after persisting a turn and return
+immediately; the summary LLM call happens here, off the request path.
+
+- Debounce: a session scheduled several times within `debounce_seconds`
+  runs once, `debounce_seconds` after the first schedule.
+- Single-flight: at most one job per session runs at a time. A schedule that
+  arrives while the job is running queues exactly one follow-up run.
+"""
+from __future__ import annotations
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Set
+
+
+class SummaryWorker:
+    def __init__(self, job: Callable[[str], None], debounce_seconds: float = 2.0, max_workers: int = 1):
+        self._job = job
+        self._debounce = max(0.0, debounce_seconds)
+        self._max_workers = max(1, max_workers)
+
+        self._cv = threading.Condition()
+        self._due: Dict[str, float] = {}   # session_id -> monotonic time to run
+        self._running: Set[str] = set()
+        self._thread = None
+        self._pool = None
+        self._stopping = False
+
+        self.stats = {"scheduled": 0, "coalesced": 0, "runs": 0, "failures": 0}
+
+    def schedule(self, session_id: str) -> None:
+        with self._cv:
+            self.stats["scheduled"] += 1
+            if session_id in self._due:
+                self.stats["coalesced"] += 1
+                return
+            self._due[session_id] = time.monotonic() + self._debounce
+            self._ensure_started()
+            self._cv.notify()
+
+    def pending(self) -> int:
+        with self._cv:
+            return len(self._due) + len(self._running)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._cv:
+            self._stopping = True
+            self._cv.notify()
+            thread, pool = self._thread, self._pool
+        if thread is not None:
+            thread.join(timeout)
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _ensure_started(self) -> None:
+        # caller holds self._cv
+        if self._thread is None:
+            self._stopping = False
+            self._pool = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="shae-summary")
+            self._thread = threading.Thread(target=self._loop, name="shae-summary-scheduler", daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        with self._cv:
+            while not self._stopping:
+                now = time.monotonic()
+                ready = [sid for sid, due in self._due.items() if due <= now and sid not in self._running]
+                for sid in ready:
+                    del self._due[sid]
+                    self._running.add(sid)
+                    self._pool.submit(self._run_one, sid)
+
+                waiting = [due for sid, due in self._due.items() if sid not in self._running]
+                timeout = max(0.0, min(waiting) - now) if waiting else None
+                self._cv.wait(timeout)
+            self._thread = None
+
+    def _run_one(self, session_id: str) -> None:
+        try:
+            self._job(session_id)
+            with self._cv:
+                self.stats["runs"] += 1
+        except Exception as e:
+            with self._cv:
+                self.stats["failures"] += 1
+            print(f"[SUMMARY] Summary update failed for session {session_id}: {e!r}")
+            traceback.print_exc()
+        finally:
+            with self._cv:
+                self._running.discard(session_id)
+                self._cv.notify()
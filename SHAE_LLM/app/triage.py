@@ -0,0 +1,92 @@
+"""
+Fused safety + state classifier (CLASSIFIER_MODE=fused).
+
+One structured completion returns the SafetyResult fields and the state
+dict together, instead of a SAFETY_SYSTEM call followed by a STATE_PROMPT
+call. Output is validated as TriageResult with the same fix-prompt retry
+loop as the safety check; if it still fails we fall back to the same
+conservative defaults as the separate classifiers.
+"""
+from typing import List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from .llm_backend import ChatMsg, get_backend, get_async_backend
+from .schemas import SafetyResult, TriageResult
+from .prompts import TRIAGE_PROMPT
+from .json_utils import parse_model, build_fix_prompt
+from .safety import _safety_fallback
+from .agents import _classifier_context, _classifier_messages, normalize_state, state_fallback
+from .generation import get_profile
+from .batcher import classifier_chat
+from . import classifier_cache
+from .metrics import FALLBACKS, JSON_REPAIRS
+
+
+def _triage_cache_key(user_text: str, recent_turns: List[str], model: str) -> str:
+    return classifier_cache.triage_key(user_text, model, _classifier_context("triage", recent_turns))
+
+
+def _split_result(result: TriageResult, user_text: str) -> Tuple[SafetyResult, dict]:
+    return result.safety(), normalize_state(result.model_dump(), user_text)
+
+
+def _classify(user_text: str, recent_turns: List[str], retries: int) -> Optional[TriageResult]:
+    backend = get_backend("triage")
+    text = backend.chat(_classifier_messages("triage", TRIAGE_PROMPT, user_text, recent_turns), schema=TriageResult, profile=get_profile("triage"))
+
+    for attempt in range(retries + 1):
+        try:
+            return parse_model(text, TriageResult)
+        except (ValidationError, ValueError) as e:
+            if attempt == retries:
+                break
+            JSON_REPAIRS.inc(role="triage")
+            fix = build_fix_prompt(text, str(e))
+            text = backend.chat([ChatMsg("system", TRIAGE_PROMPT), ChatMsg("user", fix)], schema=TriageResult, profile=get_profile("triage"))
+
+    return None
+
+
+async def _classify_async(user_text: str, recent_turns: List[str], retries: int) -> Optional[TriageResult]:
+    text = await classifier_chat("triage", _classifier_messages("triage", TRIAGE_PROMPT, user_text, recent_turns), schema=TriageResult, profile=get_profile("triage"))
+
+    for attempt in range(retries + 1):
+        try:
+            return parse_model(text, TriageResult)
+        except (ValidationError, ValueError) as e:
+            if attempt == retries:
+                break
+            JSON_REPAIRS.inc(role="triage")
+            fix = build_fix_prompt(text, str(e))
+            text = await classifier_chat("triage", [ChatMsg("system", TRIAGE_PROMPT), ChatMsg("user", fix)], schema=TriageResult, profile=get_profile("triage"))
+
+    return None
+
+
+def run_triage(user_text: str, recent_turns: List[str], retries: int = 2) -> Tuple[SafetyResult, dict]:
+    key = _triage_cache_key(user_text, recent_turns, get_backend("triage").model)
+    cached = classifier_cache.get_triage(key)
+    if cached is not None:
+        return _split_result(TriageResult.model_validate(cached), user_text)
+
+    result = _classify(user_text, recent_turns, retries)
+    if result is None:
+        FALLBACKS.inc(role="triage")
+        return _safety_fallback(), state_fallback(user_text)
+    classifier_cache.put_triage(key, result.model_dump())
+    return _split_result(result, user_text)
+
+
+async def run_triage_async(user_text: str, recent_turns: List[str], retries: int = 2) -> Tuple[SafetyResult, dict]:
+    key = _triage_cache_key(user_text, recent_turns, get_async_backend("triage").model)
+    cached = classifier_cache.get_triage(key)
+    if cached is not None:
+        return _split_result(TriageResult.model_validate(cached), user_text)
+
+    result = await _classify_async(user_text, recent_turns, retries)
+    if result is None:
+        FALLBACKS.inc(role="triage")
+        return _safety_fallback(), state_fallback(user_text)
+    classifier_cache.put_triage(key, result.model_dump())
+    return _split_result(result, user_text)
@@ -0,0 +1,176 @@
+"""
+Benchmark: admission control and per-session ordering for POST /chat.
+
+Two scenarios against bench/stub_llm.py (--max-parallel slots, like a
+single Ollama box):
+
+- burst:    --burst one-turn sessions arrive at once, run with
+            MAX_CONCURRENT_TURNS=0 (no limit) and with --max-concurrent /
+            --queue. Reports accepted vs 429 turns and latency of the
+            accepted ones; without a limit everything queues inside the
+            HTTP client and latency grows with the burst.
+- ordering: --same-session turns for ONE session fired 5 ms apart. Reports
+            whether the stored user turns are in send order.
+- disconnect: --disconnects /chat/stream requests whose client is gone
+            before the response body starts. Reports whether admission
+            is back to idle (no slot or session lock left behind) and
+            whether the next /chat for those sessions is served.
+
+    cd SHAE_LLM
+    python -m bench.bench_admission --burst 300 --max-concurrent 16 --queue 32
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+from bench.harness import MESSAGES, app_env, http, percentile, run_child, stub_server
+
+
+async def _burst(client, n: int) -> dict:
+    latencies, rejected, retry_after = [], 0, []
+
+    async def one(i: int) -> None:
+        nonlocal rejected
+        t0 = time.perf_counter()
+        r = await client.post("/chat", json={"session_id": f"b{i}", "message": f"{MESSAGES[i % len(MESSAGES)]} ({i})"})
+        if r.status_code == 429:
+            rejected += 1
+            retry_after.append(int(r.headers["Retry-After"]))
+            return
+        r.raise_for_status()
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    wall = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "accepted": len(latencies),
+        "rejected_429": rejected,
+        "retry_after_s_max": max(retry_after, default=None),
+        "latency_ms_p50": percentile(latencies, 50),
+        "latency_ms_p99": percentile(latencies, 99),
+        "latency_ms_max": round(latencies[-1], 1) if latencies else None,
+        "wall_s": round(wall, 2),
+    }
+
+
+async def _ordering(client, n: int) -> dict:
+    from app.memory_sqlite import get_last_turns
+
+    async def one(i: int) -> None:
+        await asyncio.sleep(i * 0.005)
+        r = await client.post("/chat", json={"session_id": "ordered", "message": f"{MESSAGES[i % len(MESSAGES)]} #{i}"})
+        r.raise_for_status()
+
+    await asyncio.gather(*(one(i) for i in range(n)))
+    users = [text for role, text in get_last_turns("ordered", 4 * n) if role == "user"]
+    sent = [int(text.rsplit("#", 1)[1]) for text in users]
+    return {"turns": n, "stored_in_send_order": sent == sorted(sent), "stored_order": sent}
+
+
+async def _disconnect_before_body(app, session_id: str) -> None:
+    """POST /chat/stream straight through ASGI; the client hangs up while the headers are sent."""
+    body = json.dumps({"session_id": session_id, "message": MESSAGES[0]}).encode()
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            await asyncio.sleep(0.05)  # disconnect is noticed here, before the body iterator runs
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/chat/stream", "raw_path": b"/chat/stream", "root_path": "",
+        "query_string": b"", "headers": [(b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 1), "server": ("app", 80),
+    }
+    await app(scope, receive, send)
+
+
+async def _disconnect(client, app, n: int) -> dict:
+    from app.admission import get_admission
+
+    for i in range(n):
+        await _disconnect_before_body(app, f"gone{i}")
+    snap = get_admission().snapshot()
+    served = 0
+    for i in range(n):
+        try:
+            r = await asyncio.wait_for(client.post("/chat", json={"session_id": f"gone{i}", "message": "hi"}), 30)
+            served += r.status_code == 200
+        except asyncio.TimeoutError:
+            pass
+    return {
+        "disconnects": n,
+        "inflight_after": snap["inflight"],
+        "active_sessions_after": snap["active_sessions"],
+        "next_turn_served": served,
+        "ok": snap["inflight"] == 0 and snap["active_sessions"] == 0 and served == n,
+    }
+
+
+async def _run(scenario: str, n: int) -> dict:
+    import httpx
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=600) as client:
+        if scenario == "burst":
+            return await _burst(client, n)
+        if scenario == "disconnect":
+            return await _disconnect(client, app, n)
+        return await _ordering(client, n)
+
+
+def child(scenario: str, n: int) -> None:
+    print(json.dumps(asyncio.run(_run(scenario, n))))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--burst", type=int, default=300)
+    ap.add_argument("--max-concurrent", type=int, default=16)
+    ap.add_argument("--queue", type=int, default=32)
+    ap.add_argument("--same-session", type=int, default=8)
+    ap.add_argument("--disconnects", type=int, default=4)
+    ap.add_argument("--max-parallel", type=int, default=8)
+    ap.add_argument("--port", type=int, default=9170)
+    ap.add_argument("--scenario", help=argparse.SUPPRESS)
+    ap.add_argument("-n", type=int, help=argparse.SUPPRESS)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args.scenario, args.n)
+        return
+
+    results = []
+    with stub_server(args.port, "--max-parallel", str(args.max_parallel)) as stub_url:
+        runs = [
+            ("burst", args.burst, {"MAX_CONCURRENT_TURNS": "0"}),
+            ("burst", args.burst, {"MAX_CONCURRENT_TURNS": str(args.max_concurrent),
+                                   "ADMISSION_QUEUE_SIZE": str(args.queue)}),
+            ("ordering", args.same_session, {"SESSION_MAX_QUEUED": str(args.same_session)}),
+            # 2 slots: leaked ones would starve the follow-up turns
+            ("disconnect", args.disconnects, {"MAX_CONCURRENT_TURNS": "2", "ADMISSION_QUEUE_TIMEOUT_S": "5"}),
+        ]
+        for scenario, n, overrides in runs:
+            http(f"{stub_url}/reset", {})
+            with tempfile.TemporaryDirectory() as tmp:
+                env = app_env(stub_url, tmp, **overrides)
+                out = run_child("bench.bench_admission", env, "--scenario", scenario, "-n", str(n))
+            results.append({"scenario": scenario, **overrides, **out})
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
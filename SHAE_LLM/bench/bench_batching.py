@@ -0,0 +1,104 @@
+"""
+Benchmark: classifier micro-batching at 50 / 200 / 1000 concurrent sessions.
+
+Starts bench/stub_llm.py with a bounded number of parallel slots (like
+OLLAMA_NUM_PARALLEL) and, for each session count, runs every session's
+turns concurrently through POST /chat in-process, once with batching off
+(CLASSIFIER_BATCH_WINDOW_MS=0) and once with it on. Reports throughput
+(turns/s), p50/p99 turn latency and LLM calls per turn.
+
+--shared-messages makes sessions send the same texts (no per-session
+suffix), which is where in-batch deduplication of safety calls shows.
+
+    cd SHAE_LLM
+    python -m bench.bench_batching --sessions 50 200 1000
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+from bench.harness import MESSAGES, app_env, http, percentile, run_child, stub_server
+
+
+async def _session(client, sid: int, turns: int, shared: bool, latencies: list) -> None:
+    for t in range(turns):
+        msg = MESSAGES[(sid + t) % len(MESSAGES)]
+        if not shared:
+            msg = f"{msg} (session {sid})"
+        t0 = time.perf_counter()
+        r = await client.post("/chat", json={"session_id": f"s{sid}", "message": msg})
+        latencies.append((time.perf_counter() - t0) * 1000)
+        r.raise_for_status()
+
+
+async def _run(sessions: int, turns: int, shared: bool) -> dict:
+    import httpx
+    from app.main import app
+    from app.batcher import get_batcher
+
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=600) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(_session(client, i, turns, shared, latencies) for i in range(sessions)))
+        wall = time.perf_counter() - t0
+    return {"latencies_ms": latencies, "wall_s": wall, "batcher": get_batcher().snapshot()}
+
+
+def child(sessions: int, turns: int, shared: bool) -> None:
+    print(json.dumps(asyncio.run(_run(sessions, turns, shared))))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, nargs="+", default=[50, 200, 1000])
+    ap.add_argument("--turns", type=int, default=2)
+    ap.add_argument("--window-ms", type=float, default=5.0)
+    ap.add_argument("--max-batch", type=int, default=32)
+    ap.add_argument("--max-parallel", type=int, default=16)
+    ap.add_argument("--shared-messages", action="store_true")
+    ap.add_argument("--port", type=int, default=9139)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args.sessions[0], args.turns, args.shared_messages)
+        return
+
+    results = []
+    with stub_server(args.port, "--max-parallel", str(args.max_parallel)) as stub_url:
+        for n in args.sessions:
+            for window in (0.0, args.window_ms):
+                http(f"{stub_url}/reset", {})
+                with tempfile.TemporaryDirectory() as tmp:
+                    env = app_env(stub_url, tmp, CLASSIFIER_BATCH_WINDOW_MS=str(window),
+                                  CLASSIFIER_BATCH_MAX=str(args.max_batch))
+                    child_args = ["--sessions", str(n), "--turns", str(args.turns)]
+                    if args.shared_messages:
+                        child_args.append("--shared-messages")
+                    out = run_child("bench.bench_batching", env, *child_args)
+                calls = http(f"{stub_url}/stats")["calls"]
+                latencies = sorted(out["latencies_ms"])
+                total_turns = n * args.turns
+                results.append({
+                    "sessions": n,
+                    "window_ms": window,
+                    "throughput_turns_per_s": round(total_turns / out["wall_s"], 1),
+                    "latency_ms_p50": percentile(latencies, 50),
+                    "latency_ms_p99": percentile(latencies, 99),
+                    "llm_calls_per_turn": round(sum(calls.values()) / total_turns, 2),
+                    "avg_batch": out["batcher"]["avg_batch"],
+                })
+
+    print(json.dumps(results, indent=2))
+    for r in results:
+        print(f"{r['sessions']:>5} sessions, window {r['window_ms']:>4} ms: {r['throughput_turns_per_s']:>7} turns/s, "
+              f"p50 {r['latency_ms_p50']:>7} ms, p99 {r['latency_ms_p99']:>7} ms, "
+              f"{r['llm_calls_per_turn']} calls/turn, avg batch {r['avg_batch']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: separate safety + state classifiers vs the fused triage call.
+
+Starts bench/stub_llm.py, then runs the same scripted conversation through
+POST /chat once per CLASSIFIER_MODE (each in a fresh child process so the
+mode is read from the environment at import). Reports, per turn:
+LLM calls, prompt / completion tokens (counted by the stub) and latency.
+The classifier cache and pre-classifier are disabled so every turn pays
+for its classification.
+
+    cd SHAE_LLM
+    python -m bench.bench_classifier_modes --turns 40
+"""
+from __future__ import annotations
+import argparse
+import json
+import tempfile
+import time
+
+from bench.harness import MESSAGES, app_env, http, percentile, run_child, stub_server
+
+
+def child(turns: int) -> None:
+    # Imported here: app config is read from the environment set by the parent
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    latencies = []
+    with TestClient(app) as client:  # one event loop for the shared async client
+        for i in range(turns):
+            msg = MESSAGES[i % len(MESSAGES)]
+            t0 = time.perf_counter()
+            r = client.post("/chat", json={"session_id": "bench", "message": msg})
+            latencies.append((time.perf_counter() - t0) * 1000)
+            r.raise_for_status()
+    print(json.dumps({"latencies_ms": latencies}))
+
+
+def run_mode(mode: str, stub_url: str, turns: int) -> dict:
+    http(f"{stub_url}/reset", {})
+    with tempfile.TemporaryDirectory() as tmp:
+        env = app_env(stub_url, tmp, CLASSIFIER_MODE=mode, SPECULATIVE_CLASSIFIERS="false")
+        latencies = sorted(run_child("bench.bench_classifier_modes", env, "--turns", str(turns))["latencies_ms"])
+    stats = http(f"{stub_url}/stats")
+
+    def per_turn(counter: dict) -> float:
+        return round(sum(counter.values()) / turns, 2)
+
+    return {
+        "mode": mode,
+        "llm_calls_per_turn": per_turn(stats["calls"]),
+        "prompt_tokens_per_turn": per_turn(stats["prompt_tokens"]),
+        "completion_tokens_per_turn": per_turn(stats["completion_tokens"]),
+        "calls_by_role": stats["calls"],
+        "latency_ms_p50": percentile(latencies, 50),
+        "latency_ms_p95": percentile(latencies, 95),
+        "latency_ms_mean": round(sum(latencies) / len(latencies), 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=40)
+    ap.add_argument("--port", type=int, default=9131)
+    ap.add_argument("--decode-ms-per-token", type=float, default=2.0)
+    ap.add_argument("--prefill-ms-per-token", type=float, default=0.05)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args.turns)
+        return
+
+    with stub_server(args.port, "--decode-ms-per-token", str(args.decode_ms_per_token),
+                     "--prefill-ms-per-token", str(args.prefill_ms_per_token)) as stub_url:
+        results = [run_mode(mode, stub_url, args.turns) for mode in ("separate", "fused")]
+
+    print(json.dumps(results, indent=2))
+    sep, fused = results
+    print(f"\nLLM calls/turn:      {sep['llm_calls_per_turn']} -> {fused['llm_calls_per_turn']}")
+    print(f"prompt tokens/turn:  {sep['prompt_tokens_per_turn']} -> {fused['prompt_tokens_per_turn']}")
+    print(f"latency p50 (ms):    {sep['latency_ms_p50']} -> {fused['latency_ms_p50']}")
+
+
+if __name__ == "__main__":
+    main()
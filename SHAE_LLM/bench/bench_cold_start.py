@@ -0,0 +1,116 @@
+"""
+Benchmark: cold start to the first successful POST /chat.
+
+Starts bench/stub_llm.py with --load-ms (the first request for a model
+pays a one-off load, like Ollama reading the weights), then for each
+configuration launches `uvicorn app.main:app` in a fresh process and
+measures, from process spawn:
+
+- health_s:     first 200 from GET /health
+- ready_s:      first 200 from GET /ready (null if the app has no /ready)
+- first_chat_s: the first /chat, sent as soon as the app reports ready
+                (or healthy), answered with 200
+- first_chat_ms: latency of that first /chat alone, what the first user
+                 feels
+
+Configurations: the default, and LLM_WARMUP=true (the model is loaded
+during startup, before /ready turns 200). The stub's models are unloaded
+between runs.
+
+    cd SHAE_LLM
+    python -m bench.bench_cold_start --load-ms 3000 --runs 3
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from bench.harness import MESSAGES, app_env, http, stub_server
+
+
+def _status(url: str, body: dict = None) -> int:
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=120) as r:
+            return r.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return 0
+
+
+def _wait(url: str, t0: float, timeout: float = 120.0):
+    """Seconds since t0 until `url` answers 200; None if it answers 404 (no such endpoint)."""
+    while time.perf_counter() - t0 < timeout:
+        status = _status(url)
+        if status == 200:
+            return time.perf_counter() - t0
+        if status == 404:
+            return None
+        time.sleep(0.02)
+    raise RuntimeError(f"{url} not ready after {timeout} s")
+
+
+def one_run(env: dict, port: int) -> dict:
+    url = f"http://127.0.0.1:{port}"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        health_s = _wait(f"{url}/health", t0)
+        ready_s = _wait(f"{url}/ready", t0)
+        sent = time.perf_counter()
+        status = _status(f"{url}/chat", {"session_id": "cold", "message": MESSAGES[0]})
+        done = time.perf_counter()
+        if status != 200:
+            raise RuntimeError(f"first /chat answered {status}")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return {
+        "health_s": round(health_s, 2),
+        "ready_s": round(ready_s, 2) if ready_s is not None else None,
+        "first_chat_s": round(done - t0, 2),
+        "first_chat_ms": round((done - sent) * 1000, 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--load-ms", type=float, default=3000)
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--port", type=int, default=9200)
+    ap.add_argument("--app-port", type=int, default=9201)
+    args = ap.parse_args()
+
+    results = []
+    with stub_server(args.port, "--load-ms", str(args.load_ms)) as stub_url:
+        for overrides in ({}, {"LLM_WARMUP": "true"}):
+            runs = []
+            for _ in range(args.runs):
+                http(f"{stub_url}/reset", {})
+                with tempfile.TemporaryDirectory() as tmp:
+                    env = app_env(stub_url, tmp, **overrides)
+                    env["PYTHONPATH"] = os.getcwd()
+                    runs.append(one_run(env, args.app_port))
+            row = {"config": overrides or "default", "runs": runs}
+            for key in ("health_s", "ready_s", "first_chat_s", "first_chat_ms"):
+                values = [r[key] for r in runs if r[key] is not None]
+                row[f"{key}_median"] = round(statistics.median(values), 2) if values else None
+            results.append(row)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Micro-benchmark: crisis keyword pre-check at 10k-phrase scale.
+
+Compares the old per-request scan (`any(k in msg.lower() for k in list)`)
+with the Aho-Corasick CrisisMatcher on the same synthetic phrase list and a
+mixed message corpus. Reports build time and microseconds per message.
+
+Also a recall parity check against the old scan on the built-in phrases:
+every phrase, with inflectional suffixes ("suicides", "suicide's",
+"suicidally"), inside a sentence. Any message the old scan flagged and
+the matcher misses is listed, and the run exits non-zero.
+
+    cd SHAE_LLM
+    python -m bench.bench_crisis_matcher --phrases 10000
+"""
+from __future__ import annotations
+import argparse
+import itertools
+import json
+import random
+import sys
+import time
+
+from app.crisis_matcher import DEFAULT_PHRASES, CrisisMatcher
+
+_SUBJECTS = ["i", "i really", "i just", "honestly i", "main", "mujhe", "i kinda", "sometimes i"]
+_VERBS = ["want to", "wanna", "need to", "am going to", "will", "plan to", "might", "chahta hoon", "chahti hoon", "feel like i should"]
+_OBJECTS = [
+    "end everything", "disappear forever", "stop existing", "not wake up", "jump off", "hurt myself badly",
+    "khatam kar doon", "mar jaun", "give up on life", "sleep forever", "vanish", "end the pain for good",
+    "take all the pills", "cut deeper", "never come back", "leave this world",
+]
+_MESSAGES = [
+    "I feel overwhelmed with work and my manager keeps pushing deadlines",
+    "ok", "thanks", "my mom keeps comparing me to my cousin and it hurts",
+    "can you give me a 21 day plan to sleep better?",
+    "I can't focus on anything today, everything feels heavy",
+    "honestly I just want to disappear forever",
+    "Main bahut pareshan hoon, ghar pe sab log chillate rehte hain",
+    "I want to kill myself",
+    "lol my exam went fine I guess",
+    "I keep thinking about what my friend said to me at the party last weekend and I can't stop replaying it " * 3,
+]
+
+
+_SUFFIXES = ["", "s", "'s", "ly", "al", "ed", "ing", "ally"]
+_PARITY_EXTRA = [
+    "there were two suicides in my town this year",
+    "my brother's suicide's anniversary is today",
+    "i've been feeling suicidally low all week",
+    "SUICIDAL thoughts again",
+]
+
+
+def _parity_messages():
+    msgs = list(_PARITY_EXTRA)
+    for phrase in DEFAULT_PHRASES:
+        for suffix in _SUFFIXES:
+            msgs.append(f"honestly {phrase}{suffix} lately")
+    return msgs
+
+
+def parity_misses(matcher: CrisisMatcher, phrases) -> list:
+    """Messages the old substring scan flags and the matcher does not."""
+    lowered = [p.lower() for p in phrases]
+    return [m for m in _parity_messages()
+            if any(k in m.lower() for k in lowered) and matcher.match(m) is None]
+
+
+def _phrases(n: int):
+    rng = random.Random(3)
+    combos = [" ".join(c) for c in itertools.product(_SUBJECTS, _VERBS, _OBJECTS)]
+    rng.shuffle(combos)
+    out = list(DEFAULT_PHRASES)
+    i = 0
+    while len(out) < n:
+        base = combos[i % len(combos)]
+        out.append(base if i < len(combos) else f"{base} {i}")
+        i += 1
+    return out[:n]
+
+
+def _bench(fn, msgs, rounds):
+    t0 = time.perf_counter()
+    hits = 0
+    for _ in range(rounds):
+        for m in msgs:
+            hits += 1 if fn(m) else 0
+    dt = time.perf_counter() - t0
+    return round(dt / (rounds * len(msgs)) * 1e6, 2), hits // rounds
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--phrases", type=int, default=10_000)
+    ap.add_argument("--rounds", type=int, default=20)
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+
+    phrases = _phrases(args.phrases)
+
+    def legacy(msg):
+        keywords = list(phrases)  # the old code rebuilt its list per request
+        msg_lower = msg.lower()
+        return any(k in msg_lower for k in keywords)
+
+    t0 = time.perf_counter()
+    matcher = CrisisMatcher(phrases)
+    build_ms = round((time.perf_counter() - t0) * 1000, 1)
+
+    legacy_us, legacy_hits = _bench(legacy, _MESSAGES, max(1, args.rounds // 10))
+    ac_us, ac_hits = _bench(matcher.match, _MESSAGES, args.rounds)
+
+    report = {
+        "phrases": args.phrases,
+        "unique_normalized_phrases": matcher.size,
+        "messages": len(_MESSAGES),
+        "matcher_build_ms": build_ms,
+        "legacy_scan_us_per_msg": legacy_us,
+        "aho_corasick_us_per_msg": ac_us,
+        "speedup": round(legacy_us / ac_us, 1) if ac_us else None,
+        "legacy_hits": legacy_hits,
+        "aho_corasick_hits": ac_hits,
+    }
+    misses = parity_misses(CrisisMatcher(DEFAULT_PHRASES), DEFAULT_PHRASES)
+    report["parity_messages"] = len(_parity_messages())
+    report["parity_misses"] = misses
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if misses:
+        sys.exit(f"{len(misses)} messages flagged by the old scan are missed by the matcher")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark: decoded tokens per role with the per-role generation profiles.
+
+Starts bench/stub_llm.py in --verbose mode (prose after the classifier
+JSON, extra lines around the coach's UI_ACTION) and runs a conversation
+through POST /chat. The stub counts only the completion tokens it actually
+sent, so early stops (max_tokens, stop_at_json, the coach line cap) show
+up directly. Run it on two checkouts to compare.
+
+    cd SHAE_LLM
+    python -m bench.bench_generation_profiles --turns 40
+"""
+from __future__ import annotations
+import argparse
+import json
+import tempfile
+import time
+
+from bench.harness import MESSAGES, app_env, http, percentile, run_child, stub_server
+
+
+def child(turns: int) -> None:
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    latencies = []
+    with TestClient(app) as client:
+        for i in range(turns):
+            msg = f"{MESSAGES[i % len(MESSAGES)]} ({i})"
+            t0 = time.perf_counter()
+            r = client.post("/chat", json={"session_id": "bench", "message": msg})
+            latencies.append((time.perf_counter() - t0) * 1000)
+            r.raise_for_status()
+    print(json.dumps({"latencies_ms": latencies}))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=40)
+    ap.add_argument("--port", type=int, default=9136)
+    ap.add_argument("--decode-ms-per-token", type=float, default=5.0)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args.turns)
+        return
+
+    with stub_server(args.port, "--verbose", "--decode-ms-per-token", str(args.decode_ms_per_token)) as stub_url:
+        http(f"{stub_url}/reset", {})
+        with tempfile.TemporaryDirectory() as tmp:
+            out = run_child("bench.bench_generation_profiles", app_env(stub_url, tmp), "--turns", str(args.turns))
+        stats = http(f"{stub_url}/stats")
+
+    latencies = sorted(out["latencies_ms"])
+    roles = {
+        role: round(stats["completion_tokens"].get(role, 0) / calls, 1)
+        for role, calls in stats["calls"].items()
+    }
+    result = {
+        "completion_tokens_per_call": roles,
+        "completion_tokens_per_turn": round(sum(stats["completion_tokens"].values()) / args.turns, 1),
+        "latency_ms_p50": percentile(latencies, 50),
+        "latency_ms_p95": percentile(latencies, 95),
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
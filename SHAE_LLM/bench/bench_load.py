@@ -0,0 +1,248 @@
+"""
+End-to-end load test: app.main:app against bench/stub_llm.py.
+
+Drives a mix of scripted multi-turn sessions through POST /chat, at most
+--concurrency sessions at a time (each session's turns run in order):
+
+- greeting: "hi", then a couple of light turns (social short-circuit)
+- venting:  several stress / anxiety turns (safety -> state -> coach)
+- crisis:   a venting turn, then a crisis phrase (keyword short-circuit)
+- long:     --long-turns exchanges, enough to push turns out of KEEP_LAST_TURNS
+            and run the background summary
+
+The stub's latency (--base-ms, --decode-ms-per-token = token rate,
+--max-parallel slots) and failure injection (--error-rate,
+--malformed-rate) are passed through. Per-turn stage timings, SQLite time
+and LLM calls come from the response's debug block (DEBUG_LLM_CALLS=true).
+
+Reports turns/s, turn latency and per-stage p50/p95/p99, LLM calls and
+SQLite ms per turn, and turn outcomes. The report is written to --out with
+the git commit and settings; --baseline prints the change against an
+earlier report.
+
+    cd SHAE_LLM
+    python -m bench.bench_load --sessions 200 --concurrency 50 --out before.json
+    (change something)
+    python -m bench.bench_load --sessions 200 --concurrency 50 --out after.json --baseline before.json
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+from bench.harness import MESSAGES, app_env, http, percentile, run_child, stub_server
+
+GREETINGS = ["hi", "hello!", "hey"]
+LIGHT = ["thanks, that helps", "ok I'll try that", "I'm doing a bit better today"]
+CRISIS = ["I want to kill myself", "I don't want to live anymore", "sometimes I think about ending it all, I want to die"]
+
+STAGES = ("safety", "state", "triage", "coach", "sqlite", "total")
+
+
+def _script(kind: str, rng: random.Random, long_turns: int) -> list:
+    if kind == "greeting":
+        return [rng.choice(GREETINGS), *rng.sample(LIGHT, 2)]
+    if kind == "crisis":
+        return [rng.choice(MESSAGES), rng.choice(CRISIS)]
+    if kind == "long":
+        return [MESSAGES[i % len(MESSAGES)] for i in range(long_turns)]
+    return rng.sample(MESSAGES, 4)
+
+
+def build_plan(sessions: int, mix: dict, long_turns: int, seed: int) -> list:
+    """[(session_id, kind, [messages])], the same for the same arguments."""
+    rng = random.Random(seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=sessions)
+    return [(f"load{i}", kind, _script(kind, rng, long_turns)) for i, kind in enumerate(kinds)]
+
+
+def _status(r) -> str:
+    if r.status_code != 200:
+        return f"http_{r.status_code}"
+    body = r.json()
+    debug = body.get("debug") or {}
+    if debug.get("degraded"):
+        return "degraded"
+    if body["safety"]["severity"] == "crisis":
+        return "crisis"
+    if debug.get("coach_mode") == "SOCIAL":
+        return "social"
+    return "ok"
+
+
+async def _run(plan: list, concurrency: int, drain_s: float) -> dict:
+    import httpx
+    from app.main import app
+    from app.orchestrator import get_summary_worker
+
+    turns = []
+    gate = asyncio.Semaphore(concurrency)
+
+    async def session(sid: str, kind: str, messages: list) -> None:
+        async with gate:
+            for n, msg in enumerate(messages):
+                # unique text per turn, except greetings (the social check wants them bare)
+                text = msg if msg in GREETINGS else f"{msg} ({sid}/{n})"
+                t0 = time.perf_counter()
+                r = await client.post("/chat", json={"session_id": sid, "message": text})
+                ms = (time.perf_counter() - t0) * 1000
+                debug = (r.json().get("debug") or {}) if r.status_code == 200 else {}
+                turns.append({
+                    "kind": kind,
+                    "ms": ms,
+                    "status": _status(r),
+                    "timings": debug.get("timings_ms") or {},
+                    "llm_calls": len(debug.get("llm_calls") or []),
+                })
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=600) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(session(*s) for s in plan))
+        wall = time.perf_counter() - t0
+
+    # Let debounced summaries of the long sessions finish
+    worker = get_summary_worker()
+    deadline = time.perf_counter() + drain_s
+    while worker.pending() and time.perf_counter() < deadline:
+        await asyncio.sleep(0.1)
+    return {"turns": turns, "wall_s": wall, "summary_worker": {**worker.stats, "pending": worker.pending()}}
+
+
+def summarize(out: dict, stub_stats: dict) -> dict:
+    turns = out["turns"]
+    n = len(turns)
+    latencies = sorted(t["ms"] for t in turns)
+
+    stages = {}
+    for stage in STAGES:
+        values = sorted(t["timings"][stage] for t in turns if stage in t["timings"])
+        if values:
+            stages[stage] = {"n": len(values), "p50": percentile(values, 50),
+                             "p95": percentile(values, 95), "p99": percentile(values, 99)}
+
+    by_kind = defaultdict(list)
+    for t in turns:
+        by_kind[t["kind"]].append(t["ms"])
+
+    sqlite = [t["timings"].get("sqlite", 0.0) for t in turns]
+    return {
+        "turns": n,
+        "wall_s": round(out["wall_s"], 2),
+        "turns_per_s": round(n / out["wall_s"], 1),
+        "latency_ms": {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95),
+                       "p99": percentile(latencies, 99)},
+        "stage_ms": stages,
+        "latency_ms_p50_by_session": {k: percentile(sorted(v), 50) for k, v in sorted(by_kind.items())},
+        # request path only; stub calls also include summaries and retries
+        "llm_calls_per_turn": round(sum(t["llm_calls"] for t in turns) / n, 2),
+        "stub_calls_per_turn": round(sum(stub_stats["calls"].values()) / n, 2),
+        "sqlite_ms_per_turn": round(sum(sqlite) / n, 2),
+        "status": dict(Counter(t["status"] for t in turns)),
+        "summary_worker": out["summary_worker"],
+        "stub_calls": stub_stats["calls"],
+        "stub_injected": stub_stats["injected"],
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _compare(report: dict, baseline: dict) -> list:
+    """One line per headline number: baseline -> now (change %)."""
+    def pct(old, new):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    rows = [("turns/s", baseline["turns_per_s"], report["turns_per_s"])]
+    rows += [(f"latency {p}", baseline["latency_ms"][p], report["latency_ms"][p]) for p in ("p50", "p95", "p99")]
+    for stage, now in report["stage_ms"].items():
+        if stage in baseline["stage_ms"]:
+            rows.append((f"{stage} p95", baseline["stage_ms"][stage]["p95"], now["p95"]))
+    rows.append(("llm calls/turn", baseline["llm_calls_per_turn"], report["llm_calls_per_turn"]))
+    rows.append(("sqlite ms/turn", baseline["sqlite_ms_per_turn"], report["sqlite_ms_per_turn"]))
+    return [f"{name:>16}: {old:>9} -> {new:>9} ({pct(old, new)})" for name, old, new in rows]
+
+
+def child(args) -> None:
+    plan = build_plan(args.sessions, args.mix, args.long_turns, args.seed)
+    print(json.dumps(asyncio.run(_run(plan, args.concurrency, args.drain_s))))
+
+
+def _parse_mix(text: str) -> dict:
+    return {k: float(v) for k, v in (part.split("=", 1) for part in text.split(","))}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=50, help="sessions in flight at once")
+    ap.add_argument("--mix", type=_parse_mix, default=_parse_mix("greeting=2,venting=5,crisis=1,long=2"),
+                    help="session kinds and weights")
+    ap.add_argument("--long-turns", type=int, default=16, help="exchanges in a long session (2 stored turns each)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--base-ms", type=float, default=20.0)
+    ap.add_argument("--decode-ms-per-token", type=float, default=2.0)
+    ap.add_argument("--max-parallel", type=int, default=16)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--malformed-rate", type=float, default=0.0)
+    ap.add_argument("--summary-debounce", type=float, default=0.5)
+    ap.add_argument("--drain-s", type=float, default=30.0, help="max wait for pending summaries after the run")
+    ap.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra app setting (repeatable)")
+    ap.add_argument("--out", default="bench_load.json")
+    ap.add_argument("--baseline", help="earlier --out file to compare against")
+    ap.add_argument("--port", type=int, default=9190)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    stub_args = ["--base-ms", str(args.base_ms), "--decode-ms-per-token", str(args.decode_ms_per_token),
+                 "--max-parallel", str(args.max_parallel), "--error-rate", str(args.error_rate),
+                 "--malformed-rate", str(args.malformed_rate)]
+    overrides = dict(e.split("=", 1) for e in args.env)
+    child_args = ["--sessions", str(args.sessions), "--concurrency", str(args.concurrency),
+                  "--mix", ",".join(f"{k}={v}" for k, v in args.mix.items()),
+                  "--long-turns", str(args.long_turns), "--seed", str(args.seed), "--drain-s", str(args.drain_s)]
+
+    with stub_server(args.port, *stub_args) as stub_url, tempfile.TemporaryDirectory() as tmp:
+        http(f"{stub_url}/reset", {})
+        env = app_env(stub_url, tmp, DEBUG_LLM_CALLS="true",
+                      SUMMARY_DEBOUNCE_SECONDS=str(args.summary_debounce), **overrides)
+        out = run_child("bench.bench_load", env, *child_args)
+        stub_stats = http(f"{stub_url}/stats")
+
+    report = {
+        "commit": _git_commit(),
+        "settings": {**{k: v for k, v in vars(args).items() if k not in ("child", "out", "baseline", "env")},
+                     "env": overrides},
+        **summarize(out, stub_stats),
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps(report, indent=2))
+    print(f"\n{report['turns']} turns in {report['wall_s']} s: {report['turns_per_s']} turns/s, "
+          f"p50 {report['latency_ms']['p50']} ms, p99 {report['latency_ms']['p99']} ms, "
+          f"{report['llm_calls_per_turn']} LLM calls/turn, {report['sqlite_ms_per_turn']} ms SQLite/turn")
+    print(f"saved to {args.out}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nvs {args.baseline} (commit {baseline.get('commit')}):")
+        print("\n".join(_compare(report, baseline)))
+
+
+if __name__ == "__main__":
+    main()
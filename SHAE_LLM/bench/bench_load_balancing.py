@@ -0,0 +1,125 @@
+"""
+Benchmark: balancing LLM calls across several inference servers.
+
+Starts --nodes copies of bench/stub_llm.py (each with its own prefix cache
+and --max-parallel slots; the last one --slow-factor times slower) and runs
+concurrent multi-turn sessions through POST /chat under each setup:
+
+- single:            all calls to the first node
+- p2c:               all nodes, power of two choices, no session affinity
+- p2c+affinity:      all nodes, a session prefers one node
+- least+affinity:    all nodes, least outstanding requests, affinity
+
+History is sent as messages (CHAT_HISTORY_AS_MESSAGES=true), so a session
+that stays on one node keeps hitting its prefix cache. Reports throughput,
+p50/p99 turn latency, the share of prompt tokens served from cache and
+the calls each node took.
+
+    cd SHAE_LLM
+    python -m bench.bench_load_balancing --nodes 3 --sessions 24 --turns 6
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from contextlib import ExitStack
+
+from bench.harness import MESSAGES, app_env, http, percentile, run_child, stub_server
+
+SETUPS = {
+    "single": {"nodes": 1, "LB_STRATEGY": "p2c", "LB_SESSION_AFFINITY": "false"},
+    "p2c": {"LB_STRATEGY": "p2c", "LB_SESSION_AFFINITY": "false"},
+    "p2c+affinity": {"LB_STRATEGY": "p2c", "LB_SESSION_AFFINITY": "true"},
+    "least+affinity": {"LB_STRATEGY": "least_outstanding", "LB_SESSION_AFFINITY": "true"},
+}
+
+
+async def _session(client, sid: int, turns: int, latencies: list) -> None:
+    for t in range(turns):
+        msg = f"{MESSAGES[(sid + t) % len(MESSAGES)]} (session {sid})"
+        t0 = time.perf_counter()
+        r = await client.post("/chat", json={"session_id": f"s{sid}", "message": msg})
+        latencies.append((time.perf_counter() - t0) * 1000)
+        r.raise_for_status()
+
+
+async def _run(sessions: int, turns: int) -> dict:
+    import httpx
+    from app.main import app
+
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=600) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(_session(client, i, turns, latencies) for i in range(sessions)))
+        wall = time.perf_counter() - t0
+    return {"latencies_ms": latencies, "wall_s": wall}
+
+
+def child(sessions: int, turns: int) -> None:
+    print(json.dumps(asyncio.run(_run(sessions, turns))))
+
+
+def run_setup(name: str, stub_urls: list, sessions: int, turns: int) -> dict:
+    setup = dict(SETUPS[name])
+    urls = stub_urls[: setup.pop("nodes", len(stub_urls))]
+    for url in stub_urls:
+        http(f"{url}/reset", {})
+    with tempfile.TemporaryDirectory() as tmp:
+        env = app_env(urls[0], tmp, CHAT_HISTORY_AS_MESSAGES="true", **setup)
+        env["OLLAMA_BASE_URL"] = ",".join(f"{u}/v1" for u in urls)
+        out = run_child("bench.bench_load_balancing", env, "--sessions", str(sessions), "--turns", str(turns))
+
+    per_node, prompt, cached = [], 0, 0
+    for url in stub_urls:
+        stats = http(f"{url}/stats")
+        per_node.append(sum(stats["calls"].values()))
+        prompt += sum(stats["prompt_tokens"].values())
+        cached += sum(stats["cached_tokens"].values())
+    latencies = sorted(out["latencies_ms"])
+    return {
+        "setup": name,
+        "throughput_turns_per_s": round(sessions * turns / out["wall_s"], 1),
+        "latency_ms_p50": percentile(latencies, 50),
+        "latency_ms_p99": percentile(latencies, 99),
+        "cached_fraction": round(cached / prompt, 3) if prompt else 0.0,
+        "calls_per_node": per_node,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--nodes", type=int, default=3)
+    ap.add_argument("--sessions", type=int, default=24)
+    ap.add_argument("--turns", type=int, default=6)
+    ap.add_argument("--max-parallel", type=int, default=4, help="slots per node")
+    ap.add_argument("--prefill-ms-per-token", type=float, default=0.2)
+    ap.add_argument("--slow-factor", type=float, default=2.0, help="latency multiplier of the last node")
+    ap.add_argument("--port", type=int, default=9150)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args.sessions, args.turns)
+        return
+
+    with ExitStack() as stack:
+        stub_urls = []
+        for i in range(args.nodes):
+            extra = ["--model-speed", f"stub={args.slow_factor}"] if i == args.nodes - 1 and i > 0 else []
+            stub_urls.append(stack.enter_context(stub_server(
+                args.port + i, "--max-parallel", str(args.max_parallel),
+                "--prefill-ms-per-token", str(args.prefill_ms_per_token), *extra,
+            )))
+        results = [run_setup(name, stub_urls, args.sessions, args.turns) for name in SETUPS]
+
+    print(json.dumps(results, indent=2))
+    for r in results:
+        print(f"{r['setup']:>15}: {r['throughput_turns_per_s']:>6} turns/s, p50 {r['latency_ms_p50']:>7} ms, "
+              f"p99 {r['latency_ms_p99']:>7} ms, {r['cached_fraction']:.1%} cached, calls/node {r['calls_per_node']}")
+
+
+if __name__ == "__main__":
+    main()
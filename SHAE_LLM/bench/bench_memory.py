@@ -0,0 +1,158 @@
+"""
+SQLite memory store benchmark: turn append and context-load latency.
+
+Builds a DB with --rows turns spread over --sessions sessions, then times
+append_turn and the per-request context load (turn count + last turns +
+summary) on random sessions. Runs twice: the legacy layout (connection per
+call, no session index, rollback journal) and the current pooled WAL store.
+
+    cd SHAE_LLM
+    python -m bench.bench_memory --rows 1000000
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+
+def _populate(path: str, rows: int, sessions: int) -> None:
+    c = sqlite3.connect(path)
+    c.execute("PRAGMA journal_mode=OFF")
+    c.execute("PRAGMA synchronous=OFF")
+    c.execute("""
+    CREATE TABLE turns (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        ts TEXT NOT NULL,
+        role TEXT NOT NULL,
+        text TEXT NOT NULL
+    )
+    """)
+    c.execute("""
+    CREATE TABLE session_state (
+        session_id TEXT PRIMARY KEY,
+        summary TEXT NOT NULL DEFAULT '',
+        updated_at TEXT NOT NULL
+    )
+    """)
+    ts = datetime.utcnow().isoformat()
+    rng = random.Random(7)
+    batch = []
+    for i in range(rows):
+        batch.append((f"s{rng.randrange(sessions)}", ts, "user" if i % 2 == 0 else "assistant", "I feel a bit overwhelmed today " * 2))
+        if len(batch) >= 50_000:
+            c.executemany("INSERT INTO turns(session_id, ts, role, text) VALUES(?,?,?,?)", batch)
+            batch.clear()
+    if batch:
+        c.executemany("INSERT INTO turns(session_id, ts, role, text) VALUES(?,?,?,?)", batch)
+    c.commit()
+    c.close()
+
+
+# Legacy access pattern (pre-pooling): new connection per call, no index.
+def _legacy_conn(path):
+    c = sqlite3.connect(path, check_same_thread=False)
+    c.row_factory = sqlite3.Row
+    return c
+
+def _legacy_append(path, session_id, role, text):
+    with _legacy_conn(path) as c:
+        c.execute("INSERT INTO turns(session_id, ts, role, text) VALUES(?,?,?,?)",
+                  (session_id, datetime.utcnow().isoformat(), role, text))
+        c.commit()
+
+def _legacy_load(path, session_id, keep_last):
+    with _legacy_conn(path) as c:
+        c.execute("SELECT COUNT(*) AS n FROM turns WHERE session_id=?", (session_id,)).fetchone()
+    with _legacy_conn(path) as c:
+        c.execute("SELECT summary FROM session_state WHERE session_id=?", (session_id,)).fetchone()
+    with _legacy_conn(path) as c:
+        c.execute("SELECT role, text FROM turns WHERE session_id=? ORDER BY id DESC LIMIT ?",
+                  (session_id, keep_last)).fetchall()
+
+
+def _stats(samples_s):
+    ms = sorted(x * 1000 for x in samples_s)
+    return {
+        "n": len(ms),
+        "p50_ms": round(statistics.median(ms), 3),
+        "p99_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.99))], 3),
+        "mean_ms": round(statistics.fmean(ms), 3),
+    }
+
+def _time(fn, n, sessions, rng):
+    out = []
+    for _ in range(n):
+        sid = f"s{rng.randrange(sessions)}"
+        t0 = time.perf_counter()
+        fn(sid)
+        out.append(time.perf_counter() - t0)
+    return _stats(out)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--sessions", type=int, default=20_000)
+    ap.add_argument("--ops", type=int, default=500, help="timed operations per measurement")
+    ap.add_argument("--keep-last", type=int, default=12)
+    ap.add_argument("--out", default="", help="optional JSON output path")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="shae-bench-")
+    path = os.path.join(tmp, "bench.db")
+    print(f"populating {args.rows:,} turns over {args.sessions:,} sessions ...")
+    t0 = time.perf_counter()
+    _populate(path, args.rows, args.sessions)
+    print(f"  done in {time.perf_counter() - t0:.1f}s")
+
+    results = {"rows": args.rows, "sessions": args.sessions}
+    rng = random.Random(11)
+
+    # Legacy (legacy ops are slow at scale: cap their count)
+    legacy_ops = max(20, args.ops // 10)
+    results["legacy"] = {
+        "append_turn": _time(lambda sid: _legacy_append(path, sid, "user", "hello"), legacy_ops, args.sessions, rng),
+        "context_load": _time(lambda sid: _legacy_load(path, sid, args.keep_last), legacy_ops, args.sessions, rng),
+    }
+    print("legacy:", json.dumps(results["legacy"], indent=2))
+
+    # Current store: the migration adds the session index on first init_db
+    os.environ["SHAE_DB_PATH"] = path
+    from app import memory_sqlite as mem
+    mem.DB_PATH = path
+    t0 = time.perf_counter()
+    mem.init_db()
+    results["migration_s"] = round(time.perf_counter() - t0, 2)
+
+    def load(sid):
+        mem.get_turn_count(sid)
+        mem.get_summary(sid)
+        mem.get_last_turns(sid, args.keep_last)
+
+    results["pooled_wal"] = {
+        "append_turn": _time(lambda sid: mem.append_turn(sid, "user", "hello"), args.ops, args.sessions, rng),
+        "context_load": _time(load, args.ops, args.sessions, rng),
+        "load_session_context": _time(lambda sid: mem.load_session_context(sid, args.keep_last), args.ops, args.sessions, rng),
+        "append_turns_pair": _time(lambda sid: mem.append_turns(sid, [("user", "hello"), ("assistant", "hi")]), args.ops, args.sessions, rng),
+    }
+    print(f"migration: {results['migration_s']}s")
+    print("pooled_wal:", json.dumps(results["pooled_wal"], indent=2))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    mem.close_thread_connections()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark: prompt layout vs prefix-cache reuse on the inference server.
+
+Starts bench/stub_llm.py (which emulates block-level prefix caching) and
+runs interleaved conversations for several sessions through POST /chat,
+once per history layout:
+
+- inline:   recent turns rendered into the final user message
+- messages: recent turns sent as real user/assistant messages
+            (CHAT_HISTORY_AS_MESSAGES=true)
+
+Reports, per role: prompt tokens per call, the fraction served from the
+prefix cache, and emulated prefill time per call.
+
+    cd SHAE_LLM
+    python -m bench.bench_prompt_layout --sessions 4 --turns 20
+"""
+from __future__ import annotations
+import argparse
+import json
+import tempfile
+import time
+
+from bench.harness import MESSAGES, app_env, http, percentile, run_child, stub_server
+
+LAYOUTS = {"inline": "false", "messages": "true"}
+
+
+def child(sessions: int, turns: int) -> None:
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    latencies = []
+    with TestClient(app) as client:
+        for t in range(turns):
+            for s in range(sessions):
+                msg = f"{MESSAGES[(t + s) % len(MESSAGES)]} ({t})"
+                t0 = time.perf_counter()
+                r = client.post("/chat", json={"session_id": f"bench-{s}", "message": msg})
+                latencies.append((time.perf_counter() - t0) * 1000)
+                r.raise_for_status()
+    print(json.dumps({"latencies_ms": latencies}))
+
+
+def run_layout(layout: str, stub_url: str, sessions: int, turns: int) -> dict:
+    http(f"{stub_url}/reset", {})
+    with tempfile.TemporaryDirectory() as tmp:
+        env = app_env(stub_url, tmp, CHAT_HISTORY_AS_MESSAGES=LAYOUTS[layout])
+        out = run_child("bench.bench_prompt_layout", env, "--sessions", str(sessions), "--turns", str(turns))
+    latencies = sorted(out["latencies_ms"])
+    stats = http(f"{stub_url}/stats")
+
+    roles = {}
+    for role, calls in stats["calls"].items():
+        prompt = stats["prompt_tokens"][role]
+        roles[role] = {
+            "calls": calls,
+            "prompt_tokens_per_call": round(prompt / calls, 1),
+            "cached_fraction": round(stats["cached_tokens"][role] / prompt, 3) if prompt else 0.0,
+            "prefill_ms_per_call": round(stats["prefill_ms"][role] / calls, 2),
+        }
+    total_calls = sum(stats["calls"].values())
+    return {
+        "layout": layout,
+        "roles": roles,
+        "prefill_ms_per_call": round(sum(stats["prefill_ms"].values()) / total_calls, 2),
+        "cached_fraction": round(sum(stats["cached_tokens"].values()) / sum(stats["prompt_tokens"].values()), 3),
+        "latency_ms_p50": percentile(latencies, 50),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=4)
+    ap.add_argument("--turns", type=int, default=20)
+    ap.add_argument("--port", type=int, default=9132)
+    ap.add_argument("--prefill-ms-per-token", type=float, default=0.2)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args.sessions, args.turns)
+        return
+
+    with stub_server(args.port, "--prefill-ms-per-token", str(args.prefill_ms_per_token)) as stub_url:
+        results = [run_layout(layout, stub_url, args.sessions, args.turns) for layout in LAYOUTS]
+
+    print(json.dumps(results, indent=2))
+    for r in results:
+        print(f"{r['layout']:>9}: prefill {r['prefill_ms_per_call']} ms/call, "
+              f"{r['cached_fraction']:.1%} of prompt tokens cached, p50 {r['latency_ms_p50']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Benchmark: /chat behaviour while the LLM server is down, and recovery.
+
+Starts bench/stub_llm.py and drives concurrent sessions through POST /chat
+in three phases, flipping the stub's failure injection in between:
+
+- healthy:  normal replies
+- outage:   the stub hangs (--outage hang), answers every call with a
+            503 (--outage error) or sends the headers and then stalls
+            longer than the read timeout (--outage stall)
+- recovery: the stub is healthy again; after BREAKER_RESET_SECONDS the
+            breaker lets a probe through and closes
+
+Reports per phase: p50/p99 turn latency, how many turns got the degraded
+reply, and the breaker state afterwards.
+
+Then checks the half-open probe directly on the state backend: the probe
+call is cancelled mid-flight (a client disconnect), and a call is made
+with an already expired deadline. Neither may leave the breaker rejecting
+calls; the next call must go out and close it.
+
+    cd SHAE_LLM
+    python -m bench.bench_resilience --outage hang
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+
+from bench.harness import MESSAGES, app_env, http, percentile, run_child, stub_server
+
+HEALTHY = {"hang": False, "error_rate": 0.0, "base_ms": 20.0}
+PHASES = (("healthy", HEALTHY), ("outage", None), ("recovery", HEALTHY))
+OUTAGES = {"hang": {"hang": True}, "error": {"error_rate": 1.0}, "stall": {"base_ms": 60000.0}}
+
+
+async def _phase(client, name: str, sessions: int, turns: int, think_s: float) -> dict:
+    latencies, degraded = [], 0
+
+    async def session(sid: int) -> None:
+        nonlocal degraded
+        for t in range(turns):
+            msg = f"{MESSAGES[(sid + t) % len(MESSAGES)]} ({name} {sid})"
+            t0 = time.perf_counter()
+            r = await client.post("/chat", json={"session_id": f"{name}-{sid}", "message": msg})
+            latencies.append((time.perf_counter() - t0) * 1000)
+            r.raise_for_status()
+            degraded += bool(r.json()["debug"].get("degraded"))
+            await asyncio.sleep(think_s)
+
+    await asyncio.gather(*(session(i) for i in range(sessions)))
+    latencies.sort()
+    return {
+        "phase": name,
+        "turns": len(latencies),
+        "degraded_turns": degraded,
+        "latency_ms_p50": percentile(latencies, 50),
+        "latency_ms_p99": percentile(latencies, 99),
+    }
+
+
+async def _run(stub_url: str, outage: str, sessions: int, turns: int, think_s: float, reset_s: float) -> list:
+    import httpx
+    from app.main import app
+    from app.resilience import breaker_stats
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=600) as client:
+        for name, stub_config in PHASES:
+            if name == "recovery":
+                await asyncio.to_thread(http, f"{stub_url}/config", stub_config)
+                await asyncio.sleep(reset_s + 0.5)
+            else:
+                await asyncio.to_thread(http, f"{stub_url}/config", stub_config or OUTAGES[outage])
+            result = await _phase(client, name, sessions, turns, think_s)
+            result["breakers"] = {url: b["state"] for url, b in breaker_stats().items()}
+            results.append(result)
+    return results
+
+
+async def _open_breaker(stub_url: str, backend, breaker) -> None:
+    from app.llm_backend import ChatMsg
+    from app.resilience import LLMUnavailableError
+
+    await asyncio.to_thread(http, f"{stub_url}/config", {"hang": False, "error_rate": 1.0})
+    while breaker.state == "closed":
+        try:
+            await backend.chat([ChatMsg(role="user", content="probe check")])
+        except LLMUnavailableError:
+            pass
+
+
+async def _check_probe(stub_url: str, reset_s: float) -> dict:
+    from app.llm_backend import ChatMsg, get_async_backend
+    from app.resilience import LLMUnavailableError, deadline_scope, get_breaker
+
+    backend = get_async_backend("state")
+    breaker = get_breaker(backend.pool.pick().base_url)
+    msgs = [ChatMsg(role="user", content="probe check")]
+    out = {}
+
+    # 1) the half-open probe is cancelled while the server hangs
+    await _open_breaker(stub_url, backend, breaker)
+    await asyncio.to_thread(http, f"{stub_url}/config", {"hang": True, "error_rate": 0.0})
+    await asyncio.sleep(reset_s + 0.2)
+    probe = asyncio.create_task(backend.chat(msgs))
+    await asyncio.sleep(0.3)
+    out["probe_in_flight_rejects"] = breaker.is_open()
+    probe.cancel()
+    await asyncio.gather(probe, return_exceptions=True)
+    out["rejecting_after_cancel"] = breaker.is_open()
+
+    # 2) a call whose deadline already expired must not take the probe slot
+    with deadline_scope(0.001):
+        await asyncio.sleep(0.01)
+        try:
+            await backend.chat(msgs)
+        except LLMUnavailableError:
+            pass
+    out["rejecting_after_expired_deadline"] = breaker.is_open()
+
+    # 3) the next call is the probe, succeeds and closes the breaker
+    await asyncio.to_thread(http, f"{stub_url}/config", {"hang": False, "error_rate": 0.0})
+    try:
+        await backend.chat(msgs)
+    except LLMUnavailableError:
+        pass
+    out["state_after_probe"] = breaker.state
+    out["ok"] = (out["probe_in_flight_rejects"] and not out["rejecting_after_cancel"]
+                 and not out["rejecting_after_expired_deadline"] and out["state_after_probe"] == "closed")
+    return out
+
+
+async def _run_all(stub_url: str, outage: str, sessions: int, turns: int, think_s: float, reset_s: float) -> dict:
+    # one event loop: the async LLM clients are bound to it
+    results = await _run(stub_url, outage, sessions, turns, think_s, reset_s)
+    return {"results": results, "probe": await _check_probe(stub_url, reset_s)}
+
+
+def child(stub_url: str, outage: str, sessions: int, turns: int, think_s: float, reset_s: float) -> None:
+    print(json.dumps(asyncio.run(_run_all(stub_url, outage, sessions, turns, think_s, reset_s))))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--outage", choices=sorted(OUTAGES), default="hang")
+    ap.add_argument("--sessions", type=int, default=8)
+    ap.add_argument("--turns", type=int, default=5)
+    ap.add_argument("--think-ms", type=float, default=500.0, help="pause between a session's turns")
+    ap.add_argument("--deadline-s", type=float, default=5.0)
+    ap.add_argument("--read-timeout-s", type=float, default=3.0)
+    ap.add_argument("--breaker-reset-s", type=float, default=2.0)
+    ap.add_argument("--port", type=int, default=9140)
+    ap.add_argument("--stub-url", help=argparse.SUPPRESS)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args.stub_url, args.outage, args.sessions, args.turns, args.think_ms / 1000, args.breaker_reset_s)
+        return
+
+    with stub_server(args.port) as stub_url:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = app_env(
+                stub_url, tmp,
+                CHAT_DEADLINE_SECONDS=str(args.deadline_s),
+                LLM_READ_TIMEOUT_S=str(args.read_timeout_s),
+                BREAKER_RESET_SECONDS=str(args.breaker_reset_s),
+            )
+            out = run_child(
+                "bench.bench_resilience", env, "--stub-url", stub_url, "--outage", args.outage,
+                "--sessions", str(args.sessions), "--turns", str(args.turns), "--think-ms", str(args.think_ms),
+                "--breaker-reset-s", str(args.breaker_reset_s),
+            )
+
+    print(json.dumps(out["results"], indent=2))
+    for r in out["results"]:
+        print(f"{r['phase']:>9}: {r['degraded_turns']:>3}/{r['turns']} degraded, "
+              f"p50 {r['latency_ms_p50']:>7} ms, p99 {r['latency_ms_p99']:>7} ms, breakers {r['breakers']}")
+    print(f"half-open probe: {'ok' if out['probe']['ok'] else 'STUCK'} {out['probe']}")
+    if not out["probe"]["ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark: one model for every role vs a small model on the classifiers.
+
+Starts bench/stub_llm.py with a latency multiplier for the "small" model
+(--small-speed, default 0.3 ~ a 3B next to an 8B) and runs the same turns
+through POST /chat twice: everything on "big", then SAFETY_MODEL /
+STATE_MODEL / SUMMARY_MODEL=small with the coach left on "big".
+
+    cd SHAE_LLM
+    python -m bench.bench_role_models --turns 40
+"""
+from __future__ import annotations
+import argparse
+import json
+import tempfile
+import time
+
+from bench.harness import MESSAGES, app_env, http, percentile, run_child, stub_server
+
+SETUPS = {
+    "single_model": {},
+    "small_classifiers": {"SAFETY_MODEL": "small", "STATE_MODEL": "small", "SUMMARY_MODEL": "small"},
+}
+
+
+def child(turns: int) -> None:
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    latencies = []
+    with TestClient(app) as client:
+        for i in range(turns):
+            msg = f"{MESSAGES[i % len(MESSAGES)]} ({i})"
+            t0 = time.perf_counter()
+            r = client.post("/chat", json={"session_id": "bench", "message": msg})
+            latencies.append((time.perf_counter() - t0) * 1000)
+            r.raise_for_status()
+    print(json.dumps({"latencies_ms": latencies}))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=40)
+    ap.add_argument("--port", type=int, default=9138)
+    ap.add_argument("--small-speed", type=float, default=0.3)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args.turns)
+        return
+
+    results = []
+    with stub_server(args.port, "--model-speed", f"small={args.small_speed}",
+                     "--decode-ms-per-token", "5", "--prefill-ms-per-token", "0.2") as stub_url:
+        for name, overrides in SETUPS.items():
+            http(f"{stub_url}/reset", {})
+            with tempfile.TemporaryDirectory() as tmp:
+                env = app_env(stub_url, tmp, OLLAMA_MODEL="big", **overrides)
+                latencies = sorted(run_child("bench.bench_role_models", env, "--turns", str(args.turns))["latencies_ms"])
+            stats = http(f"{stub_url}/stats")
+            results.append({
+                "setup": name,
+                "calls_by_model": stats["calls_by_model"],
+                "latency_ms_p50": percentile(latencies, 50),
+                "latency_ms_p95": percentile(latencies, 95),
+            })
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
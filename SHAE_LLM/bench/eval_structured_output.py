@@ -0,0 +1,78 @@
+"""
+Repair-call rate of the JSON classifiers, with and without structured output.
+
+Starts bench/stub_llm.py with --malformed-rate (a share of unconstrained
+classifier replies come back wrapped in prose, fenced, as two objects, or
+with a trailing comma) and runs the same turns through POST /chat for each
+STRUCTURED_OUTPUT setting. Every fix-prompt retry is a full extra
+inference; the stub counts them under the "repair" role.
+
+    cd SHAE_LLM
+    python -m bench.eval_structured_output --turns 200 --malformed-rate 0.2
+"""
+from __future__ import annotations
+import argparse
+import json
+import tempfile
+import time
+
+from bench.harness import MESSAGES, app_env, http, run_child, stub_server
+
+SETTINGS = ("off", "json_schema")
+
+
+def child(turns: int) -> None:
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as client:
+        for i in range(turns):
+            msg = f"{MESSAGES[i % len(MESSAGES)]} ({i})"  # distinct text: no cache hits
+            r = client.post("/chat", json={"session_id": f"eval-{i % 8}", "message": msg})
+            r.raise_for_status()
+    print(json.dumps({"turns": turns}))
+
+
+def run_setting(setting: str, stub_url: str, turns: int) -> dict:
+    http(f"{stub_url}/reset", {})
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        run_child("bench.eval_structured_output", app_env(stub_url, tmp, STRUCTURED_OUTPUT=setting),
+                  "--turns", str(turns))
+        elapsed = time.perf_counter() - t0
+    calls = http(f"{stub_url}/stats")["calls"]
+    repairs = calls.get("repair", 0)
+    return {
+        "structured_output": setting,
+        "calls": calls,
+        "repair_calls": repairs,
+        "repair_rate_per_safety_call": round(repairs / max(1, calls.get("safety", 0)), 4),
+        "llm_calls_per_turn": round(sum(calls.values()) / turns, 3),
+        "wall_s": round(elapsed, 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=200)
+    ap.add_argument("--malformed-rate", type=float, default=0.2)
+    ap.add_argument("--port", type=int, default=9134)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args.turns)
+        return
+
+    with stub_server(args.port, "--malformed-rate", str(args.malformed_rate), "--decode-ms-per-token", "0") as stub_url:
+        results = [run_setting(setting, stub_url, args.turns) for setting in SETTINGS]
+
+    print(json.dumps(results, indent=2))
+    for r in results:
+        print(f"STRUCTURED_OUTPUT={r['structured_output']:<12} repair calls: {r['repair_calls']:>4} "
+              f"({r['repair_rate_per_safety_call']:.1%} of safety calls), "
+              f"LLM calls/turn {r['llm_calls_per_turn']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Shared plumbing for benchmarks that drive the app against bench/stub_llm.py.
+
+    with stub_server(9131, "--verbose") as stub_url:
+        out = run_child("bench.my_bench", app_env(stub_url, tmp, CLASSIFIER_MODE="fused"), "--turns", "40")
+
+The app reads its config from the environment at import, so every
+configuration under test runs in its own child process (the bench module
+re-invoked with --child).
+"""
+from __future__ import annotations
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from contextlib import contextmanager
+from typing import Iterator, List
+
+MESSAGES = [
+    "I've been really stressed about work lately",
+    "My manager keeps piling on deadlines and I can't focus",
+    "I feel anxious every morning before I log in",
+    "Can you give me a 21 day plan to manage this?",
+    "I tried the breathing thing yesterday, it helped a bit",
+    "I'm overwhelmed and my chest feels tight right now",
+    "My sister says I should take a break but I feel guilty",
+    "What do I do when I keep procrastinating?",
+]
+
+
+def http(url: str, body: dict = None) -> dict:
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=10) as r:
+        return json.loads(r.read())
+
+
+def wait_for(url: str, timeout: float = 15.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            http(url)
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server did not come up at {url}")
+
+
+@contextmanager
+def stub_server(port: int, *args: str) -> Iterator[str]:
+    """Run bench/stub_llm.py on `port` (extra CLI args passed through); yields its base URL."""
+    url = f"http://127.0.0.1:{port}"
+    proc = subprocess.Popen([sys.executable, "-m", "bench.stub_llm", "--port", str(port), *args])
+    try:
+        wait_for(f"{url}/v1/models")
+        yield url
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:  # requests still open (e.g. injected hangs)
+            proc.kill()
+            proc.wait()
+
+
+def app_env(stub_url: str, tmp_dir: str, **overrides: str) -> dict:
+    """Environment for an app child process pointed at the stub, with caches off."""
+    return {
+        **os.environ,
+        "BACKEND": "ollama",
+        "OLLAMA_BASE_URL": f"{stub_url}/v1",
+        "OLLAMA_MODEL": "stub",
+        "SHAE_DB_PATH": os.path.join(tmp_dir, "bench.db"),
+        "CLASSIFIER_CACHE_SIZE": "0",
+        "PRECLASSIFIER_ENABLED": "false",
+        "SUMMARY_DEBOUNCE_SECONDS": "3600",  # keep summaries out of the numbers
+        **overrides,
+    }
+
+
+def run_child(module: str, env: dict, *args: str) -> dict:
+    """Run `python -m module --child *args`; returns the JSON object on its last stdout line."""
+    out = subprocess.run(
+        [sys.executable, "-m", module, "--child", *args],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values))) - 1))
+    return round(sorted_values[idx], 1)
@@ -0,0 +1,193 @@
+"""
+Record a conversation's LLM calls once, then replay it offline and profile it.
+
+record: runs the user messages through the sync pipeline
+(keyword check -> run_safety -> run_orchestrator -> summary) against the
+configured BACKEND with LLM_CASSETTE_MODE=record, and saves the messages
+next to the cassette (<cassette>.turns.json) together with the settings
+that shape the requests (backend, models, sampling). Messages come from a
+JSON list (--messages) or from a stored session (--db, --session-id).
+
+replay: runs the same messages with LLM_CASSETTE_MODE=replay, so no model
+server is needed and every run takes the same path. --timing sleeps the
+recorded latencies (end-to-end shape); without it only the Python side is
+left, which is what --profile (cProfile, top functions by cumulative time)
+is for.
+
+Each run starts from an empty temp DB, and the summary is folded in
+synchronously after each turn rather than on the debounced worker, so the
+prompts (and therefore the cassette keys) are the same every time.
+
+    cd SHAE_LLM
+    python -m bench.replay_session record --db shae_memory.db --session-id abc --cassette slow.jsonl
+    python -m bench.replay_session replay --cassette slow.jsonl --repeat 20 --profile
+"""
+from __future__ import annotations
+import argparse
+import cProfile
+import io
+import json
+import os
+import pstats
+import sqlite3
+import sys
+import tempfile
+import time
+
+from bench.harness import percentile
+
+
+def _turns_path(cassette: str) -> str:
+    return cassette + ".turns.json"
+
+
+def _load_messages(args) -> list:
+    if args.messages:
+        with open(args.messages, encoding="utf-8") as f:
+            return json.load(f)
+    if args.db and args.session_id:
+        c = sqlite3.connect(args.db)
+        rows = c.execute(
+            "SELECT text FROM turns WHERE session_id=? AND role='user' ORDER BY id", (args.session_id,)
+        ).fetchall()
+        c.close()
+        return [r[0] for r in rows]
+    with open(_turns_path(args.cassette), encoding="utf-8") as f:
+        return json.load(f)["messages"]
+
+
+def _request_settings() -> dict:
+    """Settings that change what is sent, and so the cassette keys."""
+    from app import config
+
+    settings = {
+        "BACKEND": config.BACKEND,
+        "OLLAMA_MODEL": config.OLLAMA_MODEL,
+        "HF_CHAT_MODEL": config.HF_CHAT_MODEL,
+        "STRUCTURED_OUTPUT": config.STRUCTURED_OUTPUT,
+        "CHAT_HISTORY_AS_MESSAGES": str(config.CHAT_HISTORY_AS_MESSAGES).lower(),
+        "MAX_NEW_TOKENS": str(config.MAX_NEW_TOKENS),
+        "TEMPERATURE": str(config.TEMPERATURE),
+        "TOP_P": str(config.TOP_P),
+    }
+    settings.update({f"{role.upper()}_MODEL": model for role, model in config.ROLE_MODELS.items() if model})
+    return settings
+
+
+def _configure(mode: str, args, tmp: str) -> None:
+    # Must run before anything under app/ is imported: config is read at import
+    if mode == "replay":
+        with open(_turns_path(args.cassette), encoding="utf-8") as f:
+            os.environ.update(json.load(f)["settings"])
+        os.environ.setdefault("HF_TOKEN", "replay")  # never sent: no request leaves the process
+    os.environ.update({
+        "LLM_CASSETTE_MODE": mode,
+        "LLM_CASSETTE_PATH": args.cassette,
+        "LLM_CASSETTE_REPLAY_TIMING": "true" if getattr(args, "timing", False) else "false",
+        "SHAE_DB_PATH": os.path.join(tmp, "replay.db"),
+        "CLASSIFIER_CACHE_DB": "",
+        "SUMMARY_DEBOUNCE_SECONDS": "3600",
+    })
+
+
+def run_session(session_id: str, messages: list) -> list:
+    """One pass through the pipeline; returns per-turn wall time in ms."""
+    from app.crisis_matcher import match_crisis
+    from app.orchestrator import maybe_update_summary, run_orchestrator
+    from app.safety import run_safety
+
+    latencies = []
+    for msg in messages:
+        t0 = time.perf_counter()
+        # crisis turns get the canned reply and are not stored, as in /chat
+        if not match_crisis(msg):
+            safety = run_safety(msg)
+            if safety.severity != "crisis":
+                run_orchestrator(msg, safety, session_id)
+        maybe_update_summary(session_id)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return latencies
+
+
+def record(args) -> None:
+    messages = _load_messages(args)
+    if os.path.exists(args.cassette):
+        os.remove(args.cassette)
+    with tempfile.TemporaryDirectory() as tmp:
+        _configure("record", args, tmp)
+        from app.session_store import get_store
+        from app.cassette import get_cassette
+
+        get_store().init()
+        latencies = run_session("record", messages)
+        recorded = get_cassette().stats["recorded"]
+        settings = _request_settings()
+    with open(_turns_path(args.cassette), "w", encoding="utf-8") as f:
+        json.dump({"messages": messages, "settings": settings}, f, ensure_ascii=False, indent=2)
+    print(f"recorded {recorded} LLM calls for {len(messages)} turns into {args.cassette} "
+          f"({sum(latencies) / 1000:.1f} s live)")
+
+
+def replay(args) -> None:
+    messages = _load_messages(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        _configure("replay", args, tmp)
+        from app.session_store import get_store
+        from app.cassette import get_cassette
+
+        get_store().init()
+        import app.crisis_matcher, app.orchestrator, app.safety  # noqa: F401  (imports stay out of the profile)
+
+        profiler = cProfile.Profile() if args.profile else None
+        latencies = []
+        t0 = time.perf_counter()
+        for i in range(args.repeat):
+            if profiler is not None:
+                profiler.enable()
+            latencies += run_session(f"replay{i}", messages)
+            if profiler is not None:
+                profiler.disable()
+        wall = time.perf_counter() - t0
+        stats = get_cassette().stats
+
+    latencies.sort()
+    print(json.dumps({
+        "turns": len(latencies),
+        "wall_s": round(wall, 3),
+        "turn_ms_p50": percentile(latencies, 50),
+        "turn_ms_p99": percentile(latencies, 99),
+        "timing_emulated": args.timing,
+        "cassette": stats,
+    }, indent=2))
+    if profiler is not None:
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(args.top)
+        print(out.getvalue())
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name in ("record", "replay"):
+        p = sub.add_parser(name)
+        p.add_argument("--cassette", default="llm_cassette.jsonl")
+        p.add_argument("--messages", help="JSON file with a list of user messages")
+        p.add_argument("--db", help="SQLite DB to read a stored session from")
+        p.add_argument("--session-id")
+    rp = sub.choices["replay"]
+    rp.add_argument("--timing", action="store_true", help="sleep the recorded latencies")
+    rp.add_argument("--repeat", type=int, default=1)
+    rp.add_argument("--profile", action="store_true")
+    rp.add_argument("--top", type=int, default=25)
+    args = ap.parse_args()
+
+    if args.cmd == "record":
+        if not (args.messages or (args.db and args.session_id)):
+            sys.exit("record needs --messages or --db and --session-id")
+        record(args)
+    else:
+        replay(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+"""
+Deterministic OpenAI-compatible stub LLM server for benchmarks.
+
+Serves POST /v1/chat/completions (plain and stream=True) and GET /v1/models.
+Replies are canned by role, detected from the system prompt: safety JSON,
+state JSON, fused triage JSON, session summary, or a coach reply in the
+requested MODE. Message content steers the verdicts (crisis phrases, panic /
+overwhelm, plan requests) so the pipeline takes realistic branches.
+
+Latency model per request:
+    base_ms + prefill_ms_per_token * (prompt_tokens - cached_tokens)
+            + decode_ms_per_token * completion_tokens
+Tokens are approximated as len(text) / 4. model_speed scales both terms per
+model name, to emulate a small model next to a large one.
+
+Prefix caching is emulated the way vLLM's automatic prefix caching works:
+the serialized prompt is cut into fixed-size blocks, each block is keyed by
+the hash of everything up to and including it, and leading blocks already
+in the (LRU) block cache are not prefilled again. Any change early in the
+prompt therefore invalidates every block after it.
+
+Classifier replies (safety / state / triage) can be made unreliable with
+malformed_rate: that fraction of unconstrained replies comes back wrapped in
+prose or a code fence, as two objects, or with a trailing comma. Requests
+that set response_format always get clean JSON (constrained decoding).
+Fix-prompt retries are counted under the "repair" role.
+
+verbose makes the model ramble like an untuned 8B would: prose after the
+classifier JSON, extra lines before and after the coach's UI_ACTION. max_tokens
+and stop are honoured, and streamed replies only count the tokens actually
+sent, so a client hanging up early shows up as fewer completion tokens.
+
+Cold models: with load_ms, the first request for each model name pays
+load_ms once (Ollama loading the weights). POST /api/generate with no
+prompt loads the model the way Ollama's native API does (a warm-up call);
+POST /reset unloads everything.
+
+Failure injection: error_rate answers that fraction of completions with a
+503, and hang accepts requests but does not answer while it is set (a wedged
+Ollama). Both
+can be flipped at runtime through POST /config.
+
+GET /stats returns call/token/prefill counters per role; POST /reset clears
+them and the prefix cache.
+
+    cd SHAE_LLM
+    python -m bench.stub_llm --port 9100 --decode-ms-per-token 5
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import re
+import time
+import hashlib
+import random
+from collections import OrderedDict, defaultdict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_CRISIS_RE = re.compile(r"kill myself|suicid|want to die|end my life|hurt myself", re.I)
+_HIGH_RE = re.compile(r"panic|overwhelm|can't breathe|anxious|shaking", re.I)
+_HELP_RE = re.compile(r"stuck|what do i do|help|can't focus", re.I)
+_PLAN_RE = re.compile(r"plan|routine|schedule|21.day", re.I)
+
+CONFIG = {
+    "base_ms": 20.0,
+    "prefill_ms_per_token": 0.05,
+    "decode_ms_per_token": 2.0,
+    "prefix_cache": True,
+    "prefix_cache_blocks": 8192,
+    "malformed_rate": 0.0,
+    "verbose": False,
+    "max_parallel": 0,  # like OLLAMA_NUM_PARALLEL: requests beyond this queue (0 = unlimited)
+    "model_speed": {},  # model name -> latency multiplier (e.g. a 3B at 0.3)
+    "error_rate": 0.0,  # fraction of completions answered with a 503
+    "hang": False,      # accept requests but never answer
+    "load_ms": 0.0,     # one-off model load on the first request per model
+    "seed": 0,
+}
+
+_BLOCK_CHARS = 64  # ~16 tokens per cache block
+
+STATS = {
+    "calls": defaultdict(int),
+    "prompt_tokens": defaultdict(int),
+    "completion_tokens": defaultdict(int),
+    "cached_tokens": defaultdict(int),
+    "prefill_ms": defaultdict(float),
+    "calls_by_model": defaultdict(int),
+    "queue_ms": defaultdict(float),
+    "injected": defaultdict(int),
+    "model_loads": defaultdict(int),
+}
+
+
+class PrefixCache:
+    def __init__(self):
+        self._blocks: "OrderedDict[str, None]" = OrderedDict()
+
+    def clear(self) -> None:
+        self._blocks.clear()
+
+    def lookup_and_insert(self, prompt: str) -> int:
+        """Return how many leading characters were already cached, then cache the prompt."""
+        cached_chars, hit_run = 0, True
+        h = hashlib.sha256()
+        for start in range(0, len(prompt) - _BLOCK_CHARS + 1, _BLOCK_CHARS):
+            h.update(prompt[start:start + _BLOCK_CHARS].encode("utf-8"))
+            key = h.hexdigest()
+            if hit_run and key in self._blocks:
+                cached_chars += _BLOCK_CHARS
+                self._blocks.move_to_end(key)
+                continue
+            hit_run = False
+            self._blocks[key] = None
+        while len(self._blocks) > CONFIG["prefix_cache_blocks"]:
+            self._blocks.popitem(last=False)
+        return cached_chars
+
+
+_prefix_cache = PrefixCache()
+_slots = None
+_loaded = {}  # model -> asyncio.Task loading it
+
+
+async def _ensure_loaded(model: str) -> None:
+    """Pay CONFIG["load_ms"] once per model; concurrent first requests wait for the same load."""
+    if not CONFIG["load_ms"]:
+        return
+    task = _loaded.get(model)
+    if task is None:
+        STATS["model_loads"][model] += 1
+        task = _loaded[model] = asyncio.ensure_future(asyncio.sleep(CONFIG["load_ms"] / 1000))
+    await asyncio.shield(task)
+
+
+def _slot_semaphore():
+    global _slots
+    if _slots is None and CONFIG["max_parallel"]:
+        _slots = asyncio.Semaphore(CONFIG["max_parallel"])
+    return _slots
+
+
+def serialize_prompt(messages) -> str:
+    return "".join(f"<|{m.get('role')}|>{m.get('content') or ''}" for m in messages)
+
+
+def approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _last_user(messages) -> str:
+    for m in reversed(messages):
+        if m.get("role") == "user":
+            return m.get("content") or ""
+    return ""
+
+
+def _current_message(messages) -> str:
+    # Prefer the CURRENT USER MESSAGE block when the prompt carries one,
+    # otherwise the last user message is the raw user text.
+    everything = " ".join(m.get("content") or "" for m in messages)
+    m = re.search(r"CURRENT USER MESSAGE:\s*(.+?)(?:\n\n|\Z)", everything, re.S)
+    return (m.group(1) if m else _last_user(messages)).strip()
+
+
+def role_of(messages) -> str:
+    system = " ".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+    if "silent triage" in system:
+        return "triage"
+    if "safety checker" in system:
+        return "safety"
+    if "silent classifier" in system:
+        return "state"
+    if "running session summary" in system:
+        return "summary"
+    return "coach"
+
+
+def _safety(text: str) -> dict:
+    if _CRISIS_RE.search(text):
+        return {"severity": "crisis", "distress_score": 9,
+                "risk": {"self_harm": True, "suicide": True, "harm_others": False, "abuse": False},
+                "reason": "explicit intent"}
+    distressed = bool(_HIGH_RE.search(text) or _HELP_RE.search(text))
+    return {"severity": "distressed" if distressed else "safe", "distress_score": 5 if distressed else 1,
+            "risk": {"self_harm": False, "suicide": False, "harm_others": False, "abuse": False},
+            "reason": "stub verdict"}
+
+
+def _state(text: str) -> dict:
+    return {
+        "intent": "plan_request" if _PLAN_RE.search(text) else "venting",
+        "arousal": "high" if _HIGH_RE.search(text) else "low",
+        "plan_request": bool(_PLAN_RE.search(text)),
+        "needs_help": bool(_HELP_RE.search(text)),
+    }
+
+
+_rng = random.Random(CONFIG["seed"])
+_MALFORMED = ["prose", "fence", "two_objects", "trailing_comma"]
+
+
+def malform(content: str) -> str:
+    kind = _rng.choice(_MALFORMED)
+    if kind == "prose":
+        return f"Sure! Here is the JSON:\n{content}\nHope this helps."
+    if kind == "fence":
+        return f"```json\n{content}\n```"
+    if kind == "two_objects":
+        draft = json.loads(content)
+        draft["reason"] = "draft"
+        return f"{json.dumps(draft)}\n{content}"
+    return content[:-1] + ", }"
+
+
+_RAMBLE = ("\n\nExplanation: the message was read in context, the tone and wording were weighed, and no "
+           "further signals were found that would change this assessment at this point in the conversation.")
+
+
+def verbose_reply(role: str, content: str) -> str:
+    if role in ("safety", "state", "triage"):
+        return content + _RAMBLE
+    core, sep, action = content.partition("\n\nUI_ACTION:")
+    core += ("\nIt is okay to go slowly with this.\nNotice how your shoulders and jaw feel right now."
+             "\nYou do not have to fix everything today.")
+    tail = "\n\nI'm here whenever you want to talk more. Take care of yourself and be gentle with yourself."
+    return core + (sep + action if sep else "") + tail
+
+
+def reply_for(messages) -> tuple:
+    role = role_of(messages)
+    text = _current_message(messages)
+    system = " ".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+
+    if role == "safety":
+        return role, json.dumps(_safety(_last_user(messages)))
+    if role == "state":
+        return role, json.dumps(_state(text))
+    if role == "triage":
+        return role, json.dumps({**_safety(text), **_state(text)})
+    if role == "summary":
+        return role, "User has been stressed about work and family. Breathing exercises helped a little."
+    if "MODE=GROUND" in system:
+        return role, "A short breathing exercise might help right now.\n\nUI_ACTION: square_breathing"
+    if "MODE=PLAN" in system:
+        return role, ("Here is a gentle plan:\n- Day 1: two minutes of quiet breathing\n- Days 2-7: a short walk\n"
+                      "- Week 2: add a journaling prompt\n- Week 3: keep what helped\n"
+                      "Light or Regular - which feels right?\n\nUI_ACTION: two_minute_rule")
+    return role, "That sounds like a lot to carry.\nWhat has been weighing on you the most?"
+
+
+app = FastAPI(title="SHAE stub LLM")
+
+
+@app.get("/v1/models")
+async def models():
+    return {"object": "list", "data": [{"id": "stub", "object": "model"}]}
+
+
+@app.get("/stats")
+async def stats():
+    return {k: dict(v) for k, v in STATS.items()}
+
+
+@app.post("/reset")
+async def reset():
+    for v in STATS.values():
+        v.clear()
+    _prefix_cache.clear()
+    _loaded.clear()
+    _rng.seed(CONFIG["seed"])
+    return {"ok": True}
+
+
+@app.post("/config")
+async def set_config(req: Request):
+    CONFIG.update(await req.json())
+    return CONFIG
+
+
+@app.post("/api/generate")
+async def ollama_generate(req: Request):
+    # Only the warm-up form (no prompt): load the model and report done
+    body = await req.json()
+    model = body.get("model", "stub")
+    await _ensure_loaded(model)
+    STATS["calls"]["warmup"] += 1
+    return {"model": model, "response": "", "done": True, "done_reason": "load"}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(req: Request):
+    body = await req.json()
+    await _ensure_loaded(body.get("model", "stub"))
+    messages = body.get("messages") or []
+    role, content = reply_for(messages)
+    if CONFIG["hang"]:
+        STATS["injected"]["hang"] += 1
+        while CONFIG["hang"]:
+            await asyncio.sleep(0.05)
+    if CONFIG["error_rate"] and _rng.random() < CONFIG["error_rate"]:
+        STATS["injected"]["error"] += 1
+        return JSONResponse({"error": {"message": "injected failure"}}, status_code=503)
+    if role in ("safety", "state", "triage") and not body.get("response_format"):
+        if _rng.random() < CONFIG["malformed_rate"]:
+            content = malform(content)
+    if CONFIG["verbose"]:
+        content = verbose_reply(role, content)
+    if _last_user(messages).startswith("Your previous output was not valid JSON"):
+        role = "repair"
+
+    stop = body.get("stop") or []
+    for seq in [stop] if isinstance(stop, str) else stop:
+        if seq in content:
+            content = content[: content.index(seq)]
+    max_tokens = body.get("max_tokens")
+    if max_tokens:
+        content = content[: max_tokens * 4]
+
+    prompt = serialize_prompt(messages)
+    prompt_tokens = approx_tokens(prompt)
+    cached_tokens = _prefix_cache.lookup_and_insert(prompt) // 4 if CONFIG["prefix_cache"] else 0
+    completion_tokens = approx_tokens(content)
+    prefill_ms = CONFIG["base_ms"] + CONFIG["prefill_ms_per_token"] * (prompt_tokens - cached_tokens)
+    STATS["calls"][role] += 1
+    STATS["calls_by_model"][f"{role}:{body.get('model', 'stub')}"] += 1
+    STATS["prompt_tokens"][role] += prompt_tokens
+    STATS["cached_tokens"][role] += cached_tokens
+
+    model = body.get("model", "stub")
+    speed = CONFIG["model_speed"].get(model, 1.0)
+    prefill_ms *= speed
+    STATS["prefill_ms"][role] += prefill_ms
+    prefill_s = prefill_ms / 1000
+    per_token_s = CONFIG["decode_ms_per_token"] * speed / 1000
+    created = int(time.time())
+    usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+             "total_tokens": prompt_tokens + completion_tokens,
+             "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+
+    slots = _slot_semaphore()
+    if slots is not None:
+        # queue time counts as latency, like a busy Ollama
+        queued_at = time.perf_counter()
+        await slots.acquire()
+        STATS["queue_ms"][role] += (time.perf_counter() - queued_at) * 1000
+
+    if body.get("stream"):
+        async def events():
+            sent = 0
+            try:
+                await asyncio.sleep(prefill_s)
+                for piece in re.findall(r"\S+\s*|\s+", content):
+                    await asyncio.sleep(per_token_s * len(piece) / 4)
+                    chunk = {"id": "stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                             "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    sent += len(piece)
+                done = {"id": "stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                yield f"data: {json.dumps(done)}\n\n"
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    final = {"id": "stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                             "choices": [], "usage": usage}
+                    yield f"data: {json.dumps(final)}\n\n"
+                yield "data: [DONE]\n\n"
+            finally:
+                # also runs when the client hangs up mid-stream
+                STATS["completion_tokens"][role] += approx_tokens(content[:sent]) if sent else 0
+                if slots is not None:
+                    slots.release()
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    try:
+        await asyncio.sleep(prefill_s + per_token_s * completion_tokens)
+    finally:
+        if slots is not None:
+            slots.release()
+    STATS["completion_tokens"][role] += completion_tokens
+    return {
+        "id": "stub",
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": usage,
+    }
+
+
+def main():
+    import uvicorn
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9100)
+    ap.add_argument("--base-ms", type=float, default=CONFIG["base_ms"])
+    ap.add_argument("--prefill-ms-per-token", type=float, default=CONFIG["prefill_ms_per_token"])
+    ap.add_argument("--decode-ms-per-token", type=float, default=CONFIG["decode_ms_per_token"])
+    ap.add_argument("--no-prefix-cache", action="store_true")
+    ap.add_argument("--malformed-rate", type=float, default=CONFIG["malformed_rate"])
+    ap.add_argument("--verbose", action="store_true")
+    ap.add_argument("--max-parallel", type=int, default=0)
+    ap.add_argument("--model-speed", action="append", default=[], metavar="MODEL=FACTOR",
+                    help="latency multiplier for a model name, e.g. small=0.3 (repeatable)")
+    ap.add_argument("--error-rate", type=float, default=CONFIG["error_rate"])
+    ap.add_argument("--hang", action="store_true")
+    ap.add_argument("--load-ms", type=float, default=CONFIG["load_ms"])
+    args = ap.parse_args()
+    CONFIG.update(base_ms=args.base_ms, prefill_ms_per_token=args.prefill_ms_per_token,
+                  decode_ms_per_token=args.decode_ms_per_token, prefix_cache=not args.no_prefix_cache,
+                  malformed_rate=args.malformed_rate, verbose=args.verbose, max_parallel=args.max_parallel,
+                  error_rate=args.error_rate, hang=args.hang, load_ms=args.load_ms,
+                  model_speed={k: float(v) for k, v in (m.split("=", 1) for m in args.model_speed)})
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()